@@ -38,7 +38,7 @@ class PollClient(object):
     """
     remote = 'http://%s:%s' % (host, tcp_port)
     # TODO(jchuang): Keep alive in transport layer.
-    self._server = ServerProxy(remote, verbose=verbose)
+    self._server = ServerProxy(remote, verbose=verbose, allow_none=True)
 
   def poll_gpio(self, gpio_port, edge):
     """Long-polls a GPIO port.
@@ -56,6 +56,28 @@ class PollClient(object):
       raise PollClientError('Problem to poll GPIO %s %s %s' %
                             (str(gpio_port), edge, e))
 
+  def get_gpio_events(self, gpio_port, edge, since=0, timeout=None):
+    """Gets the edges of a GPIO port recorded after sequence number |since|.
+
+    Args:
+      gpio_port: GPIO port
+      edge: value in GPIO_EDGE_LIST[]
+      since: sequence number of the last edge already seen, 0 for all
+      timeout: seconds to wait for an edge if there is none yet, None to wait
+               forever, 0 to not wait
+
+    Returns:
+      dict with the edges, see Polld.get_gpio_events().
+
+    Raises:
+      PollClientError: If error occurs when getting the edges.
+    """
+    try:
+      return self._server.get_gpio_events(gpio_port, edge, since, timeout)
+    except Exception as e:
+      raise PollClientError('Problem to get edges of GPIO %s %s %s' %
+                            (str(gpio_port), edge, e))
+
   def read_gpio(self, gpio_port):
     """Reads current value of a GPIO port.
 
@@ -5,11 +5,16 @@
 """GPIO polling module. It also supports basic GPIO read/write."""
 
 import atexit
+import collections
+import ctypes
+import ctypes.util
+import errno
 import logging
 import os
 import select
 import socket
 import threading
+import time
 
 import poll_common
 
@@ -20,12 +25,213 @@ _EXPORT_FILE =  os.path.join(_GPIO_ROOT, 'export')
 _UNEXPORT_FILE = os.path.join(_GPIO_ROOT, 'unexport')
 _GPIO_PIN_PATTERN = os.path.join(_GPIO_ROOT, 'gpio%d')
 
+# Number of edges kept per GPIO port for clients to fetch.
+EVENT_BUFFER_SIZE = 256
+
+
+class _Timespec(ctypes.Structure):
+  """struct timespec from time.h."""
+  _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _clock_gettime_monotonic():
+  """Returns CLOCK_MONOTONIC in seconds, for pythons without time.monotonic."""
+  ts = _Timespec()
+  if _librt.clock_gettime(1, ctypes.byref(ts)):  # 1 is CLOCK_MONOTONIC.
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+  return ts.tv_sec + ts.tv_nsec * 1e-9
+
+
+try:
+  _monotonic = time.monotonic
+except AttributeError:
+  # python2 has no time.monotonic().
+  _librt = ctypes.CDLL(ctypes.util.find_library('rt') or
+                       ctypes.util.find_library('c'), use_errno=True)
+  _monotonic = _clock_gettime_monotonic
+
 
 class PollGpioError(Exception):
   """Exception class for PollGpio."""
   pass
 
 
+class GpioEdgeLog(object):
+  """Bounded log of the edges of one GPIO port.
+
+  Each edge gets the next sequence number, starting at 1, so that clients can
+  fetch the edges that happened since the last one they saw.
+  """
+
+  def __init__(self, size=EVENT_BUFFER_SIZE):
+    """Constructor.
+
+    Args:
+      size: number of edges to keep
+    """
+    self._events = collections.deque(maxlen=size)
+    self._seq = 0
+    self._cond = threading.Condition()
+
+  @property
+  def last_seq(self):
+    """Sequence number of the last edge, 0 if none happened yet."""
+    with self._cond:
+      return self._seq
+
+  def record(self, value):
+    """Records an edge, and wakes up the clients waiting for one.
+
+    Args:
+      value: (int) GPIO value read after the edge
+    """
+    with self._cond:
+      self._seq += 1
+      self._events.append((self._seq, _monotonic(), value))
+      self._cond.notify_all()
+
+  def get_events(self, since, timeout=None):
+    """Gets the edges after sequence number |since|.
+
+    Args:
+      since: sequence number of the last edge already seen. A number past the
+             last edge, e.g. from before polld restarted, counts as 0
+      timeout: seconds to wait for an edge if there is none yet, None to wait
+               forever, 0 to not wait
+
+    Returns:
+      tuple (events, seq, dropped) where:
+        events: list of (seq, timestamp, value) tuples, oldest first. The
+                timestamp is in seconds on the monotonic clock.
+        seq: sequence number of the last edge
+        dropped: number of edges after |since| no longer in the log
+    """
+    with self._cond:
+      if since > self._seq:
+        since = 0
+      if timeout is None:
+        while self._seq <= since:
+          self._cond.wait()
+      elif timeout > 0:
+        deadline = _monotonic() + timeout
+        while self._seq <= since:
+          remaining = deadline - _monotonic()
+          if remaining <= 0:
+            break
+          self._cond.wait(remaining)
+      events = [event for event in self._events if event[0] > since]
+      first = events[0][0] if events else self._seq + 1
+      return (events, self._seq, max(0, first - since - 1))
+
+
+class GpioEdgeMonitor(object):
+  """Watches the value files of all polled GPIO ports on one epoll thread.
+
+  Do not create GpioEdgeMonitor object directly. Use get_instance().
+  """
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  @classmethod
+  def get_instance(cls):
+    """Constructs or returns the GpioEdgeMonitor, started."""
+    with cls._instance_lock:
+      if not cls._instance:
+        cls._instance = GpioEdgeMonitor()
+      return cls._instance
+
+  def __init__(self):
+    """Constructor. Starts the monitor thread.
+
+    Attributes:
+      _logger: Logger.
+      _epoll: epoll object watching the value files.
+      _lock: Lock around _files & _logs.
+      _files: Mapping from value file descriptor to (port, file).
+      _logs: Mapping from GPIO port to GpioEdgeLog.
+      _stop_sockets: Socket pair to interrupt epoll in the monitor thread.
+      _thread: Monitor thread.
+    """
+    self._logger = logging.getLogger('GpioEdgeMonitor')
+    self._epoll = select.epoll()
+    self._lock = threading.Lock()
+    self._files = {}
+    self._logs = {}
+    self._stop_sockets = socket.socketpair()
+    self._epoll.register(self._stop_sockets[1].fileno(), select.EPOLLIN)
+    self._thread = threading.Thread(target=self._monitor_loop)
+    self._thread.daemon = True
+    self._thread.start()
+    atexit.register(self.stop)
+
+  def register(self, port, value_path):
+    """Starts recording the edges of a GPIO port.
+
+    Args:
+      port: GPIO port
+      value_path: path of the port's sysfs value file
+    """
+    with self._lock:
+      if port in self._logs:
+        return
+      f = open(value_path, 'r')
+      # Consume the current value, or epoll returns right away.
+      f.read()
+      self._logs[port] = GpioEdgeLog()
+      self._files[f.fileno()] = (port, f)
+      self._epoll.register(f.fileno(), select.EPOLLPRI | select.EPOLLERR)
+    self._logger.debug('watching gpio %d', port)
+
+  def unregister(self, port):
+    """Stops recording the edges of a GPIO port."""
+    with self._lock:
+      for fd, (fd_port, f) in list(self._files.items()):
+        if fd_port == port:
+          self._epoll.unregister(fd)
+          del self._files[fd]
+          f.close()
+      self._logs.pop(port, None)
+
+  def get_log(self, port):
+    """Returns the GpioEdgeLog of a registered GPIO port."""
+    with self._lock:
+      return self._logs[port]
+
+  def stop(self):
+    """Stops the monitor thread."""
+    self._stop_sockets[0].send(b'.')
+    self._thread.join(timeout=1.0)
+    if self._thread.is_alive():
+      self._logger.warning('fail to stop the gpio monitor thread')
+
+  def _monitor_loop(self):
+    """Main loop of the monitor thread."""
+    stop_fd = self._stop_sockets[1].fileno()
+    while True:
+      try:
+        ready = self._epoll.poll()
+      except IOError as e:
+        if e.errno == errno.EINTR:
+          continue
+        raise
+      for fd, _ in ready:
+        if fd == stop_fd:
+          self._logger.debug('stopping thread')
+          return
+        with self._lock:
+          if fd not in self._files:
+            # Unregistered in the meantime.
+            continue
+          port, f = self._files[fd]
+          log = self._logs[port]
+          # Re-read from head of 'gpio[N]/value', or epoll returns right away.
+          f.seek(0)
+          value = f.read().strip()
+        self._logger.debug('edge on gpio %d, value %s', port, value)
+        log.record(int(value) if value.isdigit() else None)
+
+
 class PollGpio(object):
   """Monitors or controls the status of one GPIO port.
 
@@ -87,10 +293,7 @@ class PollGpio(object):
       _port: Same as argument 'port'.
       _edge: Same as argument 'edge'.
       _logger: Logger.
-      _thread: GPIO-polling thread.
-      _wait_cond: Conditional variable to notify all client threads waiting for
-                  GPIO edge.
-      _stop_sockets: Socket pair to interrupt poll() call in polling thread.
+      _monitor: GpioEdgeMonitor recording the edges, once polled.
 
     Raises:
       PollGpioError
@@ -100,9 +303,7 @@ class PollGpio(object):
       self._edge = None  # will be assigned at first-time polling
 
       self._logger = logging.getLogger('PollGpio')
-      self._thread = None  # will be started at first-time polling
-      self._wait_cond = threading.Condition()
-      self._stop_sockets = socket.socketpair()
+      self._monitor = None  # will be registered at first-time polling
 
       self._export_sysfs()
       atexit.register(self._cleanup)  # must release system resource
@@ -110,29 +311,15 @@ class PollGpio(object):
       raise PollGpioError('Fail to __init__ GPIO %d: %s' % (self._port, e))
 
   def _cleanup(self):
-    """Stops the monitor thread and unexport the sysfs interface."""
+    """Stops monitoring the edges and unexport the sysfs interface."""
     try:
       self._logger.debug('')
-      self._stop_thread()
+      if self._monitor:
+        self._monitor.unregister(self._port)
       self._unexport_sysfs()
     except Exception as e:
       logging.error('Fail to clean up GPIO %d: %s', self._port, e)
 
-  def _start_thread(self):
-    """Starts polling thread."""
-    self._thread = threading.Thread(target=self._polling_loop)
-    self._thread.daemon = True
-    self._thread.start()
-
-  def _stop_thread(self):
-    """Stops polling thread."""
-    self._stop_sockets[0].send('.')
-    if not self._thread:  # thread wasn't started
-      return
-    self._thread.join(timeout=1.0)
-    if self._thread.is_alive():
-      self._logger.warning('fail to stop thread of GPIO %d' % self._port)
-
   def _get_sysfs_path(self):
     """Gets the path of GPIO sysfs interface."""
     return _GPIO_PIN_PATTERN % self._port
@@ -182,30 +369,27 @@ class PollGpio(object):
     with open(os.path.join(self._get_sysfs_path(), 'value'), 'w') as f:
       f.write(str(value))
 
-  def _polling_loop(self):
-    """Main loop of polling thread."""
-    with open(os.path.join(self._get_sysfs_path(), 'value'), 'r') as f:
-      poll = select.poll()
-      poll.register(f, select.POLLPRI | select.POLLERR)
-      poll.register(self._stop_sockets[1], select.POLLIN | select.POLLERR)
-      stop_flag = False
-      while not stop_flag:
-        # After edge is triggered, re-read from head of 'gpio[N]/value'.
-        # Or poll() will return immediately next time.
-        f.seek(0)
-        f.read()
-        self._logger.debug('poll()-ing on gpio %d', self._port)
-        ret = poll.poll()
-        self._logger.debug('poll() on gpio %d returns %s', self._port, ret)
-        for fd, _ in ret:
-          if fd == f.fileno():
-            self._wait_cond.acquire()
-            self._wait_cond.notifyAll()
-            self._wait_cond.release()
-          if fd == self._stop_sockets[1].fileno():
-            if len(self._stop_sockets[1].recv(1)) > 0:
-              self._logger.debug('stopping thread')
-              stop_flag = True
+  def _start_monitor(self, edge):
+    """Assigns the edge, and starts recording the edges of the port.
+
+    Only done for the first time polling.
+
+    Args:
+      edge: value in GPIO_EDGE_LIST[]
+
+    Raises:
+      PollGpioError
+    """
+    if self._edge:
+      return
+    try:
+      self._assign_edge(edge)
+      self._monitor = GpioEdgeMonitor.get_instance()
+      self._monitor.register(self._port,
+                             os.path.join(self._get_sysfs_path(), 'value'))
+    except Exception as e:
+      raise PollGpioError(
+          'Fail to start monitoring GPIO %d: %s' % (self._port, e))
 
   def poll(self, edge):
     """Waits for a GPIO port being edge triggered.
@@ -216,24 +400,39 @@ class PollGpio(object):
     Raises:
       PollGpioError
     """
-    if not self._edge:
-      # Only for the first time polling, assigns edge value to sysfs interface
-      # and starts a new thread.
-      try:
-        self._assign_edge(edge)
-        self._start_thread()
-      except Exception as e:
-        raise PollGpioError(
-            'Fail to start up thread GPIO %d: %s' % (self._port, e))
+    self._start_monitor(edge)
     try:
       self._logger.debug('client starts waiting')
-      self._wait_cond.acquire()
-      self._wait_cond.wait()
-      self._wait_cond.release()
+      log = self._monitor.get_log(self._port)
+      log.get_events(log.last_seq)
       self._logger.debug('client finishes waiting')
     except Exception as e:
       raise PollGpioError('Fail to poll GPIO %d: %s' % (self._port, e))
 
+  def get_events(self, edge, since=0, timeout=None):
+    """Gets the edges of a GPIO port recorded after sequence number |since|.
+
+    Unlike poll(), edges happening between two calls are not missed, as long
+    as there are no more than EVENT_BUFFER_SIZE of them.
+
+    Args:
+      edge: value in GPIO_EDGE_LIST[]
+      since: sequence number of the last edge already seen, 0 for all
+      timeout: seconds to wait for an edge if there is none yet, None to wait
+               forever, 0 to not wait
+
+    Returns:
+      see GpioEdgeLog.get_events()
+
+    Raises:
+      PollGpioError
+    """
+    self._start_monitor(edge)
+    try:
+      return self._monitor.get_log(self._port).get_events(since, timeout)
+    except Exception as e:
+      raise PollGpioError('Fail to get edges of GPIO %d: %s' % (self._port, e))
+
   def read(self):
     """Reads GPIO port value.
 
@@ -0,0 +1,70 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Unit tests for the GPIO edge log of poll_gpio."""
+
+import threading
+import time
+import unittest
+
+import poll_gpio
+
+
+class TestGpioEdgeLog(unittest.TestCase):
+
+  def setUp(self):
+    """Set up a small log to overflow quickly."""
+    unittest.TestCase.setUp(self)
+    self.log = poll_gpio.GpioEdgeLog(size=4)
+
+  def record(self, count):
+    """Helper to record |count| edges, alternating between 1 and 0."""
+    for i in range(count):
+      self.log.record((i + 1) % 2)
+
+  def test_EventsSince(self):
+    """Only the edges after |since| are returned, oldest first."""
+    self.record(3)
+    events, seq, dropped = self.log.get_events(1, timeout=0)
+    self.assertEqual([2, 3], [event[0] for event in events])
+    self.assertEqual([0, 1], [event[2] for event in events])
+    self.assertEqual(3, seq)
+    self.assertEqual(0, dropped)
+
+  def test_Overflow(self):
+    """Edges pushed out of the log are counted as dropped."""
+    self.record(7)
+    events, seq, dropped = self.log.get_events(1, timeout=0)
+    self.assertEqual([4, 5, 6, 7], [event[0] for event in events])
+    self.assertEqual(7, seq)
+    self.assertEqual(2, dropped)
+
+  def test_SinceAheadOfSeq(self):
+    """A |since| past the last edge, e.g. from before a restart, counts as 0."""
+    self.record(2)
+    events, seq, dropped = self.log.get_events(10, timeout=0)
+    self.assertEqual([1, 2], [event[0] for event in events])
+    self.assertEqual(2, seq)
+    self.assertEqual(0, dropped)
+
+  def test_ZeroTimeout(self):
+    """A 0 timeout returns right away when there is no new edge."""
+    self.record(1)
+    start = time.time()
+    events, seq, dropped = self.log.get_events(1, timeout=0)
+    self.assertLess(time.time() - start, 0.5)
+    self.assertEqual(([], 1, 0), (events, seq, dropped))
+
+  def test_WaitForEdge(self):
+    """get_events() returns as soon as an edge is recorded."""
+    timer = threading.Timer(0.05, self.log.record, [1])
+    timer.start()
+    events, seq, _ = self.log.get_events(0, timeout=5)
+    timer.join()
+    self.assertEqual(1, seq)
+    self.assertEqual([1], [event[0] for event in events])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -61,3 +61,31 @@ class Polld(object):
       PollGpio.get_instance(port).write(1 if value else 0)
     except PollGpioError as e:
       raise PolldError('poll_gpio fail: %s' % e)
+
+  def get_gpio_events(self, port, edge, since=0, timeout=None):
+    """Gets the edges of a GPIO port recorded after sequence number |since|.
+
+    Edges are recorded from the first poll_gpio() or get_gpio_events() call
+    on the port.
+
+    Args:
+      port: GPIO port
+      edge: value in GPIO_EDGE_LIST[]
+      since: sequence number of the last edge already seen, 0 for all
+      timeout: seconds to wait for an edge if there is none yet, None to wait
+               forever, 0 to not wait
+
+    Returns:
+      dict with keys:
+        events: list of [seq, timestamp, value] of the edges, oldest first.
+                timestamp is in seconds on polld's monotonic clock, value is
+                the GPIO value read right after the edge.
+        seq: sequence number of the last edge, to pass as |since| next time
+        dropped: number of edges after |since| that were no longer buffered
+    """
+    try:
+      events, seq, dropped = PollGpio.get_instance(port, edge).get_events(
+          edge, since, timeout)
+    except PollGpioError as e:
+      raise PolldError('get_gpio_events fail: %s' % e)
+    return {'events': events, 'seq': seq, 'dropped': dropped}
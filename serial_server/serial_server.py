@@ -20,7 +20,12 @@ class SerialServerError(Exception):
 
 
 class SerialServer(object):
-  """A server proxy for handling multiple serial connection interfaces."""
+  """A server proxy for handling multiple serial connection interfaces.
+
+  Each serial connection is read into a buffer by its own background thread,
+  and locked separately, so that a threaded RPC server can serve several
+  connections in parallel.
+  """
 
   def __init__(self, params_list):
     """Serial server constructor.
@@ -124,6 +129,7 @@ class SerialServer(object):
     try:
       conn = serial_utils.SerialDevice()
       conn.Connect(**serial_params)
+      conn.StartReader()
       return conn
     except serial.SerialException as e:
       raise SerialServerError('Connect to %s fail: %s' %
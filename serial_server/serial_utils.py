@@ -19,11 +19,21 @@ import glob
 import logging
 import os
 import re
+import select
 # site-packages: dev-python/pyserial
 import serial
+import threading
 import time
 
 
+# Size of the buffer filled by the background reader of a SerialDevice. The
+# oldest bytes are dropped when it is full.
+READ_BUFFER_SIZE = 64 * 1024
+# Seconds the background reader waits for input before checking whether it
+# should stop.
+READER_POLL_SECS = 0.5
+
+
 def OpenSerial(**params):
   """Tries to open a serial port.
 
@@ -148,6 +158,11 @@ class SerialDevice(object):
   It has several handy methods, like SendRecv() and SendExpectRecv(),
   which support fail retry.
 
+  Each device has its own lock, so that several devices can be used from
+  different threads in parallel, while the commands sent to one device do not
+  interleave. StartReader() starts a background thread reading the device
+  into a buffer continuously, so that no input is lost between commands.
+
   Property:
     log: True to enable logging.
 
@@ -176,6 +191,13 @@ class SerialDevice(object):
     """
     self._serial = None
     self._port = ''
+    self._lock = threading.RLock()
+    # Background reader & the buffer it fills, see StartReader().
+    self._reader = None
+    self._reader_stop = threading.Event()
+    self._buffer = bytearray()
+    self._buffer_size = READ_BUFFER_SIZE
+    self._buffer_cond = threading.Condition()
     self.send_receive_interval_secs = send_receive_interval_secs
     self.retry_interval_secs = retry_interval_secs
     self.log = log
@@ -217,7 +239,98 @@ class SerialDevice(object):
   def Disconnect(self):
     """Closes the connection if it exists."""
     if self._serial:
+      self._reader_stop.set()
+      # Closing the port also interrupts a pending read of the reader.
       self._serial.close()
+      if self._reader:
+        self._reader.join(timeout=1.0)
+        self._reader = None
+
+  def StartReader(self, buffer_size=READ_BUFFER_SIZE):
+    """Starts reading the device into a buffer in the background.
+
+    Receive() then returns data from the buffer, as soon as enough of it
+    arrived.
+
+    Args:
+      buffer_size: max number of bytes buffered. The oldest ones are dropped
+          when it is exceeded.
+    """
+    with self._lock:
+      if self._reader:
+        return
+      self._buffer_size = buffer_size
+      self._reader_stop.clear()
+      self._reader = threading.Thread(target=self._ReadLoop,
+                                      name='SerialReader %s' % self._port)
+      self._reader.daemon = True
+      self._reader.start()
+
+  def _ReadLoop(self):
+    """Main loop of the background reader.
+
+    Input is only taken from the device while holding |_buffer_cond|, so that
+    FlushBuffer() drops everything received before it, and nothing after it.
+    """
+    while not self._reader_stop.is_set():
+      try:
+        readable, _, _ = select.select([self._serial.fileno()], [], [],
+                                       READER_POLL_SECS)
+        if not readable:
+          continue
+        with self._buffer_cond:
+          # Readable with nothing waiting is a hang up, which read() reports,
+          # unless FlushBuffer() just dropped the input.
+          data = self._serial.read(max(1, self._serial.inWaiting()))
+          if not data:
+            continue
+          self._buffer.extend(data)
+          overflow = len(self._buffer) - self._buffer_size
+          if overflow > 0:
+            del self._buffer[:overflow]
+            if self.log:
+              logging.warning('Serial port %r dropped %d bytes', self._port,
+                              overflow)
+          self._buffer_cond.notify_all()
+      except (serial.SerialException, select.error, EnvironmentError,
+              ValueError, TypeError) as e:
+        # ValueError/TypeError: port closed under our feet by Disconnect().
+        if not self._reader_stop.is_set():
+          logging.warning('Serial port %r read fail: %s', self._port, e)
+        break
+    with self._buffer_cond:
+      # Wake up readers waiting for data that will not come.
+      self._reader_stop.set()
+      self._buffer_cond.notify_all()
+
+  def _ReceiveBuffered(self, size):
+    """Receives up to N bytes from the buffer of the background reader.
+
+    It blocks at most timeout seconds.
+
+    Args:
+      size: number of bytes to receive. 0 means receiving what already in the
+          buffer.
+
+    Returns:
+      Received bytes, fewer than N on timeout.
+    """
+    timeout = self._serial.getTimeout()
+    deadline = None if timeout is None else time.time() + timeout
+    with self._buffer_cond:
+      if size == 0:
+        size = len(self._buffer)
+      while len(self._buffer) < size and not self._reader_stop.is_set():
+        if deadline is None:
+          self._buffer_cond.wait()
+          continue
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          break
+        self._buffer_cond.wait(remaining)
+      response = bytes(self._buffer[:size])
+      del self._buffer[:size]
+      return response
 
   def SetTimeout(self, read_timeout, write_timeout):
     """Overrides read/write timeout.
@@ -246,8 +359,9 @@ class SerialDevice(object):
       SerialException if it is disconnected during sending.
     """
     try:
-      self._serial.write(command)
-      self._serial.flush()
+      with self._lock:
+        self._serial.write(command)
+        self._serial.flush()
       if self.log:
         logging.info('Successfully sent %r', command)
     except serial.SerialTimeoutException:
@@ -274,9 +388,15 @@ class SerialDevice(object):
     Raises:
       SerialTimeoutException if it fails to receive N bytes.
     """
-    if size == 0:
-      size = self._serial.inWaiting()
-    response = self._serial.read(size)
+    with self._lock:
+      if self._reader:
+        response = self._ReceiveBuffered(size)
+        if size == 0:
+          size = len(response)
+      else:
+        if size == 0:
+          size = self._serial.inWaiting()
+        response = self._serial.read(size)
     if len(response) == size:
       if self.log:
         logging.info('Successfully received %r', response)
@@ -290,8 +410,11 @@ class SerialDevice(object):
 
   def FlushBuffer(self):
     """Flushes input/output buffer."""
-    self._serial.flushInput()
-    self._serial.flushOutput()
+    with self._lock:
+      with self._buffer_cond:
+        self._serial.flushInput()
+        del self._buffer[:]
+      self._serial.flushOutput()
 
   def SendReceive(self, command, size=1, retry=0, interval_secs=None,
                   suppress_log=False):
@@ -303,7 +426,9 @@ class SerialDevice(object):
           input buffer.
       retry: number of retry.
       interval_secs: #seconds to wait between send and receive. If specified,
-          overrides self.send_receive_interval_secs.
+          overrides self.send_receive_interval_secs. By default, there is no
+          wait when size is not 0, as Receive() returns as soon as N bytes
+          arrived.
       suppress_log: True to disable log regardless of self.log value.
 
     Returns:
@@ -313,14 +438,16 @@ class SerialDevice(object):
       SerialTimeoutException if it fails to receive N bytes.
     """
     for nth_run in range(retry + 1):
-      self.FlushBuffer()
       try:
-        self.Send(command)
-        if interval_secs is None:
-          time.sleep(self.send_receive_interval_secs)
-        else:
-          time.sleep(interval_secs)
-        response = self.Receive(size)
+        with self._lock:
+          self.FlushBuffer()
+          self.Send(command)
+          if interval_secs is not None:
+            time.sleep(interval_secs)
+          elif size == 0:
+            # No way to tell when the whole response arrived.
+            time.sleep(self.send_receive_interval_secs)
+          response = self.Receive(size)
         if not suppress_log and self.log:
           logging.info('Successfully sent %r and received %r', command,
                        response)
@@ -0,0 +1,471 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Compact binary RPC transport for servod, alongside XML-RPC.
+
+Each message is a frame: a 4 byte big-endian payload length, followed by the
+payload. A payload is one value encoded as a 1 byte type tag followed by the
+tag's data:
+
+  N: None                   T/F: True/False
+  i: 8 byte signed integer  d: 8 byte double
+  s: string, as 4 byte length & UTF-8 bytes
+  b: binary data (xmlrpclib.Binary), as 4 byte length & bytes
+  l: list, as 4 byte count & the encoded items
+  m: dict, as 4 byte count & the encoded key, value pairs
+
+A request is the list [method, params]. A response is either [0, value] or
+[1, fault_code, fault_string], mirroring xmlrpclib.Fault. All integers are big
+endian.
+
+The servers dispatch to the same public methods as servod's XML-RPC server,
+including system.multicall, so ServerProxy can stand in for xmlrpclib's.
+"""
+
+import errno
+import logging
+import os
+import socket
+try:
+  import SocketServer as socketserver
+except ImportError:
+  import socketserver
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+import stat
+import struct
+import threading
+try:
+  from xmlrpclib import Binary, Fault
+except ImportError:
+  from xmlrpc.client import Binary, Fault
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+
+try:
+  _TEXT_TYPES = (str, unicode)
+  _INT_TYPES = (int, long)
+except NameError:
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+  _TEXT_TYPES = (str,)
+  _INT_TYPES = (int,)
+
+# Largest frame accepted, to not allocate arbitrary amounts on bad input.
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+_HEADER = struct.Struct('>I')
+_INT = struct.Struct('>q')
+_FLOAT = struct.Struct('>d')
+
+_RESPONSE_OK = 0
+_RESPONSE_FAULT = 1
+
+# Same fault code SimpleXMLRPCServer uses for exceptions raised by methods.
+FAULT_CODE = 1
+
+
+class BinaryRPCError(Exception):
+  """Error class for malformed binary RPC messages."""
+
+
+def _encode(value, chunks):
+  """Append the encoding of |value| to the list of byte strings |chunks|."""
+  if value is None:
+    chunks.append(b'N')
+  elif value is True:
+    chunks.append(b'T')
+  elif value is False:
+    chunks.append(b'F')
+  elif isinstance(value, _INT_TYPES):
+    try:
+      chunks.append(b'i' + _INT.pack(value))
+    except struct.error:
+      raise BinaryRPCError('integer %d does not fit in 64 bits' % value)
+  elif isinstance(value, float):
+    chunks.append(b'd' + _FLOAT.pack(value))
+  elif isinstance(value, _TEXT_TYPES):
+    if not isinstance(value, bytes):
+      value = value.encode('utf-8')
+    chunks.append(b's' + _HEADER.pack(len(value)))
+    chunks.append(value)
+  elif isinstance(value, (Binary, bytes, bytearray)):
+    data = bytes(value.data if isinstance(value, Binary) else value)
+    chunks.append(b'b' + _HEADER.pack(len(data)))
+    chunks.append(data)
+  elif isinstance(value, (list, tuple)):
+    chunks.append(b'l' + _HEADER.pack(len(value)))
+    for item in value:
+      _encode(item, chunks)
+  elif isinstance(value, dict):
+    chunks.append(b'm' + _HEADER.pack(len(value)))
+    for key, item in value.items():
+      _encode(key, chunks)
+      _encode(item, chunks)
+  else:
+    raise BinaryRPCError('cannot encode %s' % type(value))
+
+
+def encode(value):
+  """Encode |value| into a payload.
+
+  Args:
+    value: None, bool, int, float, string, Binary, or a list, tuple or dict of
+           those
+
+  Returns:
+    byte string payload
+
+  Raises:
+    BinaryRPCError: if |value| cannot be encoded
+  """
+  chunks = []
+  _encode(value, chunks)
+  return b''.join(chunks)
+
+
+def _decode(payload, pos):
+  """Decode the value at |pos| of |payload|.
+
+  Returns:
+    tuple (value, pos) where pos is the position right after the value
+  """
+  tag = payload[pos:pos + 1]
+  pos += 1
+  if tag == b'N':
+    return (None, pos)
+  if tag == b'T':
+    return (True, pos)
+  if tag == b'F':
+    return (False, pos)
+  if tag == b'i':
+    return (_INT.unpack_from(payload, pos)[0], pos + _INT.size)
+  if tag == b'd':
+    return (_FLOAT.unpack_from(payload, pos)[0], pos + _FLOAT.size)
+  if tag in (b's', b'b', b'l', b'm'):
+    size = _HEADER.unpack_from(payload, pos)[0]
+    pos += _HEADER.size
+    if tag in (b's', b'b'):
+      data = payload[pos:pos + size]
+      if len(data) != size:
+        raise BinaryRPCError('truncated payload')
+      if tag == b'b':
+        return (Binary(data), pos + size)
+      if str is not bytes:
+        data = data.decode('utf-8')
+      return (data, pos + size)
+    if tag == b'l':
+      items = []
+      for _ in range(size):
+        item, pos = _decode(payload, pos)
+        items.append(item)
+      return (items, pos)
+    items = {}
+    for _ in range(size):
+      key, pos = _decode(payload, pos)
+      items[key], pos = _decode(payload, pos)
+    return (items, pos)
+  raise BinaryRPCError('unknown type tag %r at %d' % (tag, pos - 1))
+
+
+def decode(payload):
+  """Decode a payload created by encode().
+
+  Strings are decoded to the native str type, binary data to Binary.
+
+  Raises:
+    BinaryRPCError: if |payload| is malformed
+  """
+  try:
+    value, pos = _decode(payload, 0)
+  except struct.error:
+    raise BinaryRPCError('truncated payload')
+  if pos != len(payload):
+    raise BinaryRPCError('%d trailing bytes in payload' % (len(payload) - pos))
+  return value
+
+
+def _recv_exact(sock, size):
+  """Read exactly |size| bytes from |sock|.
+
+  Returns:
+    the bytes read, or None if the connection was closed before any byte
+    was read
+
+  Raises:
+    BinaryRPCError: if the connection was closed after a partial read
+  """
+  chunks = []
+  remaining = size
+  while remaining:
+    chunk = sock.recv(remaining)
+    if not chunk:
+      if remaining == size:
+        return None
+      raise BinaryRPCError('connection closed mid frame')
+    chunks.append(chunk)
+    remaining -= len(chunk)
+  return b''.join(chunks)
+
+
+def send_frame(sock, value):
+  """Encode |value| and send it as one frame on |sock|."""
+  payload = encode(value)
+  sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+  """Receive one frame from |sock| and decode it.
+
+  Returns:
+    tuple (closed, value). closed is True if the peer closed the connection
+    instead of sending a frame.
+
+  Raises:
+    BinaryRPCError: if the frame is malformed or too large
+  """
+  header = _recv_exact(sock, _HEADER.size)
+  if header is None:
+    return (True, None)
+  size = _HEADER.unpack(header)[0]
+  if size > MAX_FRAME_SIZE:
+    raise BinaryRPCError('frame of %d bytes exceeds %d' % (size,
+                                                           MAX_FRAME_SIZE))
+  payload = _recv_exact(sock, size) if size else b''
+  if payload is None:
+    raise BinaryRPCError('connection closed mid frame')
+  return (False, decode(payload))
+
+
+def _fault_string(e):
+  """Format exception |e| the way SimpleXMLRPCServer does for its faults."""
+  return '%s:%s' % (type(e), e)
+
+
+class BinaryRPCRequestHandler(socketserver.BaseRequestHandler):
+  """Serve requests on one connection until the client closes it."""
+
+  def setup(self):
+    if self.request.family != getattr(socket, 'AF_UNIX', None):
+      self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+  def handle(self):
+    # pylint: disable=broad-except
+    # Any failure of a method is reported back to the client as a fault.
+    while True:
+      try:
+        closed, request = recv_frame(self.request)
+      except (BinaryRPCError, socket.error) as e:
+        self.server.logger.debug('Dropping connection: %s', e)
+        return
+      if closed:
+        return
+      try:
+        method, params = request
+        response = [_RESPONSE_OK, self.server.dispatch(method, params)]
+        payload = encode(response)
+      except Exception as e:
+        payload = encode([_RESPONSE_FAULT, FAULT_CODE, _fault_string(e)])
+      try:
+        self.request.sendall(_HEADER.pack(len(payload)) + payload)
+      except socket.error as e:
+        self.server.logger.debug('Dropping connection: %s', e)
+        return
+
+
+class _BinaryRPCServerMixIn(object):
+  """Dispatch binary RPC requests to the methods of an instance."""
+
+  # Each connection is served on its own thread, which does not prevent
+  # turning down servod.
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def register_instance(self, instance):
+    """Dispatch requests to the public methods of |instance|."""
+    self.instance = instance
+    self.logger = logging.getLogger(type(self).__name__)
+
+  def _multicall(self, calls):
+    """Run |calls| the way SimpleXMLRPCServer's system.multicall does."""
+    # pylint: disable=broad-except
+    results = []
+    for call in calls:
+      try:
+        results.append([self.dispatch(call['methodName'], call['params'])])
+      except Exception as e:
+        results.append({'faultCode': FAULT_CODE,
+                        'faultString': _fault_string(e)})
+    return results
+
+  def dispatch(self, method, params):
+    """Call |method| of the registered instance with |params|.
+
+    Raises:
+      BinaryRPCError: if |method| is not a public method of the instance
+    """
+    if method == 'system.multicall':
+      return self._multicall(*params)
+    func = None
+    if not method.startswith('_') and '.' not in method:
+      func = getattr(self.instance, method, None)
+    if not callable(func):
+      raise BinaryRPCError('method "%s" is not supported' % method)
+    return func(*params)
+
+
+class BinaryRPCServer(_BinaryRPCServerMixIn, socketserver.ThreadingMixIn,
+                      socketserver.TCPServer):
+  """Binary RPC server listening on a TCP port."""
+
+  def __init__(self, addr):
+    socketserver.TCPServer.__init__(self, addr, BinaryRPCRequestHandler)
+
+
+class UnixBinaryRPCServer(_BinaryRPCServerMixIn, socketserver.ThreadingMixIn,
+                          socketserver.UnixStreamServer):
+  """Binary RPC server listening on a Unix socket.
+
+  Local clients can use it to skip the TCP stack entirely.
+  """
+
+  def __init__(self, path):
+    # Whether |path| is this server's socket, to be removed on close.
+    self._bound = False
+    self._RemoveStaleSocket(path)
+    socketserver.UnixStreamServer.__init__(self, path,
+                                           BinaryRPCRequestHandler)
+
+  @classmethod
+  def _RemoveStaleSocket(cls, path):
+    """Remove the socket left at |path| by an instance that is gone.
+
+    A stale socket would make bind() fail. Anything else at |path|, like the
+    socket of a running servod or a regular file, is left alone, and bind()
+    fails on it.
+    """
+    try:
+      if not stat.S_ISSOCK(os.lstat(path).st_mode):
+        return
+    except OSError as e:
+      if e.errno != errno.ENOENT:
+        raise
+      return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      probe.connect(path)
+    except socket.error as e:
+      if e.errno != errno.ECONNREFUSED:
+        return
+      logging.getLogger(cls.__name__).info('Removing stale socket %s', path)
+      os.unlink(path)
+    finally:
+      probe.close()
+
+  def server_bind(self):
+    socketserver.UnixStreamServer.server_bind(self)
+    self._bound = True
+
+  def server_close(self):
+    socketserver.UnixStreamServer.server_close(self)
+    if not self._bound:
+      # bind() failed: |server_address| belongs to someone else.
+      return
+    self._bound = False
+    try:
+      os.unlink(self.server_address)
+    except OSError:
+      pass
+
+
+class _Method(object):
+  """Callable sending one method call through a ServerProxy."""
+
+  def __init__(self, send, name):
+    self._send = send
+    self._name = name
+
+  def __getattr__(self, name):
+    return _Method(self._send, '%s.%s' % (self._name, name))
+
+  def __call__(self, *params):
+    return self._send(self._name, list(params))
+
+
+class ServerProxy(object):
+  """Binary RPC counterpart of xmlrpclib.ServerProxy.
+
+  The connection is opened on first use and kept open between calls. Like
+  xmlrpclib.ServerProxy, an instance must not be used by multiple threads at
+  the same time.
+  """
+
+  def __init__(self, address, timeout=None):
+    """Constructor for ServerProxy Class
+
+    Args:
+      address: (host, port) tuple for a TCP server, or path string of a Unix
+               socket server
+      timeout: socket timeout in seconds, None to block
+    """
+    self._address = address
+    self._timeout = timeout
+    self._sock = None
+    self._lock = threading.Lock()
+
+  def _connect(self):
+    """Open the connection to the server."""
+    if isinstance(self._address, _TEXT_TYPES):
+      sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+      sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+      sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.settimeout(self._timeout)
+    try:
+      sock.connect(self._address)
+    except socket.error:
+      sock.close()
+      raise
+    self._sock = sock
+
+  def close(self):
+    """Close the connection. The next call opens a new one."""
+    if self._sock:
+      self._sock.close()
+      self._sock = None
+
+  def _request(self, method, params):
+    """Send one request and wait for its response.
+
+    Raises:
+      Fault: if the method failed on the server
+      BinaryRPCError: if the response is malformed
+      socket.error: if the connection failed
+    """
+    with self._lock:
+      if not self._sock:
+        self._connect()
+      try:
+        send_frame(self._sock, [method, params])
+        closed, response = recv_frame(self._sock)
+        if closed:
+          raise BinaryRPCError('connection closed by server')
+      except Exception:
+        # The connection state is unknown: start over on the next call.
+        self.close()
+        raise
+    if response[0] == _RESPONSE_FAULT:
+      raise Fault(response[1], response[2])
+    return response[1]
+
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    return _Method(self._request, name)
+
+  def __call__(self, attr):
+    """Access to the proxy itself, mirroring xmlrpclib.ServerProxy."""
+    if attr == 'close':
+      return self.close
+    raise AttributeError('Attribute %r not found' % attr)
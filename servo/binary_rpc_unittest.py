@@ -0,0 +1,158 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Unit tests for binary_rpc."""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import binary_rpc
+
+
+class FakeServod(object):
+  """Minimal stand-in for the servod instance served over RPC."""
+
+  def __init__(self):
+    self.controls = {'ppvar_vbat_mv': 7600}
+
+  def get(self, name):
+    if name not in self.controls:
+      raise NameError('No control named %s' % name)
+    return self.controls[name]
+
+  def set(self, name, value):
+    self.controls[name] = value
+    return True
+
+  def _private(self):
+    return 'secret'
+
+
+class TestCodec(unittest.TestCase):
+
+  def test_RoundTrip(self):
+    """Supported values decode to what was encoded."""
+    value = [None, True, False, -2**40, 1.5, 'ec_uart_pty', [],
+             {'faultCode': 1, 'faultString': 'oops'}, [[1, 2], 'a']]
+    self.assertEqual(value, binary_rpc.decode(binary_rpc.encode(value)))
+
+  def test_TupleDecodesToList(self):
+    """Tuples are sent as lists, like xmlrpc does."""
+    self.assertEqual([1, 2], binary_rpc.decode(binary_rpc.encode((1, 2))))
+
+  def test_BinaryRoundTrip(self):
+    """Binary data decodes to a Binary holding the same bytes."""
+    blob = binary_rpc.Binary(b'\x00\x01\xff')
+    self.assertEqual(blob.data,
+                     binary_rpc.decode(binary_rpc.encode(blob)).data)
+
+  def test_TruncatedPayload(self):
+    """Truncated payloads are rejected."""
+    payload = binary_rpc.encode(['get', ['ppvar_vbat_mv']])
+    with self.assertRaises(binary_rpc.BinaryRPCError):
+      binary_rpc.decode(payload[:-3])
+
+  def test_TrailingBytes(self):
+    """Payloads with bytes after the value are rejected."""
+    with self.assertRaises(binary_rpc.BinaryRPCError):
+      binary_rpc.decode(binary_rpc.encode(1) + b'N')
+
+  def test_UnsupportedType(self):
+    """Values of unsupported types cannot be encoded."""
+    with self.assertRaises(binary_rpc.BinaryRPCError):
+      binary_rpc.encode(object())
+
+
+class TestUnixServer(unittest.TestCase):
+
+  def setUp(self):
+    """Serve a FakeServod on a Unix socket."""
+    unittest.TestCase.setUp(self)
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'servod.sock')
+    self.server = binary_rpc.UnixBinaryRPCServer(self.path)
+    self.server.register_instance(FakeServod())
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.start()
+    self.proxy = binary_rpc.ServerProxy(self.path)
+
+  def tearDown(self):
+    """Turn down the server and remove the socket."""
+    self.proxy.close()
+    self.server.shutdown()
+    self.server.server_close()
+    self.thread.join()
+    shutil.rmtree(self.tmpdir)
+    unittest.TestCase.tearDown(self)
+
+  def test_GetSet(self):
+    """Calls reach the instance and reuse one connection."""
+    self.assertTrue(self.proxy.set('ppvar_vbat_mv', 7000))
+    self.assertEqual(7000, self.proxy.get('ppvar_vbat_mv'))
+
+  def test_FaultLikeXmlrpc(self):
+    """Exceptions raised by the instance come back as Fault."""
+    with self.assertRaises(binary_rpc.Fault) as ctx:
+      self.proxy.get('bogus')
+    self.assertIn('No control named bogus', ctx.exception.faultString)
+    # The connection is still usable after a fault.
+    self.assertEqual(7600, self.proxy.get('ppvar_vbat_mv'))
+
+  def test_PrivateMethodRejected(self):
+    """Only public methods of the instance are served."""
+    with self.assertRaises(binary_rpc.Fault):
+      self.proxy._request('_private', [])
+
+  def test_Multicall(self):
+    """system.multicall reports failures per call."""
+    results = self.proxy.system.multicall([
+        {'methodName': 'set', 'params': ['ppvar_vbat_mv', 1]},
+        {'methodName': 'get', 'params': ['bogus']},
+        {'methodName': 'get', 'params': ['ppvar_vbat_mv']}])
+    self.assertEqual([True], results[0])
+    self.assertIn('No control named bogus', results[1]['faultString'])
+    self.assertEqual([1], results[2])
+
+  def test_SocketRemovedOnClose(self):
+    """Closing the server removes its socket file."""
+    self.server.shutdown()
+    self.server.server_close()
+    self.assertFalse(os.path.exists(self.path))
+
+  def test_LiveSocketKept(self):
+    """A second server does not take over the socket of a running one."""
+    with self.assertRaises(socket.error):
+      binary_rpc.UnixBinaryRPCServer(self.path)
+    self.assertEqual(7600, self.proxy.get('ppvar_vbat_mv'))
+
+  def test_StaleSocketReplaced(self):
+    """The socket left by a server that is gone is replaced."""
+    self.server.shutdown()
+    self.server.server_close()
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(self.path)
+    stale.close()
+    self.server = binary_rpc.UnixBinaryRPCServer(self.path)
+    self.server.register_instance(FakeServod())
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.start()
+    self.assertEqual(7600, self.proxy.get('ppvar_vbat_mv'))
+
+  def test_RegularFileKept(self):
+    """Files that are not sockets are never removed."""
+    path = os.path.join(self.tmpdir, 'file')
+    with open(path, 'w') as f:
+      f.write('data')
+    with self.assertRaises(socket.error):
+      binary_rpc.UnixBinaryRPCServer(path)
+    with open(path) as f:
+      self.assertEqual('data', f.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -5,6 +5,7 @@
 """
 
 import re
+import threading
 try:
   from xmlrpclib import ServerProxy, Fault
 except ImportError:
@@ -12,6 +13,13 @@ except ImportError:
   # Remove once fully moved to python3.
   from xmlrpc.client import ServerProxy, Fault
 
+try:
+  import binary_rpc
+except ImportError:
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+  from servo import binary_rpc
+
 DEFAULT_HOST = 'localhost'
 DEFAULT_PORT = 9999
 
@@ -56,24 +64,145 @@ class ServoClientError(Exception):
       self.message = text
 
 
+class ServoBatch(object):
+  """Gets & sets queued to be sent to servod in one round trip.
+
+  Usage:
+    batch = client.batch()
+    batch.set('cold_reset', 'on')
+    batch.get('ppvar_vbat_mv')
+    names = batch.names
+    for name, result in zip(names, batch.run()):
+      if isinstance(result, ServoClientError):
+        ...
+
+  The queued calls are executed by servod in order, using system.multicall. A
+  failing call does not prevent the following ones from running.
+  """
+
+  def __init__(self, client):
+    """Constructor for ServoBatch Class
+
+    Args:
+      client: ServoClient to send the batch through
+    """
+    self._client = client
+    self._calls = []
+
+  def __len__(self):
+    return len(self._calls)
+
+  @property
+  def names(self):
+    """List of control names of the queued calls, in order."""
+    return [params[0] for _, params, _ in self._calls]
+
+  def get(self, name):
+    """Queue getting the value of control |name|."""
+    self._calls.append(('get', [name], "Problem getting '%s'" % name))
+
+  def set(self, name, value):
+    """Queue setting control |name| to |value|."""
+    self._calls.append(('set', [name, value],
+                        "Problem setting '%s' to '%s'" % (name, value)))
+
+  def run(self):
+    """Send all queued calls to servod and clear the queue.
+
+    Returns:
+      list with one entry per queued call, in order: the value returned by
+      servod, or a ServoClientError describing why that call failed.
+
+    Raises:
+      ServoClientError: If the batch as a whole could not be executed.
+    """
+    calls, self._calls = self._calls, []
+    if not calls:
+      return []
+    multicall = [{'methodName': method, 'params': params}
+                 for method, params, _ in calls]
+    try:
+      # pylint: disable=protected-access
+      results = self._client._server.system.multicall(multicall)
+    except Fault as e:
+      raise ServoClientError('Problem running batch of %d calls' % len(calls),
+                             e)
+    rv = []
+    for (_, _, error_text), result in zip(calls, results):
+      if isinstance(result, dict):
+        fault = Fault(result.get('faultCode'), result.get('faultString', ''))
+        rv.append(ServoClientError(error_text, fault))
+      else:
+        rv.append(result[0])
+    return rv
+
+
 class ServoClient(object):
   """Class to link client to servod via xmlrpc.
 
   Beyond method initialize, the remaining methods (doc_all, doc, get, get_all,
   set) have a corresponding method implmented in servod's server.
+
+  Each thread using the client gets its own connection to servod, kept open
+  between calls when servod supports it.
+
+  When |binary_address| is given, calls go through servod's binary RPC
+  listener instead of XML-RPC. See binary_rpc.py.
   """
 
-  def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+  def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False,
+               binary_address=None):
     """Constructor for ServoClient Class
 
     Args:
       host: name or IP address of servo server host
       port: TCP port on which servod is listening on
       verbose: enable verbose messaging across ServerProxy
+      binary_address: (host, port) tuple of servod's binary RPC TCP listener,
+                      or path string of its Unix socket. None to use XML-RPC.
     """
     self._verbose = verbose
-    remote = 'http://%s:%s' % (host, port)
-    self._server = ServerProxy(remote, verbose=self._verbose, allow_none=True)
+    self._remote = 'http://%s:%s' % (host, port)
+    self._binary_address = binary_address
+    self._local = threading.local()
+    # Whether servod has get_batch(). Older servods only have set_get_all().
+    self._has_get_batch = True
+
+  @property
+  def _server(self):
+    """ServerProxy of the calling thread.
+
+    ServerProxy keeps its connection open between requests, but a connection
+    can only carry one request at a time. Giving each thread its own proxy
+    lets threads share the client without serializing their calls.
+    """
+    server = getattr(self._local, 'server', None)
+    if server is None:
+      if self._binary_address:
+        server = binary_rpc.ServerProxy(self._binary_address)
+      else:
+        server = ServerProxy(self._remote, verbose=self._verbose,
+                             allow_none=True)
+      self._local.server = server
+    return server
+
+  def close(self):
+    """Close the calling thread's connection to servod.
+
+    A new connection is opened by the next call.
+    """
+    server = getattr(self._local, 'server', None)
+    if server is not None:
+      self._local.server = None
+      server('close')()
+
+  def batch(self):
+    """Create a ServoBatch to send multiple gets & sets in one round trip.
+
+    Returns:
+      empty ServoBatch sent through this client
+    """
+    return ServoBatch(self)
 
   def doc_all(self):
     """Get the doc string for all controls from servo.
@@ -142,6 +271,136 @@ class ServoClient(object):
       raise ServoClientError('Problem with %s' % (controls), e)
     return rv
 
+  def get_batch(self, names):
+    """Get the values from servo for multiple controls.
+
+    Controls on different interfaces are read in parallel by servod. servods
+    without get_batch read them one after another, through set_get_all.
+
+    Args:
+      names: list of strings, names of controls to get values for.
+
+    Returns:
+      list of values, in the same order as |names|
+
+    Raises:
+      ServoClientError: If error occurs getting values.
+    """
+    if self._has_get_batch:
+      try:
+        return self._server.get_batch(names)
+      except Fault as e:
+        if 'method "get_batch" is not supported' not in e.faultString:
+          raise ServoClientError('Problem getting %s' % (names), e)
+        self._has_get_batch = False
+    return self.set_get_all(names)
+
+  def set_group(self, controls):
+    """Set multiple gpio controls at the same time.
+
+    Consecutive gpio controls on the same servo interface change in a single
+    transaction. Controls are set in the order of |controls|.
+
+    Args:
+      controls: list of strings, control:value to set.
+
+    Raises:
+      ServoClientError: If error occurs setting values.
+    """
+    try:
+      self._server.set_group(controls)
+    except Fault as e:
+      raise ServoClientError('Problem setting %s' % (controls), e)
+
+  def get_group(self, names):
+    """Get multiple gpio controls from the same read.
+
+    Args:
+      names: list of strings, names of controls to get values for.
+
+    Returns:
+      list of values, in the same order as |names|
+
+    Raises:
+      ServoClientError: If error occurs getting values.
+    """
+    try:
+      return self._server.get_group(names)
+    except Fault as e:
+      raise ServoClientError('Problem getting %s' % (names), e)
+
+  def sample_inas(self, names):
+    """Sample INA2xx power rail controls with one I2C burst per bus.
+
+    Args:
+      names: list of strings, names of controls to sample.
+
+    Returns:
+      tuple (timestamp, values) where values is a list in the same order as
+      |names|
+
+    Raises:
+      ServoClientError: If error occurs sampling values.
+    """
+    try:
+      timestamp, values = self._server.sample_inas(names)
+    except Fault as e:
+      raise ServoClientError('Problem sampling %s' % (names), e)
+    return (timestamp, values)
+
+  def start_sampling(self, names, interval):
+    """Start sampling controls continuously on servod.
+
+    Args:
+      names: list of strings, names of controls to sample.
+      interval: seconds between two samples, 0 to sample as fast as possible.
+
+    Returns:
+      sampler id to pass to get_samples() and stop_sampling()
+
+    Raises:
+      ServoClientError: If error occurs starting the sampler.
+    """
+    try:
+      return self._server.start_sampling(names, interval)
+    except Fault as e:
+      raise ServoClientError('Problem sampling %s' % (names), e)
+
+  def get_samples(self, sampler_id, cursor=0):
+    """Retrieve the samples taken by a servod sampler since |cursor|.
+
+    Args:
+      sampler_id: id returned by start_sampling()
+      cursor: cursor returned by the previous get_samples(), 0 for all samples
+
+    Returns:
+      tuple (cursor, dropped, blob) where blob holds the packed samples. See
+      ctrl_sampler.unpack_samples() to unpack them.
+
+    Raises:
+      ServoClientError: If error occurs retrieving samples.
+    """
+    try:
+      cursor, dropped, blob = self._server.get_samples(sampler_id, cursor)
+    except Fault as e:
+      raise ServoClientError('Problem getting samples of sampler %r' %
+                             sampler_id, e)
+    return (cursor, dropped, blob.data)
+
+  def stop_sampling(self, sampler_id):
+    """Stop a servod sampler.
+
+    Args:
+      sampler_id: id returned by start_sampling()
+
+    Raises:
+      ServoClientError: If error occurs stopping the sampler.
+    """
+    try:
+      self._server.stop_sampling(sampler_id)
+    except Fault as e:
+      raise ServoClientError('Problem stopping sampler %r' % sampler_id, e)
+
   def set(self, name, value):
     """Set the value from servo for control name.
 
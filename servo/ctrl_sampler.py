@@ -0,0 +1,214 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Servod-side continuous sampling of controls into a ring buffer."""
+
+import logging
+import struct
+import threading
+import time
+
+import numpy
+
+# Byte layout of one packed sample value: little-endian double.
+SAMPLE_FORMAT = '<d'
+SAMPLE_SIZE = struct.calcsize(SAMPLE_FORMAT)
+
+# Seconds to wait at least before sampling again after a failed sample, so that
+# a sampler with no interval does not spin on a failing control.
+ERROR_BACKOFF_SECS = 0.1
+
+
+class CtrlSamplerError(Exception):
+  """Error class for CtrlSampler errors."""
+
+
+def pack_samples(rows):
+  """Pack a 2D array of samples into a binary blob.
+
+  Args:
+    rows: numpy array of shape (nrows, width)
+
+  Returns:
+    string of nrows * width little-endian doubles, row after row
+  """
+  return numpy.ascontiguousarray(rows, dtype=SAMPLE_FORMAT).tobytes()
+
+
+def unpack_samples(blob, width):
+  """Unpack a binary blob created by pack_samples().
+
+  Args:
+    blob: string of packed samples
+    width: number of values per row
+
+  Returns:
+    list of rows, each a tuple of |width| floats
+  """
+  count = len(blob) // SAMPLE_SIZE
+  values = struct.unpack('<%dd' % count, blob[:count * SAMPLE_SIZE])
+  return [values[i:i + width] for i in range(0, count, width)]
+
+
+class SampleRingBuffer(object):
+  """Fixed-size buffer of numeric sample rows.
+
+  Rows are addressed through a cursor: the total number of rows ever appended.
+  Readers keep the cursor returned by read() to fetch only newer rows on the
+  next call. Once more than |capacity| rows were appended, the oldest ones are
+  overwritten.
+  """
+
+  def __init__(self, width, capacity):
+    """Allocate the buffer.
+
+    Args:
+      width: number of values per row
+      capacity: number of rows kept before the oldest ones are overwritten
+    """
+    if capacity <= 0:
+      raise CtrlSamplerError('capacity must be positive, not %d' % capacity)
+    self._data = numpy.empty((capacity, width))
+    self._capacity = capacity
+    self._count = 0
+    self._lock = threading.Lock()
+
+  def append(self, row):
+    """Append one row of |width| values."""
+    with self._lock:
+      self._data[self._count % self._capacity] = row
+      self._count += 1
+
+  def read(self, cursor=0):
+    """Read all rows appended since |cursor|.
+
+    Args:
+      cursor: cursor returned by a previous read(), or 0 to read all rows
+
+    Returns:
+      tuple (cursor, dropped, rows) where:
+        cursor: cursor to pass to the next read()
+        dropped: number of rows since |cursor| that were already overwritten
+        rows: numpy array of the rows, oldest first
+    """
+    with self._lock:
+      if cursor < 0 or cursor > self._count:
+        raise CtrlSamplerError('cursor %d out of range [0, %d]' %
+                               (cursor, self._count))
+      start = max(cursor, self._count - self._capacity)
+      first = start % self._capacity
+      last = self._count % self._capacity
+      if self._count - start == 0:
+        rows = self._data[0:0].copy()
+      elif first < last:
+        rows = self._data[first:last].copy()
+      else:
+        rows = numpy.concatenate((self._data[first:], self._data[:last]))
+      return (self._count, start - cursor, rows)
+
+
+class CtrlSampler(threading.Thread):
+  """Thread sampling controls at a fixed interval into a SampleRingBuffer.
+
+  Each row holds the sample timestamp in seconds since epoch, followed by the
+  value of each control. Values that fail to sample, or are not numeric, are
+  recorded as NaN.
+
+  The sampler stops by itself once its samples were not read() for
+  |idle_timeout| seconds, so that an abandoned sampler does not keep sampling
+  and holding its buffer forever.
+
+  Attributes:
+    names: list of control names being sampled
+    buffer: SampleRingBuffer holding the samples
+  """
+
+  def __init__(self, sample_func, names, interval, capacity,
+               idle_timeout=None):
+    """Setup sampler thread.
+
+    Args:
+      sample_func: function taking no arguments and returning a tuple
+                   (timestamp, values), values being in the order of |names|
+      names: list of control names |sample_func| samples
+      interval: seconds between the start of two samples. 0 to sample as
+                fast as possible
+      capacity: number of samples kept in the buffer
+      idle_timeout: seconds without read() after which the sampler stops.
+                    None to never stop on its own
+    """
+    super(CtrlSampler, self).__init__()
+    self.daemon = True
+    self._logger = logging.getLogger(type(self).__name__)
+    self._sample_func = sample_func
+    self._interval = interval
+    self._idle_timeout = idle_timeout
+    self._last_read = time.time()
+    self._stop_signal = threading.Event()
+    self.names = names
+    self.buffer = SampleRingBuffer(len(names) + 1, capacity)
+
+  def stop(self):
+    """Signal the sampler to stop and wait for it to finish."""
+    self._stop_signal.set()
+    if self.is_alive():
+      self.join()
+
+  def read(self, cursor=0):
+    """Read the samples taken since |cursor|, see SampleRingBuffer.read().
+
+    This also keeps the sampler from stopping on |idle_timeout|.
+    """
+    self._last_read = time.time()
+    return self.buffer.read(cursor)
+
+  def _is_idle(self):
+    """Whether the samples were not read for more than |_idle_timeout|."""
+    return (self._idle_timeout is not None and
+            time.time() - self._last_read > self._idle_timeout)
+
+  def _to_float(self, value):
+    """Convert |value| to float, NaN if it is not numeric."""
+    try:
+      return float(value)
+    except (TypeError, ValueError):
+      return float('nan')
+
+  def run(self):
+    """Sample at |_interval| until stopped.
+
+    Sample start times are scheduled on a fixed grid, so that the time spent
+    sampling does not accumulate as drift. If a sample overran one or more
+    intervals, the missed slots are skipped. After a failed sample, the next
+    one starts no sooner than ERROR_BACKOFF_SECS later.
+    """
+    next_time = time.time()
+    while not self._stop_signal.is_set():
+      if self._is_idle():
+        self._logger.warn('Samples of %s not read for %ss. Stopping.',
+                          ', '.join(self.names), self._idle_timeout)
+        break
+      failed = False
+      # pylint: disable=broad-except
+      try:
+        timestamp, values = self._sample_func()
+        row = [timestamp] + [self._to_float(v) for v in values]
+      except Exception as e:
+        self._logger.warn('Sampling %s failed: %s. Recording them all as NaN.',
+                          ', '.join(self.names), e)
+        row = [time.time()] + [float('nan')] * len(self.names)
+        failed = True
+      self.buffer.append(row)
+      now = time.time()
+      if self._interval:
+        next_time += self._interval
+        if next_time < now:
+          next_time += ((now - next_time) // self._interval + 1) * \
+              self._interval
+      else:
+        next_time = now
+      if failed:
+        next_time = max(next_time, now + ERROR_BACKOFF_SECS)
+      if next_time > now:
+        self._stop_signal.wait(next_time - now)
@@ -0,0 +1,130 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Unit tests for ctrl_sampler."""
+
+import math
+import threading
+import time
+import unittest
+
+import ctrl_sampler
+
+
+class TestSampleRingBuffer(unittest.TestCase):
+
+  def setUp(self):
+    """Set up a small buffer to wrap around quickly."""
+    unittest.TestCase.setUp(self)
+    self.buf = ctrl_sampler.SampleRingBuffer(width=2, capacity=4)
+
+  def fill(self, count, start=0):
+    """Helper to append |count| rows [i, 10 * i] starting at i = |start|."""
+    for i in range(start, start + count):
+      self.buf.append([i, 10 * i])
+
+  def test_ReadEmpty(self):
+    """Reading an empty buffer returns no rows."""
+    cursor, dropped, rows = self.buf.read()
+    self.assertEqual(0, cursor)
+    self.assertEqual(0, dropped)
+    self.assertEqual(0, len(rows))
+
+  def test_ReadSinceCursor(self):
+    """Only rows appended after the cursor are returned."""
+    self.fill(2)
+    cursor, _, rows = self.buf.read()
+    self.assertEqual(2, cursor)
+    self.assertEqual([0, 1], list(rows[:, 0]))
+    self.fill(1, start=2)
+    cursor, dropped, rows = self.buf.read(cursor)
+    self.assertEqual(3, cursor)
+    self.assertEqual(0, dropped)
+    self.assertEqual([[2, 20]], rows.tolist())
+
+  def test_WrapAroundKeepsOrder(self):
+    """Rows are returned oldest first once the buffer wrapped around."""
+    self.fill(6)
+    cursor, dropped, rows = self.buf.read()
+    self.assertEqual(6, cursor)
+    self.assertEqual(2, dropped)
+    self.assertEqual([2, 3, 4, 5], list(rows[:, 0]))
+
+  def test_ReadFullBufferAtBoundary(self):
+    """A full buffer ending exactly at the array boundary reads completely."""
+    self.fill(8)
+    _, dropped, rows = self.buf.read(4)
+    self.assertEqual(0, dropped)
+    self.assertEqual([4, 5, 6, 7], list(rows[:, 0]))
+
+  def test_CursorOutOfRange(self):
+    """A cursor past the written rows is rejected."""
+    self.fill(1)
+    with self.assertRaises(ctrl_sampler.CtrlSamplerError):
+      self.buf.read(2)
+
+  def test_PackRoundTrip(self):
+    """Packed rows unpack to the same values."""
+    self.fill(3)
+    _, _, rows = self.buf.read()
+    blob = ctrl_sampler.pack_samples(rows)
+    self.assertEqual(rows.tolist(),
+                     [list(r) for r in ctrl_sampler.unpack_samples(blob, 2)])
+
+
+class TestCtrlSampler(unittest.TestCase):
+
+  def test_FailedSampleRecordedAsNaN(self):
+    """Failed samples & non-numeric values are recorded as NaN."""
+    done = threading.Event()
+    calls = []
+
+    def sample():
+      calls.append(None)
+      if len(calls) == 1:
+        return (1.0, [5, 'on'])
+      if len(calls) == 2:
+        raise IOError('i2c failure')
+      # Slow down any further samples until the sampler is stopped.
+      done.set()
+      time.sleep(0.01)
+      return (2.0, [0, 0])
+
+    sampler = ctrl_sampler.CtrlSampler(sample, ['a', 'b'], interval=0,
+                                       capacity=1000)
+    sampler.start()
+    done.wait(5)
+    sampler.stop()
+    _, _, rows = sampler.buffer.read()
+    self.assertEqual([1.0, 5.0], list(rows[0][:2]))
+    self.assertTrue(math.isnan(rows[0][2]))
+    self.assertTrue(all(math.isnan(v) for v in rows[1][1:]))
+
+  def test_FailingSamplesBackOff(self):
+    """A failing control is not sampled in a tight loop."""
+    calls = []
+
+    def sample():
+      calls.append(None)
+      raise IOError('i2c failure')
+
+    sampler = ctrl_sampler.CtrlSampler(sample, ['a'], interval=0,
+                                       capacity=1000)
+    sampler.start()
+    time.sleep(ctrl_sampler.ERROR_BACKOFF_SECS * 2.5)
+    sampler.stop()
+    self.assertLessEqual(len(calls), 4)
+
+  def test_StopsWhenIdle(self):
+    """A sampler stops once its samples are not read for |idle_timeout|."""
+    sampler = ctrl_sampler.CtrlSampler(lambda: (time.time(), [1]), ['a'],
+                                       interval=0.01, capacity=1000,
+                                       idle_timeout=0.05)
+    sampler.start()
+    sampler.join(5)
+    self.assertFalse(sampler.is_alive())
+
+
+if __name__ == '__main__':
+  unittest.main()
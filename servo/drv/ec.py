@@ -397,7 +397,11 @@ class ec(pty_driver.ptyDriver):
     return result[1]
 
   def _get_battery_values(self):
-    """Retrieves various battery related values.
+    """Retrieves various battery related values, cached briefly."""
+    return self._get_cached('battery', self._read_battery_values)
+
+  def _read_battery_values(self):
+    """Reads various battery related values.
 
     Battery command in the EC currently exposes the following information:
        Temp:      0x0be1 = 304.1 K (31.0 C)
@@ -510,6 +514,10 @@ class ec(pty_driver.ptyDriver):
     return bool(int(results[0][1]))
 
   def _get_pwr_avg(self):
+    """Retrieves battery power average, cached briefly."""
+    return self._get_cached('pwr_avg', self._read_pwr_avg)
+
+  def _read_pwr_avg(self):
     """Uses ec pwr_avg command to retrieve battery power average.
 
     pwr_avg function provides a one minute power average based on battery data.
@@ -557,7 +565,11 @@ class ec(pty_driver.ptyDriver):
     return self._get_pwr_avg()['mw']
 
   def _get_fan_values(self):
-    """Retrieve fan related values.
+    """Retrieve fan related values, cached briefly."""
+    return self._get_cached('faninfo', self._read_fan_values)
+
+  def _read_fan_values(self):
+    """Read fan related values.
 
     'faninfo' command in the EC exposes the following information:
       Fan actual speed: 6694 rpm
@@ -0,0 +1,104 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Unit tests for the ec driver's cached multi-field commands."""
+
+import unittest
+
+import ec
+import pty_driver
+
+# Parsed results of the console commands, as _issue_cmd_get_results() returns
+# them for the regular expressions of the ec driver.
+RESULTS = {
+    'battery': [('', '31.0'), ('', '7927'), ('', '1705'), ('', '66'),
+                ('', '5489'), ('', '8358'), ('', '8500')],
+    'pwr_avg': [('', '7900', '-500', '-3950')],
+    'faninfo': [('', '6694'), ('', '6600'), ('', '41')],
+}
+
+
+class FakeInterface(object):
+  """Console interface, only holding the state the drivers keep on it."""
+
+  def get_pty(self):
+    return '/dev/null'
+
+
+class FakeClock(object):
+  """Clock for the cache of command results, advanced by the tests."""
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def time(self):
+    return self.now
+
+
+class TestEcCachedCommands(unittest.TestCase):
+
+  def setUp(self):
+    """Set up a console whose commands are recorded in |self.cmds|."""
+    unittest.TestCase.setUp(self)
+    self._time = pty_driver.time
+    self.clock = FakeClock()
+    pty_driver.time = self.clock
+    self.interface = FakeInterface()
+    self.cmds = []
+
+  def tearDown(self):
+    """Restore the clock."""
+    pty_driver.time = self._time
+    unittest.TestCase.tearDown(self)
+
+  def _issue_cmd_get_results(self, cmds, regex_list, flush=None,
+                             timeout=pty_driver.DEFAULT_UART_TIMEOUT):
+    """Record console command |cmds| and return its parsed results."""
+    self.cmds.append(cmds)
+    return RESULTS.get(cmds, [])
+
+  def _Driver(self, subtype):
+    """Return an ec driver for control |subtype| on the console."""
+    drv = ec.ec(self.interface, {'subtype': subtype})
+    # pylint: disable=protected-access
+    drv._issue_cmd_get_results = self._issue_cmd_get_results
+    return drv
+
+  def _Count(self, cmd):
+    """Return how many times |cmd| was sent to the console."""
+    return self.cmds.count(cmd)
+
+  def test_BatteryShared(self):
+    """Battery controls read within CMD_RESULT_TTL share one command."""
+    self.assertEqual(-1705, self._Driver('milliamps').get())
+    self.assertEqual(7927, self._Driver('millivolts').get())
+    self.assertEqual(66, self._Driver('battery_charge_percent').get())
+    self.assertEqual(1, self._Count('battery'))
+
+  def test_BatteryExpires(self):
+    """Battery values older than CMD_RESULT_TTL are read again."""
+    drv = self._Driver('milliamps')
+    drv.get()
+    self.clock.now += pty_driver.CMD_RESULT_TTL + 0.01
+    drv.get()
+    self.assertEqual(2, self._Count('battery'))
+
+  def test_PwrAvgShared(self):
+    """pwr_avg controls read within CMD_RESULT_TTL share one command."""
+    self.assertEqual(500, self._Driver('avg_milliamps').get())
+    self.assertEqual(7900, self._Driver('avg_millivolts').get())
+    self.assertEqual(3950, self._Driver('avg_milliwatts').get())
+    self.assertEqual(1, self._Count('pwr_avg'))
+
+  def test_FanDroppedOnSet(self):
+    """Setting the fan drops the fan values read before."""
+    self.assertEqual(6600, self._Driver('fan_target_rpm').get())
+    self.assertEqual(41, self._Driver('fan_duty').get())
+    self._Driver('fan_target_rpm').set(3000)
+    self.assertEqual(6600, self._Driver('fan_target_rpm').get())
+    self.assertEqual(2, self._Count('faninfo'))
+    self.assertIn('fanset 3000', self.cmds)
+
+
+if __name__ == '__main__':
+  unittest.main()
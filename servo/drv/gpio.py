@@ -95,3 +95,89 @@ class gpio(hw_driver.HwDriver):
     except ValueError as error:
       raise gpioError(error)
     return (offset, width)
+
+
+class GpioBank(object):
+  """Set or get many gpio controls of one interface in one transaction.
+
+  The controls' bit fields are merged into set, clear & input masks for the
+  interface's bank_wr_rd(), so all pins change at the same time, and all values
+  come from the same read.
+  """
+  # pylint: disable=protected-access
+  # The bank is an extension of the gpio drivers it drives.
+
+  def __init__(self, drvs):
+    """Constructor.
+
+    Args:
+      drvs: list of gpio instances where supports() is True, all on the same
+            interface, and no two driving the same pin
+
+    Raises:
+      gpioError: if the drivers are on different interfaces, or overlap
+    """
+    self._drvs = drvs
+    self._interface = drvs[0]._interface if drvs else None
+    if any(drv._interface is not self._interface for drv in drvs):
+      raise gpioError('gpio bank drivers are on different interfaces')
+    self._fields = [drv._get_common_params() for drv in drvs]
+    pins = 0
+    for drv in drvs:
+      mask = self.pin_mask(drv)
+      if pins & mask:
+        raise gpioError('gpio bank drivers overlap on pins 0x%x' %
+                        (pins & mask))
+      pins |= mask
+
+  @staticmethod
+  def supports(drv):
+    """Whether |drv| can be set or read as part of a bank.
+
+    Args:
+      drv: driver instance of any type
+
+    Returns:
+      True if |drv| is a gpio on an interface supporting bank_wr_rd().
+    """
+    return (isinstance(drv, gpio) and
+            hasattr(drv._interface, 'bank_wr_rd'))
+
+  @staticmethod
+  def pin_mask(drv):
+    """Return the mask of the interface's pins gpio |drv| drives."""
+    (offset, width) = drv._get_common_params()
+    return ((1 << width) - 1) << offset
+
+  def set(self, values):
+    """Set all controls in one transaction.
+
+    Args:
+      values: list of integer values to write, in the same order as the drivers
+
+    Returns:
+      list of the values read back, in the same order as the drivers
+    """
+    set_mask = clear_mask = input_mask = 0
+    for drv, (offset, width), value in zip(self._drvs, self._fields, values):
+      mask = ((1 << width) - 1) << offset
+      if drv._io_type == 'PU' and value == 1:
+        input_mask |= mask
+      else:
+        set_mask |= (value << offset) & mask
+        clear_mask |= ~(value << offset) & mask
+    return self._extract(self._interface.bank_wr_rd(set_mask, clear_mask,
+                                                    input_mask))
+
+  def get(self):
+    """Read all controls in one transaction.
+
+    Returns:
+      list of integer values, in the same order as the drivers
+    """
+    return self._extract(self._interface.bank_wr_rd())
+
+  def _extract(self, pins):
+    """Split the value of all |pins| into the controls' values."""
+    return [(pins >> offset) & ((1 << width) - 1)
+            for offset, width in self._fields]
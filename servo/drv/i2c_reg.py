@@ -4,6 +4,7 @@
 """i2c register module
 """
 import logging
+import threading
 
 import hw_driver
 
@@ -13,11 +14,113 @@ import hw_driver
 # the device such as where the register index is pointing.
 _devices = {}
 
+# dictionary key'd off (interface, child) with value == RegShadow instance
+# holding the register values servod last wrote to that device.
+_shadows = {}
+_shadows_lock = threading.Lock()
+
+
+def invalidate_shadows():
+  """Forget all shadowed register values, e.g. after a reinit."""
+  with _shadows_lock:
+    shadows = list(_shadows.values())
+  for shadow in shadows:
+    shadow.invalidate()
+
 
 class I2cRegError(hw_driver.HwDriverError):
   """Exception class for I2cRegError."""
 
 
+class RegShadow(object):
+  """Shadow copy of the registers servod last wrote to a device.
+
+  Drivers that read-modify-write registers (e.g. gpio expander output and
+  direction registers) read the shadow instead of the device, and only write
+  the device when the value changes. Only registers that the device does not
+  change on its own should be shadowed.
+
+  A register, or the whole shadow, is invalidated on errors and reinit. The
+  next access reads the device again.
+  """
+
+  def __init__(self):
+    self._values = {}
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def get(interface, child):
+    """Get the shadow of device |child| on |interface|, creating it if needed.
+
+    Args:
+      interface: interface object the device is accessed through
+      child: 7-bit i2c address of device
+
+    Returns:
+      RegShadow instance shared by all drivers of that device
+    """
+    key = (interface, child)
+    with _shadows_lock:
+      if key not in _shadows:
+        _shadows[key] = RegShadow()
+      return _shadows[key]
+
+  def __contains__(self, reg):
+    return reg in self._values
+
+  def read(self, reg, read_func):
+    """Return the shadowed value of |reg|, reading it if not known yet.
+
+    Args:
+      reg: register key
+      read_func: function taking no arguments & reading |reg| from the device
+
+    Returns:
+      integer value of |reg|
+    """
+    with self._lock:
+      if reg in self._values:
+        return self._values[reg]
+    value = read_func()
+    with self._lock:
+      self._values[reg] = value
+    return value
+
+  def peek(self, reg, default=None):
+    """Return the shadowed value of |reg|, or |default| if not known.
+
+    Unlike read(), |default| is not stored: the next write() of |reg| always
+    reaches the device. Meant for registers that cannot be read back.
+    """
+    with self._lock:
+      return self._values.get(reg, default)
+
+  def write(self, reg, value, write_func):
+    """Write |value| to |reg| unless the shadow says it already holds it.
+
+    Args:
+      reg: register key
+      value: integer value to write
+      write_func: function taking the value & writing it to the device
+    """
+    with self._lock:
+      if self._values.get(reg) == value:
+        return
+      # Until the write succeeded, the register's value is unknown.
+      self._values.pop(reg, None)
+    write_func(value)
+    with self._lock:
+      self._values[reg] = value
+
+  def invalidate(self, reg=None):
+    """Forget the value of |reg|, or of all registers if |reg| is None."""
+    with self._lock:
+      if reg is None:
+        self._values.clear()
+      else:
+        self._values.pop(reg, None)
+
+
 class I2cReg(object):
   """Provides methods for devices with registered indexing over i2c."""
 
@@ -48,6 +151,7 @@ class I2cReg(object):
     self._no_read = no_read
     self._use_reg_cache = use_reg_cache
     self._reg = None
+    self._shadow = RegShadow.get(i2c, child)
 
     # TODO(tboch) fixme addr_len unused
     if self._addr_len != 1:
@@ -121,6 +225,26 @@ class I2cReg(object):
     rlist = self._wr_rd(reg, wlist, read_len)
     return self._convert_rd(rlist, self._msb_first)
 
+  def _read_shadow_reg(self, reg):
+    """Read the register from the shadow, or the device if not shadowed yet.
+
+    Args:
+      reg: i2c register to read
+
+    Returns:
+      integer value servod last wrote to, or read from, reg
+    """
+    return self._shadow.read(reg, lambda: self._read_reg(reg))
+
+  def _write_shadow_reg(self, reg, value):
+    """Write the register, unless the shadow shows it already holds |value|.
+
+    Args:
+      reg: i2c register to write
+      value: integer value to write to reg
+    """
+    self._shadow.write(reg, value, lambda v: self._write_reg(reg, v))
+
   @staticmethod
   def _convert_rd(rlist, msb_first):
     """Convert read value in c_ubyte array to integer.
@@ -171,7 +295,12 @@ class I2cReg(object):
     else:
       self._logger.debug('Ignoring register index %d is cached' % reg)
 
-    rlist = self._i2c.wr_rd(self._child, wlist, rcnt)
+    try:
+      rlist = self._i2c.wr_rd(self._child, wlist, rcnt)
+    except Exception:
+      # The device might have been reset: its shadowed state is unknown now.
+      self._shadow.invalidate()
+      raise
     if self._use_reg_cache:
       self._reg = reg
     return rlist
@@ -8,6 +8,7 @@ Presently tested for:
   INA231
 """
 from __future__ import print_function
+import collections
 import errno
 import logging
 import time
@@ -189,10 +190,22 @@ class ina2xx(hw_driver.HwDriver):
     """Write architected register."""
     self._i2c_obj._write_reg(self._get_reg_idx(name), value)
 
-  def _read_busv(self):
-    """Read bus voltage value."""
-    busv_reg = self._read_reg('busv')
-    return busv_reg >> self.BUSV_MV_OFFSET
+  def _busv_reg_to_millivolts(self, busv_reg):
+    """Convert bus voltage register value to millivolts.
+
+    Args:
+      busv_reg: integer, raw value of the bus voltage register
+
+    Returns:
+      integer of potential in millivolts
+    """
+    millivolts = (busv_reg >> self.BUSV_MV_OFFSET) * self.BUSV_MV_PER_LSB
+    assert millivolts < self.BUSV_MAX, \
+        'bus voltage measurement exceeded maximum'
+    if millivolts >= self.BUSV_MAX:
+      self._logger.error(
+          'bus voltage measurement exceeded maximum %x' % millivolts)
+    return millivolts
 
   def _get_next_ovf(self):
     """Watch conversion ready bit assertion then return overflow status
@@ -270,14 +283,7 @@ class ina2xx(hw_driver.HwDriver):
       integer of potential in millivolts
     """
     self._logger.debug('')
-    busv = self._read_busv()
-    millivolts = busv * self.BUSV_MV_PER_LSB
-    assert millivolts < self.BUSV_MAX, \
-        'bus voltage measurement exceeded maximum'
-    if millivolts >= self.BUSV_MAX:
-      self._logger.error(
-          'bus voltage measurement exceeded maximum %x' % millivolts)
-    return millivolts
+    return self._busv_reg_to_millivolts(self._read_reg('busv'))
 
   def _get_milliamps_reg(self):
     """Retrieve current measurement for ADC in milliamps from current register.
@@ -311,7 +317,20 @@ class ina2xx(hw_driver.HwDriver):
     Raises:
       Ina2xxError: if shunt voltage overflowed.
     """
-    vshunt_reg = self._read_reg('shv')
+    return self._shv_reg_to_millivolts(self._read_reg('shv'))
+
+  def _shv_reg_to_millivolts(self, vshunt_reg):
+    """Convert shunt voltage register value to millivolts.
+
+    Args:
+      vshunt_reg: integer, raw value of the shunt voltage register
+
+    Returns:
+      float of shunt voltage in millivolts.
+
+    Raises:
+      Ina2xxError: if shunt voltage overflowed.
+    """
     logging.debug('shv = 0x%x', vshunt_reg)
 
     # its negative ... two's complement
@@ -420,6 +439,47 @@ class ina2xx(hw_driver.HwDriver):
     else:
       return self._get_milliwatts_calc()
 
+  def _burst_regs(self):
+    """Registers to read in order to compute the control's value in a burst.
+
+    Current and power are only calculated from the shunt voltage on ADCs
+    without current and power registers, like their _Get_ methods do. Reading
+    those registers requires a calibration check, so the ADCs that have them
+    do not support bursts for current and power.
+
+    Returns:
+      list of register names, empty if the subtype does not support bursts.
+    """
+    subtype = self._params['subtype']
+    if ((subtype == 'milliamps' and self._has_reg('cur')) or
+        (subtype == 'milliwatts' and self._has_reg('pwr'))):
+      return []
+    return {'millivolts': ['busv'],
+            'shuntmv': ['shv'],
+            'milliamps': ['shv'],
+            'milliwatts': ['busv', 'shv']}.get(subtype, [])
+
+  def _from_burst(self, regs):
+    """Compute the control's value from registers read in a burst.
+
+    Args:
+      regs: dict of register name to raw value, holding at least the registers
+            listed in _burst_regs()
+
+    Returns:
+      value of the control, same units as its _Get_ method
+    """
+    subtype = self._params['subtype']
+    if subtype == 'millivolts':
+      return self._busv_reg_to_millivolts(regs['busv'])
+    shunt_mv = self._shv_reg_to_millivolts(regs['shv'])
+    if subtype == 'shuntmv':
+      return shunt_mv
+    milliamps = shunt_mv / self._rsense
+    if subtype == 'milliamps':
+      return milliamps
+    return self._busv_reg_to_millivolts(regs['busv']) / 1000. * milliamps
+
   def _Get_readreg(self):
     """Read raw register value from INA219.
 
@@ -513,6 +573,79 @@ class ina2xx(hw_driver.HwDriver):
     self._logger.debug('lsb = %f' % lsb)
     return lsb
 
+
+class Ina2xxBurstSampler(object):
+  """Sample many INA2xx controls with one I2C burst per bus.
+
+  All bus & shunt voltage registers needed by the controls on one I2C bus are
+  read through a single multi_wr_rd() call, rather than one wr_rd() per
+  register and control. Registers shared by multiple controls of the same rail
+  are only read once.
+  """
+  # pylint: disable=protected-access
+  # The sampler is an extension of the ina2xx drivers it samples.
+
+  def __init__(self, drvs):
+    """Prepare the burst transactions.
+
+    Args:
+      drvs: list of ina2xx instances where supports() is True
+    """
+    self._drvs = drvs
+    # Dict of i2c bus to the list of (child, write_list, read_count) to hand to
+    # its multi_wr_rd().
+    self._transactions = collections.OrderedDict()
+    # List, per drv, of (i2c bus, register name, index into the bus'
+    # transactions) tuples.
+    self._slots = []
+    transaction_idx = {}
+    for drv in drvs:
+      i2c = drv._interface
+      transactions = self._transactions.setdefault(i2c, [])
+      slots = []
+      for name in drv._burst_regs():
+        key = (i2c, drv._child, drv._get_reg_idx(name))
+        if key not in transaction_idx:
+          transaction_idx[key] = len(transactions)
+          transactions.append((drv._child, [key[2]], drv._reg_len))
+        slots.append((i2c, name, transaction_idx[key]))
+      self._slots.append(slots)
+
+  @staticmethod
+  def supports(drv):
+    """Whether |drv| can be sampled in a burst.
+
+    Args:
+      drv: driver instance of any type
+
+    Returns:
+      True if |drv| is an ina2xx on an I2C bus supporting multi_wr_rd() and its
+      subtype can be computed from a burst.
+    """
+    return (isinstance(drv, ina2xx) and bool(drv._burst_regs()) and
+            hasattr(drv._interface, 'multi_wr_rd'))
+
+  def sample(self):
+    """Read all registers in one burst per bus and compute the values.
+
+    Returns:
+      tuple (timestamp, values) where:
+        timestamp: time in seconds since epoch right before the first burst
+        values: list of control values, in the same order as the drivers
+    """
+    timestamp = time.time()
+    raw = {}
+    for i2c, transactions in self._transactions.items():
+      rlists = i2c.multi_wr_rd(transactions)
+      raw[i2c] = [i2c_reg.I2cReg._convert_rd(list(rlist), True)
+                  for rlist in rlists]
+    values = []
+    for drv, slots in zip(self._drvs, self._slots):
+      regs = {name: raw[i2c][idx] for i2c, name, idx in slots}
+      values.append(drv._from_burst(regs))
+    return (timestamp, values)
+
+
 def testit(testname, adc):
   """Test major features of one ADC.
 
@@ -29,10 +29,14 @@ EEPROM:
 import logging
 
 import hw_driver
+import i2c_reg
 
 REG_CTRL_LEN = 1
 EEPROM_BYTES = 256
 PAGE_BYTES = 4
+# Key of the control register in the device's i2c_reg.RegShadow. The register
+# has no index.
+SHADOW_CTRL = 'ctrl'
 
 
 class pca9500Error(hw_driver.HwDriverError):
@@ -68,27 +72,29 @@ class pca9500(hw_driver.HwDriver):
     if 'child' not in self._params:
       raise pca9500Error('getting child address')
     self._child = int(self._params['child'], 0)
+    self._shadow = i2c_reg.RegShadow.get(self._interface, self._child)
 
   def _Set_gpio(self, value):
     """Set pca9500 GPIO to value.
 
     The pca9500 GPIO expander has a single control register (not typical
     direction and value register).  The driver must take care to maintain
-    previous state of all bits.
+    previous state of all bits. The value last written is kept in a shadow,
+    as reading the register returns the pin levels instead.
 
     Args:
       value: integer value to write to gpio
     """
     self._logger.debug('value = %d', value)
     (_, mask) = self._get_offset_mask()
-    cur_value = self._read_control_reg()
+    cur_value = self._shadow.read(SHADOW_CTRL, self._read_control_reg)
     if value:
       hw_value = cur_value | mask
     else:
       hw_value = cur_value & ~mask
     self._logger.debug('new(0x%02x) cur(0x%02x) mask(0x%02x)', hw_value,
                        cur_value, mask)
-    self._interface.wr_rd(self._child, [hw_value], 0)
+    self._shadow.write(SHADOW_CTRL, hw_value, self._write_control_reg)
 
   def _Get_gpio(self):
     """Get pca9500 GPIO value and return.
@@ -111,6 +117,21 @@ class pca9500(hw_driver.HwDriver):
     """
     return self._interface.wr_rd(self._child, [], REG_CTRL_LEN)[0]
 
+  def _write_control_reg(self, value):
+    """Write the pca9500 control register.
+
+    Args:
+      value: integer value (8bit) to write
+
+    Raises:
+      Exception: any i2c error, after invalidating the shadowed register
+    """
+    try:
+      self._interface.wr_rd(self._child, [value], 0)
+    except Exception:
+      self._shadow.invalidate()
+      raise
+
   def _write_byte_addr(self, byte_addr):
     """Write EEPROM byte address.
 
@@ -9,6 +9,7 @@ import os
 import pexpect
 from pexpect import fdpexpect
 import re
+import select
 import time
 
 import hw_driver
@@ -16,6 +17,8 @@ import servo.terminal_freezer
 
 DEFAULT_UART_TIMEOUT = 3  # 3 seconds is plenty even for slow platforms
 FLUSH_UART_TIMEOUT = 1
+# Seconds a parsed console command result stays valid. See _get_cached().
+CMD_RESULT_TTL = 0.5
 
 
 class ptyError(hw_driver.HwDriverError):
@@ -31,6 +34,69 @@ UART_PARAMS = {
 }
 
 
+class ptySession(object):
+  """Long-lived connection to a console PTY.
+
+  One session is shared by all drivers of an interface, so that the PTY and
+  the pexpect interface around it are only set up once rather than per command.
+
+  Attributes:
+    pty_path: path of the PTY the session is connected to
+    child: fdpexpect.fdspawn object for the PTY, None while closed
+    clean: True if the last command completed, and all output up to then was
+           consumed. Only then can the newline flush before a command be
+           skipped.
+  """
+
+  def __init__(self, pty_path):
+    """Setup session, without opening the PTY yet.
+
+    Args:
+      pty_path: path of the PTY to connect to
+    """
+    self.pty_path = pty_path
+    self.child = None
+    self.clean = False
+    self._fd = None
+
+  def open(self):
+    """Open the PTY unless already open.
+
+    Returns:
+      fdpexpect.fdspawn object for the PTY
+    """
+    if self.child is None:
+      self._fd = os.open(self.pty_path, os.O_RDWR | os.O_NONBLOCK)
+      try:
+        self.child = fdpexpect.fdspawn(self._fd)
+      except:
+        os.close(self._fd)
+        self._fd = None
+        raise
+      # pexpect dafaults to a 100ms delay before sending characters, to
+      # work around race conditions in ssh. We don't need this feature
+      # so we'll change delaybeforesend from 0.1 to 0.001
+      # to speed things up.
+      self.child.delaybeforesend = 0.001
+      self.clean = False
+    return self.child
+
+  def close(self):
+    """Close the PTY, if open."""
+    if self._fd is not None:
+      os.close(self._fd)
+    self._fd = None
+    self.child = None
+    self.clean = False
+
+  def pending(self):
+    """Whether there is output that was not consumed yet."""
+    if self.child.buffer:
+      return True
+    readable, _, _ = select.select([self._fd], [], [], 0)
+    return bool(readable)
+
+
 class ptyDriver(hw_driver.HwDriver):
   """."""
 
@@ -38,7 +104,8 @@ class ptyDriver(hw_driver.HwDriver):
     """."""
     super(ptyDriver, self).__init__(interface, params)
     self._child = None
-    self._fd = None
+    self._session = None
+    self._was_clean = False
     self._cmd_iface = False
     try:
       # We'll probe for a control PTY if this is an ec3po interface.
@@ -51,6 +118,75 @@ class ptyDriver(hw_driver.HwDriver):
     # setting anything for the ec uart to affect the ap uart state.
     if not hasattr(self._interface, '_uart_state'):
         self._interface._uart_state = UART_PARAMS.copy()
+    # Parsed command results are cached per interface, so that controls
+    # reading different fields of the same command share one console round
+    # trip. Maps a key to a (timestamp, value) tuple.
+    if not hasattr(self._interface, '_cmd_result_cache'):
+        self._interface._cmd_result_cache = {}
+
+  def set(self, logical_value):
+    """Set control, dropping all cached command results of the console."""
+    self._interface._cmd_result_cache.clear()
+    return super(ptyDriver, self).set(logical_value)
+
+  def _get_cached(self, key, func, ttl=CMD_RESULT_TTL):
+    """Get the result of |func|, reusing a cached result if still fresh.
+
+    Results are dropped on any set to the same console, see set().
+
+    Args:
+      key: key to cache the result under, usually the console command
+      func: function taking no arguments, returning the parsed result
+      ttl: seconds a cached result is valid for
+
+    Returns:
+      result of |func|, possibly from an earlier call
+    """
+    cache = self._interface._cmd_result_cache
+    now = time.time()
+    entry = cache.get(key)
+    if entry and now - entry[0] <= ttl:
+      self._logger.debug('Using cached result for %r', key)
+      return entry[1]
+    value = func()
+    # Timestamp the result with when the command was started, to not extend
+    # its validity by the time the command took.
+    cache[key] = (now, value)
+    return value
+
+  def _get_session(self):
+    """Get the console session of the interface, (re)creating it if needed.
+
+    Returns:
+      ptySession connected to |_pty_path|
+    """
+    session = getattr(self._interface, '_pty_session', None)
+    if session is None or session.pty_path != self._pty_path:
+      if session is not None:
+        session.close()
+      session = ptySession(self._pty_path)
+      self._interface._pty_session = session
+    return session
+
+  @contextlib.contextmanager
+  def _use_session(self):
+    """Open the interface's console session and expose it through |_child|.
+
+    The session stays open afterwards. It is only closed if an OS level error
+    occurred, so that the next command starts on a fresh connection.
+    """
+    self._session = self._get_session()
+    self._child = self._session.open()
+    # Only a command completing successfully marks the session clean again.
+    self._was_clean = self._session.clean
+    self._session.clean = False
+    try:
+      yield
+    except (OSError, IOError, pexpect.EOF):
+      self._session.close()
+      raise
+    finally:
+      self._child = None
 
   @contextlib.contextmanager
   def _open(self):
@@ -58,22 +194,13 @@ class ptyDriver(hw_driver.HwDriver):
 
     Note that this should be called with the 'with-syntax' since it will handle
     freezing and thawing any other terminals that are using this PTY as well as
-    closing the connection when finished.
+    releasing the connection when finished.
     """
     if self._cmd_iface:
       try:
         self._interface.get_command_lock()
-        self._fd = os.open(self._pty_path, os.O_RDWR | os.O_NONBLOCK)
-        try:
-          self._child = fdpexpect.fdspawn(self._fd)
-          # pexpect dafaults to a 100ms delay before sending characters, to
-          # work around race conditions in ssh. We don't need this feature
-          # so we'll change delaybeforesend from 0.1 to 0.001
-          # to speed things up.
-          self._child.delaybeforesend = 0.001
+        with self._use_session():
           yield
-        finally:
-          self._close()
       finally:
         self._interface.release_command_lock()
     else:
@@ -81,26 +208,33 @@ class ptyDriver(hw_driver.HwDriver):
       # for the regex matches, it will fail with a 'resource temporarily
       # unavailable' error.
       with servo.terminal_freezer.TerminalFreezer(self._pty_path):
-        self._fd = os.open(self._pty_path, os.O_RDWR | os.O_NONBLOCK)
-        try:
-          self._child = fdpexpect.fdspawn(self._fd)
-          # pexpect dafaults to a 100ms delay before sending characters, to
-          # work around race conditions in ssh. We don't need this feature
-          # so we'll change delaybeforesend from 0.1 to 0.001
-          # to speed things up.
-          self._child.delaybeforesend = 0.001
+        with self._use_session():
           yield
-        finally:
-          self._close()
 
-  def _close(self):
-    """Close serial device connection."""
-    os.close(self._fd)
-    self._fd = None
-    self._child = None
+  def _mark_clean(self):
+    """Mark the console session clean after a command completed."""
+    self._session.clean = True
+
+  def _drain(self):
+    """Consume pending output without sending anything to the console."""
+    flush_end_time = time.time() + FLUSH_UART_TIMEOUT
+    while self._session.pending() and time.time() <= flush_end_time:
+      try:
+        self._child.expect('.+', timeout=0.01)
+      except (pexpect.TIMEOUT, pexpect.EOF):
+        break
+      except OSError as e:
+        if e.errno != errno.EAGAIN:
+          raise
+        break
 
   def _flush(self):
     """Flush device output to prevent previous messages interfering."""
+    if self._cmd_iface and self._was_clean:
+      # Nobody else writes to the control PTY, and the last command completed.
+      # Only stray output needs to be consumed, and only if there is some.
+      self._drain()
+      return
     if self._child.sendline('') != 1:
       raise ptyError('Failed to send newline.')
     # Have a maximum timeout for the flush operation. We should have cleared
@@ -217,6 +351,7 @@ class ptyDriver(hw_driver.HwDriver):
             result = self._delete_ugly_chars(result)
             result_list.append(result)
             self._logger.debug('Result: %s' % str(result))
+        self._mark_clean()
       except pexpect.TIMEOUT:
         self._logger.debug('Before: ^%s^' % self._child.before)
         self._logger.debug('After: ^%s^' % self._child.after)
@@ -273,6 +408,7 @@ class ptyDriver(hw_driver.HwDriver):
             self._logger.debug('Got result: %s' % str(result))
           except pexpect.TIMEOUT:
             break
+      self._mark_clean()
     return result_list
 
   def _Set_uart_flush(self, value):
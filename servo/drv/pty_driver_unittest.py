@@ -0,0 +1,202 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Unit tests for the pty driver and its console sessions."""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import pexpect
+
+import pty_driver
+
+
+class FakeChild(object):
+  """pexpect child of a console, answering commands from |responses|."""
+
+  def __init__(self, responses):
+    self.responses = responses
+    self.sent = []
+    # Output of the console not consumed by expect() yet.
+    self.output = ''
+    self.before = self.after = self.match = None
+    self.delaybeforesend = None
+    # Error raised by the next expect(), if any.
+    self.error = None
+
+  @property
+  def buffer(self):
+    return self.output
+
+  def sendline(self, line):
+    self.sent.append(line)
+    self.output += self.responses.get(line, '')
+    return len(line) + 1
+
+  def expect(self, pattern, timeout):
+    if self.error:
+      error, self.error = self.error, None
+      raise error
+    match = re.search(pattern, self.output)
+    if not match:
+      self.before = self.output
+      raise pexpect.TIMEOUT('no match for %r' % pattern)
+    self.before = self.output[:match.start()]
+    self.after = match.group(0)
+    self.match = match
+    self.output = self.output[match.end():]
+    return 0
+
+
+class FakeInterface(object):
+  """ec3po like interface, with a control pty for commands."""
+
+  def __init__(self, pty_path):
+    self.pty_path = pty_path
+    self.locked = False
+
+  def get_control_pty(self):
+    return self.pty_path
+
+  def get_command_lock(self):
+    self.locked = True
+
+  def release_command_lock(self):
+    self.locked = False
+
+  def pause_capture(self):
+    pass
+
+  def resume_capture(self):
+    pass
+
+
+class FakeClock(object):
+  """Clock for the cache of command results, advanced by the tests."""
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def time(self):
+    return self.now
+
+  def sleep(self, secs):
+    pass
+
+
+class TestPtyDriver(unittest.TestCase):
+
+  def setUp(self):
+    """Set up drivers on an interface whose console answers 'version'."""
+    unittest.TestCase.setUp(self)
+    self.tmpdir = tempfile.mkdtemp()
+    # The session opens the path, and polls it for output. A fifo never has
+    # any: the output comes from the FakeChild.
+    pty_path = os.path.join(self.tmpdir, 'pty')
+    os.mkfifo(pty_path)
+    self.children = []
+    self._fdspawn = pty_driver.fdpexpect.fdspawn
+    pty_driver.fdpexpect.fdspawn = self._spawn
+    self._time = pty_driver.time
+    self.clock = FakeClock()
+    pty_driver.time = self.clock
+    self.interface = FakeInterface(pty_path)
+    self.drv = pty_driver.ptyDriver(self.interface, {})
+
+  def tearDown(self):
+    """Close the session and restore what the tests replaced."""
+    session = getattr(self.interface, '_pty_session', None)
+    if session:
+      session.close()
+    pty_driver.fdpexpect.fdspawn = self._fdspawn
+    pty_driver.time = self._time
+    shutil.rmtree(self.tmpdir)
+    unittest.TestCase.tearDown(self)
+
+  def _spawn(self, fd):
+    """Create a FakeChild for the console opened as |fd|."""
+    child = FakeChild({'version': 'ver: 1.0\r\n> '})
+    self.children.append(child)
+    return child
+
+  def _version(self, drv=None):
+    """Run the 'version' command on |drv| and return the parsed version."""
+    # pylint: disable=protected-access
+    result = (drv or self.drv)._issue_cmd_get_results('version',
+                                                      [r'ver: (\S+)'])
+    return result[0][1]
+
+  def test_SessionSharedAcrossDrivers(self):
+    """All drivers of an interface use one console connection."""
+    other = pty_driver.ptyDriver(self.interface, {})
+    self.assertEqual('1.0', self._version())
+    self.assertEqual('1.0', self._version(other))
+    self.assertEqual(1, len(self.children))
+    self.assertFalse(self.interface.locked)
+
+  def test_NewlineSkippedWhenClean(self):
+    """After a completed command, only stray output is drained."""
+    self._version()
+    child = self.children[0]
+    self.assertEqual(['', 'version'], child.sent)
+    child.output = 'ver: stale\r\n'
+    del child.sent[:]
+    self.assertEqual('1.0', self._version())
+    self.assertEqual(['version'], child.sent)
+
+  def test_NewlineAfterTimeout(self):
+    """A command that timed out makes the next one flush with a newline."""
+    with self.assertRaises(pty_driver.ptyError):
+      # pylint: disable=protected-access
+      self.drv._issue_cmd_get_results('version', [r'nomatch'])
+    child = self.children[0]
+    del child.sent[:]
+    self.assertEqual('1.0', self._version())
+    self.assertEqual(['', 'version'], child.sent)
+    self.assertEqual(1, len(self.children))
+
+  def test_ReopenAfterError(self):
+    """An OS error closes the session, and the next command reopens it."""
+    self._version()
+    self.children[0].error = OSError('read failed')
+    with self.assertRaises(OSError):
+      self._version()
+    self.assertEqual('1.0', self._version())
+    self.assertEqual(2, len(self.children))
+    self.assertEqual(['', 'version'], self.children[1].sent)
+
+  def test_CachedResultExpires(self):
+    """Cached results are reused until CMD_RESULT_TTL passed."""
+    calls = []
+
+    def read():
+      calls.append(self.clock.now)
+      return len(calls)
+
+    # pylint: disable=protected-access
+    self.assertEqual(1, self.drv._get_cached('key', read))
+    self.clock.now += pty_driver.CMD_RESULT_TTL
+    self.assertEqual(1, self.drv._get_cached('key', read))
+    self.clock.now += 0.01
+    self.assertEqual(2, self.drv._get_cached('key', read))
+
+  def test_CachedResultDroppedOnSet(self):
+    """Any set on the console drops the cached results of all its drivers."""
+    other = pty_driver.ptyDriver(self.interface, {'subtype': 'uart_flush'})
+    calls = []
+
+    def read():
+      calls.append(self.clock.now)
+      return len(calls)
+
+    # pylint: disable=protected-access
+    self.assertEqual(1, self.drv._get_cached('key', read))
+    other.set(1)
+    self.assertEqual(2, self.drv._get_cached('key', read))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -11,12 +11,6 @@ class Sx1505Error(hw_driver.HwDriverError):
   """Error occurred accessing Sx1505."""
 
 
-# We need a shared register cache between all the bits,
-# as there is no readable state register.
-# Indexing is: reg_cache[((interface, i2c addr), reg addr)] = value
-reg_cache = {}
-
-
 class sx1505(hw_driver.HwDriver):
   """Object to access drv=sx1505 controls."""
 
@@ -27,6 +21,10 @@ class sx1505(hw_driver.HwDriver):
   REG_PU = 2
   REG_PD = 3
 
+  # Power on default of the data register. The register reads back the pin
+  # levels, so the outputs servod set are only known from the shadow.
+  INIT_DATA = 0xff
+
   def __init__(self, interface, params):
     """Constructor.
 
@@ -49,17 +47,9 @@ class sx1505(hw_driver.HwDriver):
     self._i2c_obj = i2c_reg.I2cReg.get_device(
         self._interface, child, addr_len=1, reg_len=1, msb_first=True,
         no_read=False, use_reg_cache=False)
-    # Remember what GPIOs we have set.
-    global reg_cache
-    self._reg_cache = reg_cache
-    self._cacheindex = (self._interface, child)
-    # Cache REG_DATA
-    outputs = self._reg_cache.get((self._cacheindex, self.REG_DATA), 0xff)
-    self._reg_cache[(self._cacheindex, self.REG_DATA)] = outputs
-    # Cache REG_DIR
-    dir = self._reg_cache.get((self._cacheindex, self.REG_DIR),
-                              self._i2c_obj._read_reg(self.REG_DIR))
-    self._reg_cache[(self._cacheindex, self.REG_DIR)] = dir
+    # Remember what GPIOs we have set, shared between all the bits.
+    self._shadow = self._i2c_obj._shadow
+    self._i2c_obj._read_shadow_reg(self.REG_DIR)
 
     # Initlialize pullup
     if self._io_type == 'PU':
@@ -68,6 +58,10 @@ class sx1505(hw_driver.HwDriver):
       pu_reg = pu_reg | mask
       self._i2c_obj._write_reg(self.REG_PU, pu_reg)
 
+  def _read_data_reg(self):
+    """Return the data register servod last wrote, or its power on default."""
+    return self._shadow.peek(self.REG_DATA, self.INIT_DATA)
+
   def get(self):
     """Get gpio value.
 
@@ -84,12 +78,11 @@ class sx1505(hw_driver.HwDriver):
   def set(self, fmt_value):
     """Set value on ioexpander.
 
-    1. Read cached value
+    1. Read shadowed value
     2. Mask accordingly
-    3. Write value to Output register
-    4. Read Direction reg cache (Note 0 == output, 1 == input)
+    3. Write value to Output register if it changed
+    4. Read shadowed Direction reg (Note 0 == output, 1 == input)
        a. if input, Write Direction register
-    5. Read Input register for returning
 
     Args:
       fmt_value: Integer value to write to hardware.  If None or empty string
@@ -115,21 +108,16 @@ class sx1505(hw_driver.HwDriver):
       if fmt_value:
         hw_value = self._create_hw_value(fmt_value)
 
-      current_out_reg = self._reg_cache[(self._cacheindex, self.REG_DATA)]
+      current_out_reg = self._read_data_reg()
       new_out_reg = hw_value | (current_out_reg & ~mask)
-      if new_out_reg != current_out_reg:
-        self._reg_cache[(self._cacheindex, self.REG_DATA)] = new_out_reg
-        self._i2c_obj._write_reg(self.REG_DATA, new_out_reg)
+      self._i2c_obj._write_shadow_reg(self.REG_DATA, new_out_reg)
 
-    current_dir_reg = self._reg_cache[(self._cacheindex, self.REG_DIR)]
+    current_dir_reg = self._i2c_obj._read_shadow_reg(self.REG_DIR)
     if change_to_input:
       new_dir_reg = current_dir_reg | mask
     else:
       new_dir_reg = current_dir_reg & ~mask
-
-    if new_dir_reg != current_dir_reg:
-      self._reg_cache[(self._cacheindex, self.REG_DIR)] = new_dir_reg
-      self._i2c_obj._write_reg(self.REG_DIR, new_dir_reg)
+    self._i2c_obj._write_shadow_reg(self.REG_DIR, new_dir_reg)
 
   def _get_child(self):
     """Check and return needed params to call driver.
@@ -11,12 +11,6 @@ class Sx1506Error(hw_driver.HwDriverError):
   """Error occurred accessing Sx1506."""
 
 
-# We need a shared register cache between all the bits,
-# as there is no readable state register.
-# Indexing is: reg_cache[((interface, i2c addr), reg addr)] = value
-reg_cache = {}
-
-
 class sx1506(hw_driver.HwDriver):
   """Object to access drv=sx1506 controls."""
 
@@ -53,20 +47,15 @@ class sx1506(hw_driver.HwDriver):
     self._i2c_obj = i2c_reg.I2cReg.get_device(
         self._interface, child, addr_len=1, reg_len=1, msb_first=True,
         no_read=False, use_reg_cache=False)
-    # Remember what GPIOs we have set.
-    global reg_cache
-    self._reg_cache = reg_cache
-    self._cacheindex = (self._interface, child)
-    # Cache REG_DIR
-    dir = self._reg_cache.get((self._cacheindex, self.REG_DIR), self.INIT_DIR)
-    self._reg_cache[(self._cacheindex, self.REG_DIR)] = dir
-    self.write16(self.REG_DIR, dir)
-
-    # Cache REG_DATA
-    outputs = self._reg_cache.get((self._cacheindex, self.REG_DATA),
-                                  self.INIT_DATA)
-    self._reg_cache[(self._cacheindex, self.REG_DATA)] = outputs
-    self.write16(self.REG_DATA, outputs)
+    # Remember what GPIOs we have set, shared between all the bits. The
+    # registers are only written the first time the device is set up.
+    self._shadow = self._i2c_obj._shadow
+    for reg, init in ((self.REG_DIR, self.INIT_DIR),
+                      (self.REG_DATA, self.INIT_DATA)):
+      if reg not in self._shadow or reg + 1 not in self._shadow:
+        self._shadow.invalidate(reg)
+        self._shadow.invalidate(reg + 1)
+        self.write16(reg, init)
 
     # Initlialize pullup
     if self._io_type == 'PU':
@@ -84,8 +73,30 @@ class sx1506(hw_driver.HwDriver):
     return value
 
   def write16(self, reg, val):
-    self._i2c_obj._write_reg(reg + 1, (val & 0xff))
-    self._i2c_obj._write_reg(reg, (val >> 8))
+    self._i2c_obj._write_shadow_reg(reg + 1, (val & 0xff))
+    self._i2c_obj._write_shadow_reg(reg, (val >> 8))
+
+  def _read_shadow16(self, reg, default=None):
+    """Return the 16bit register servod last wrote.
+
+    Args:
+      reg: base index of the register
+      default: value assumed if the register is not shadowed, or None to read
+          it from the device. The data register reads back the pin levels, so
+          the outputs servod set are only known from the shadow.
+
+    Returns:
+      integer value of the register
+    """
+    values = []
+    for byte_reg, shift in ((reg + 1, 0), (reg, 8)):
+      if default is None:
+        value = self._shadow.read(byte_reg,
+                                  lambda r=byte_reg: self._i2c_obj._read_reg(r))
+      else:
+        value = self._shadow.peek(byte_reg, (default >> shift) & 0xff)
+      values.append(value << shift)
+    return values[0] | values[1]
 
   def get(self):
     """Get gpio value.
@@ -103,12 +114,13 @@ class sx1506(hw_driver.HwDriver):
   def set(self, fmt_value):
     """Set value on ioexpander.
 
-    1. Read cached value
-    2. Mask accordingly
-    3. Write value to Output register
-    4. Read Direction reg cache (Note 0 == output, 1 == input)
-       a. if input, Write Direction register
-    5. Read Input register for returning
+    1. Verify the Direction reg (Note 0 == output, 1 == input) still holds
+       what servod last wrote. If not, the expander was reset, e.g. by losing
+       power, and its shadowed registers are dropped.
+    2. Read shadowed Output value
+    3. Mask accordingly
+    4. Write the bytes of the Output register that changed
+    5. Write the bytes of the Direction register that changed
 
     Args:
       fmt_value: Integer value to write to hardware.  If None or empty string
@@ -128,31 +140,29 @@ class sx1506(hw_driver.HwDriver):
       self._logger.debug('Set to input because its io type is PU')
       change_to_input = True
 
+    current_dir_reg = self._read_shadow16(self.REG_DIR)
+    actual_dir_reg = self.read16(self.REG_DIR)
+    if current_dir_reg != actual_dir_reg:
+      self._logger.error('sx1506 REG_DIR should be 0x%x, actually is 0x%x!' %
+                         (current_dir_reg, actual_dir_reg))
+      self._shadow.invalidate()
+      current_dir_reg = actual_dir_reg
+
     # output register handling
     if not change_to_input:
       hw_value = 0
       if fmt_value:
         hw_value = self._create_hw_value(fmt_value)
 
-      current_out_reg = self._reg_cache[(self._cacheindex, self.REG_DATA)]
+      current_out_reg = self._read_shadow16(self.REG_DATA, self.INIT_DATA)
       new_out_reg = hw_value | (current_out_reg & ~mask)
-      self._reg_cache[(self._cacheindex, self.REG_DATA)] = new_out_reg
       self.write16(self.REG_DATA, new_out_reg)
 
-    current_dir_reg = self._reg_cache[(self._cacheindex, self.REG_DIR)]
-    actual_dir_reg = self.read16(self.REG_DIR)
-    if (current_dir_reg != actual_dir_reg):
-      self._logger.error('sx1506 REG_DIR should be 0x%x, actually is 0x%x!' \
-          % (current_dir_reg, actual_dir_reg))
-      current_dir_reg = actual_dir_reg
     if change_to_input:
       new_dir_reg = current_dir_reg | mask
     else:
       new_dir_reg = current_dir_reg & ~mask
-
-    if new_dir_reg != current_dir_reg:
-      self._reg_cache[(self._cacheindex, self.REG_DIR)] = new_dir_reg
-      self.write16(self.REG_DIR, new_dir_reg)
+    self.write16(self.REG_DIR, new_dir_reg)
 
   def _get_child(self):
     """Check and return needed params to call driver.
@@ -0,0 +1,78 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Unit tests for the sx1506 driver and its register shadow."""
+
+import unittest
+
+import i2c_reg
+import sx1506
+
+CHILD = 0x20
+
+
+class FakeSx1506(object):
+  """i2c interface with one sx1506 on it, recording register writes."""
+
+  def __init__(self):
+    self.writes = []
+    self.reset()
+
+  def reset(self):
+    """Put the registers back to their power on defaults."""
+    self.regs = [0x00] * 8
+    for reg in (sx1506.sx1506.REG_DATA, sx1506.sx1506.REG_DIR):
+      self.regs[reg] = self.regs[reg + 1] = 0xff
+
+  def wr_rd(self, child, wlist, rcnt):
+    """Access the registers as an sx1506 with 1 byte registers would."""
+    assert child == CHILD
+    reg = wlist[0]
+    for value in wlist[1:]:
+      self.regs[reg] = value
+      self.writes.append((reg, value))
+    return [self.regs[reg]] * rcnt
+
+
+class TestSx1506(unittest.TestCase):
+
+  def setUp(self):
+    """Set up an expander with an output on bit 9."""
+    unittest.TestCase.setUp(self)
+    i2c_reg._devices.clear()
+    i2c_reg._shadows.clear()
+    self.device = FakeSx1506()
+    self.drv = sx1506.sx1506(self.device, {'child': '0x%x' % CHILD,
+                                           'offset': '9', 'width': '1'})
+
+  def _Pin(self, reg):
+    """Helper to get bit 9 of 16 bit register |reg|."""
+    return (self.device.regs[reg] >> 1) & 1
+
+  def test_SetWritesChangedRegistersOnly(self):
+    """Setting a pin again leaves the registers alone."""
+    self.drv.set(0)
+    del self.device.writes[:]
+    self.drv.set(0)
+    self.assertEqual([], self.device.writes)
+
+  def test_SetAfterReset(self):
+    """A pin set after the expander reset is driven again."""
+    self.drv.set(0)
+    self.device.reset()
+    self.drv.set(0)
+    self.assertEqual(0, self._Pin(sx1506.sx1506.REG_DATA))
+    self.assertEqual(0, self._Pin(sx1506.sx1506.REG_DIR))
+
+  def test_SetAfterResetThroughControl(self):
+    """A reset noticed through invalidate_shadows() also drives the pin."""
+    self.drv.set(0)
+    self.device.reset()
+    i2c_reg.invalidate_shadows()
+    self.drv.set(0)
+    self.assertEqual(0, self._Pin(sx1506.sx1506.REG_DATA))
+    self.assertEqual(0, self._Pin(sx1506.sx1506.REG_DIR))
+
+
+if __name__ == '__main__':
+  unittest.main()
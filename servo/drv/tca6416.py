@@ -81,12 +81,11 @@ class tca6416(hw_driver.HwDriver):
   def set(self, fmt_value):
     """Set value on ioexpander.
 
-    1. Read Output register
+    1. Read Output register (from the shadow once known)
     2. Mask accordingly
-    3. Write value to Output register
-    4. Read Direction register (Note 0 == output, 1 == input)
+    3. Write value to Output register if it changed
+    4. Read Direction register (Note 0 == output, 1 == input), also shadowed
        a. if input, Write Direction register
-    5. Read Input register for returning
 
     Args:
       fmt_value: Integer value to write to hardware.  If None or empty string
@@ -112,20 +111,18 @@ class tca6416(hw_driver.HwDriver):
       if fmt_value:
         hw_value = self._create_hw_value(fmt_value)
 
-      current_out_reg = self._i2c_obj._read_reg(self.REG_OUT + self._port)
+      reg = self.REG_OUT + self._port
+      current_out_reg = self._i2c_obj._read_shadow_reg(reg)
       new_out_reg = hw_value | (current_out_reg & ~mask)
-      if new_out_reg != current_out_reg:
-        self._i2c_obj._write_reg(self.REG_OUT + self._port, new_out_reg)
+      self._i2c_obj._write_shadow_reg(reg, new_out_reg)
 
-    #TODO(tbroch) cache direction register for speedup
-    current_dir_reg = self._i2c_obj._read_reg(self.REG_DIR + self._port)
+    reg = self.REG_DIR + self._port
+    current_dir_reg = self._i2c_obj._read_shadow_reg(reg)
     if change_to_input:
       new_dir_reg = current_dir_reg | mask
     else:
       new_dir_reg = current_dir_reg & ~mask
-
-    if new_dir_reg != current_dir_reg:
-      self._i2c_obj._write_reg(self.REG_DIR + self._port, new_dir_reg)
+    self._i2c_obj._write_shadow_reg(reg, new_dir_reg)
 
   def _get_child(self):
     """Check and return needed params to call driver.
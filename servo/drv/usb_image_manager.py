@@ -6,13 +6,12 @@
 
 import glob
 import os
-import shutil
 import subprocess
 import tempfile
 import time
-import urllib
 
 import hw_driver
+import servo.utils.image_writer as image_writer
 import servo.utils.usb_hierarchy as usb_hierarchy
 import usb
 
@@ -21,6 +20,10 @@ import usb
 # hub to search for the usb storage.
 STORAGE_ON_HUB_PORT = 1
 
+# Progress of the last image download. Shared as the download and progress
+# controls use different driver instances.
+_download_progress = image_writer.Progress()
+
 
 class UsbImageManagerError(hw_driver.HwDriverError):
   """Error class for UsbImageManager errors."""
@@ -47,8 +50,6 @@ class usbImageManager(hw_driver.HwDriver):
   _IMAGE_DEV = 'image_usbkey_dev'
   _IMAGE_MUX_TO_SERVO = 'servo_sees_usbkey'
 
-  _HTTP_PREFIX = 'http://'
-
   _DEFAULT_ERROR_MSG = 'No USB storage device found for image transfer.'
 
   def __init__(self, interface, params):
@@ -199,11 +200,18 @@ class usbImageManager(hw_driver.HwDriver):
     raise UsbImageManagerError('Download requires image path. Please use set '
                                'version of the control to provide path.')
 
+  def _Get_download_to_usb_dev_progress(self):
+    """Return the progress of the last image download, e.g. 'writing 42.0%'."""
+    return str(_download_progress)
+
   def _Set_download_to_usb_dev(self, image_path):
     """Download image and save to the USB device found by host_usb_dev.
 
-    If the image_path is a URL, it will download this url to the USB path;
-    otherwise it will simply copy the image_path's contents to the USB path.
+    The image_path can be a path or a URL. The image is streamed onto the USB
+    device, decompressing gzip, bzip2 & xz images on the fly, and verified once
+    written. If the device already holds the start of the image, e.g. after an
+    interrupted download, that part is not written again. See
+    image_writer.ImageWriter for details.
 
     Args:
       image_path: path or url to the recovery image.
@@ -224,20 +232,17 @@ class usbImageManager(hw_driver.HwDriver):
     else:
       # There is a usb dev attached. Try to get the image.
       try:
-        if image_path.startswith(self._HTTP_PREFIX):
-          self._logger.debug('Image path is a URL, downloading image')
-          urllib.urlretrieve(image_path, usb_dev)
-        else:
-          shutil.copyfile(image_path, usb_dev)
-        # Ensure that after the download the usb-device is still attached, as
-        # copyfile does not raise an error stick is removed mid-writing for
-        # instance.
+        writer = image_writer.ImageWriter(usb_dev, progress=_download_progress,
+                                          resume=True)
+        size = writer.Write(image_path)
+        self._logger.debug('Wrote %d bytes to %s', size, usb_dev)
+        # Ensure that after the download the usb-device is still attached.
         if not self._interface.get('image_usbkey_dev'):
           raise UsbImageManagerError('Device file %s not found again after '
                                      'copy completed.' % usb_dev)
-      except urllib.ContentTooShortError:
-        errormsg = 'Failed to download URL: %s to USB device: %s' % (image_path,
-                                                                     usb_dev)
+      except image_writer.ImageWriterError as e:
+        errormsg = 'Failed to transfer %s to USB device %s: %s' % (image_path,
+                                                                   usb_dev, e)
       except (IOError, OSError) as e:
         errormsg = ('Failed to transfer image to USB device: %s ( %s ) ' %
                     (e.strerror, e.errno))
@@ -250,8 +255,7 @@ class usbImageManager(hw_driver.HwDriver):
         # We just plastered the partition table for a block device.
         # Pass or fail, we mustn't go without telling the kernel about
         # the change, or it will punish us with sporadic, hard-to-debug
-        # failures.
-        subprocess.call(['sync'])
+        # failures. The writer already synced the device.
         subprocess.call(['blockdev', '--rereadpt', usb_dev])
     if errormsg:
       self._logger.error(errormsg)
@@ -90,6 +90,10 @@ def _build_parser():
                       action='store_true', default=False)
   parser.add_argument('-z', '--sleep_msecs', type=float, default=0.0,
                       help='sleep for this many milliseconds between queries')
+  parser.add_argument('--binary-socket', type=str, default=None,
+                      help='talk to servod over the binary RPC Unix socket '
+                      'at this path instead of xmlrpc. See servod '
+                      '--binary-socket.')
 
   return parser
 
@@ -240,6 +244,9 @@ def do_iteration(requests, options, sclient, stats):
         logging.warn("Ignoring %s, can't perform set with --info", request_str)
         continue
       results.append(sclient.doc(control))
+  elif len(requests) > 1 and not any(':' in r for r in requests):
+    # Only gets: servod reads controls on different interfaces in parallel.
+    results = sclient.get_batch(requests)
   else:
     results = sclient.set_get_all(requests)
 
@@ -336,7 +343,8 @@ def real_main(cmdline):
       format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
   sclient = client.ServoClient(host=options.host, port=options.port,
-                               verbose=options.verbose)
+                               verbose=options.verbose,
+                               binary_address=options.binary_socket)
   global _start_time
   _start_time = time.time()
 
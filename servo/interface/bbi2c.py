@@ -3,7 +3,10 @@
 # found in the LICENSE file.
 """Allows creation of i2c interface for beaglebone devices."""
 
+import ctypes
+import fcntl
 import logging
+import os
 import subprocess
 
 import bbmux_controller
@@ -26,8 +29,34 @@ class BBi2cError(c.InterfaceError):
     self.value = value
 
 
+# i2c-dev device of an i2c bus number.
+I2C_DEV_PATH = '/dev/i2c-%d'
+# ioctl & message flag from linux/i2c-dev.h & linux/i2c.h.
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+
+class I2cMsg(ctypes.Structure):
+  """struct i2c_msg from linux/i2c.h."""
+  _fields_ = [('addr', ctypes.c_uint16),
+              ('flags', ctypes.c_uint16),
+              ('len', ctypes.c_uint16),
+              ('buf', ctypes.POINTER(ctypes.c_uint8))]
+
+
+class I2cRdwrIoctlData(ctypes.Structure):
+  """struct i2c_rdwr_ioctl_data from linux/i2c-dev.h."""
+  _fields_ = [('msgs', ctypes.POINTER(I2cMsg)),
+              ('nmsgs', ctypes.c_uint32)]
+
+
 class BBi2c(i2c_base.BaseI2CBus):
-  """Provide interface to i2c through beaglebone"""
+  """Provide interface to i2c through beaglebone
+
+  Transactions go through the bus' i2c-dev device with the I2C_RDWR ioctl.
+  If the device cannot be opened, they fall back to i2cset & i2cget, which are
+  limited to 2 bytes of data.
+  """
 
   def __init__(self, interface):
     i2c_base.BaseI2CBus.__init__(self)
@@ -38,6 +67,7 @@ class BBi2c(i2c_base.BaseI2CBus):
     # Older kernels utilizing the omap mux starts counting from 1
     if bbmux_controller.use_omapmux():
       self._bus_num += 1
+    self._dev_fd = self._open_dev()
 
   @staticmethod
   def Build(interface_data, **kwargs):
@@ -49,6 +79,63 @@ class BBi2c(i2c_base.BaseI2CBus):
     """Name to request interface by in interface config maps."""
     return 'bb_i2c'
 
+  def _open_dev(self):
+    """Open the i2c-dev device of the bus.
+
+    Returns:
+      file descriptor of the device, or None if it is not available
+    """
+    path = I2C_DEV_PATH % self._bus_num
+    try:
+      return os.open(path, os.O_RDWR)
+    except OSError as e:
+      self._logger.info('Cannot open %s, using i2cset/i2cget instead: %s',
+                        path, e)
+      return None
+
+  def close(self):
+    """Close the i2c-dev device, and the I2C pseudo interface."""
+    if self._dev_fd is not None:
+      os.close(self._dev_fd)
+      self._dev_fd = None
+    i2c_base.BaseI2CBus.close(self)
+
+  def _dev_wr_rd(self, child, wlist, rcnt):
+    """Write and/or read a child i2c device in one I2C_RDWR transaction.
+
+    The read follows the write with a repeated start.
+
+    Args:
+      child: 7-bit address of the child device
+      wlist: list of bytes to write to the child, of any length
+      rcnt: number of bytes to read from the device, any number
+
+    Returns:
+      list of bytes read from i2c device.
+
+    Raises:
+      BBi2cError: If the transaction fails.
+    """
+    msgs = []
+    rbuf = None
+    if wlist:
+      wbuf = (ctypes.c_uint8 * len(wlist))(*wlist)
+      msgs.append(I2cMsg(child, 0, len(wlist),
+                         ctypes.cast(wbuf, ctypes.POINTER(ctypes.c_uint8))))
+    if rcnt:
+      rbuf = (ctypes.c_uint8 * rcnt)()
+      msgs.append(I2cMsg(child, I2C_M_RD, rcnt,
+                         ctypes.cast(rbuf, ctypes.POINTER(ctypes.c_uint8))))
+    if not msgs:
+      return []
+    data = I2cRdwrIoctlData((I2cMsg * len(msgs))(*msgs), len(msgs))
+    try:
+      fcntl.ioctl(self._dev_fd, I2C_RDWR, data)
+    except (IOError, OSError) as e:
+      raise BBi2cError('Failed i2c transaction with child address: 0x%02x '
+                       'wlist: %s rcnt: %s: %s' % (child, wlist, rcnt, e))
+    return list(rbuf) if rbuf is not None else []
+
   def _write(self, child, address, wlist):
     """Preform a single i2cset write command.
 
@@ -166,14 +253,16 @@ class BBi2c(i2c_base.BaseI2CBus):
       child: 7-bit address of the child device
       wlist: list of bytes to write to the child.  If list length is zero its
           just a read.
-      rcnt: number of bytes (0-2) to read from the device. If zero, its just a
-          write.
+      rcnt: number of bytes to read from the device. If zero, its just a
+          write. At most 2 without the i2c-dev device.
 
     Returns:
       list of bytes read from i2c device.
     """
     self._logger.debug('wr_rd. child: 0x%x, wlist: %s, rcnt: %s', child, wlist,
                        rcnt)
+    if self._dev_fd is not None:
+      return self._dev_wr_rd(child, wlist, rcnt)
     address = '0x%02x' % wlist[0]
     if wlist:
       self._write(child, address, wlist[1:])
@@ -2,6 +2,7 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 """Tests usage of i2c interface for beaglebone devices."""
+import errno
 import mox
 import unittest
 
@@ -10,6 +11,7 @@ import bbi2c
 DEFAULT_BUS_NUM = 3
 SLAVE_ADDRESS = 0x20
 DATA_ADDRESS = 0x0
+DEV_FD = 42
 
 
 class TestBBi2c(mox.MoxTestBase):
@@ -19,6 +21,10 @@ class TestBBi2c(mox.MoxTestBase):
     bbi2c.subprocess = self.mox.CreateMockAnything()
     bbi2c.bbmux_controller = self.mox.CreateMockAnything()
     bbi2c.bbmux_controller.use_omapmux().AndReturn(True)
+    # Without the i2c-dev device, i2cset & i2cget are used.
+    self.mox.StubOutWithMock(bbi2c.os, 'open')
+    bbi2c.os.open('/dev/i2c-3', bbi2c.os.O_RDWR).AndRaise(
+        OSError(errno.ENOENT, 'No such file or directory'))
 
   def readTestHelper(self, data, send_address=True):
     if send_address:
@@ -94,5 +100,70 @@ class TestBBi2c(mox.MoxTestBase):
     self.assertEquals(result, rd_data)
 
 
+class TestBBi2cDev(mox.MoxTestBase):
+
+  def setUp(self):
+    super(TestBBi2cDev, self).setUp()
+    bbi2c.subprocess = self.mox.CreateMockAnything()
+    bbi2c.bbmux_controller = self.mox.CreateMockAnything()
+    bbi2c.bbmux_controller.use_omapmux().AndReturn(True)
+    self.mox.StubOutWithMock(bbi2c.os, 'open')
+    bbi2c.os.open('/dev/i2c-3', bbi2c.os.O_RDWR).AndReturn(DEV_FD)
+    self.mox.StubOutWithMock(bbi2c.fcntl, 'ioctl')
+
+  def transactionTestHelper(self, wr_data, rd_data):
+    """Expect one I2C_RDWR ioctl writing |wr_data| & reading |rd_data|."""
+
+    def transact(_fd, _request, data):
+      msgs = [data.msgs[i] for i in range(data.nmsgs)]
+      if wr_data:
+        msg = msgs.pop(0)
+        self.assertEqual(SLAVE_ADDRESS, msg.addr)
+        self.assertEqual(0, msg.flags)
+        self.assertEqual(wr_data, [msg.buf[i] for i in range(msg.len)])
+      if rd_data:
+        msg = msgs.pop(0)
+        self.assertEqual(bbi2c.I2C_M_RD, msg.flags)
+        self.assertEqual(len(rd_data), msg.len)
+        for i, byte in enumerate(rd_data):
+          msg.buf[i] = byte
+      self.assertEqual([], msgs)
+
+    bbi2c.fcntl.ioctl(DEV_FD, bbi2c.I2C_RDWR,
+                      mox.IgnoreArg()).WithSideEffects(transact)
+
+  def testWriteAndRead(self):
+    wr_data = [DATA_ADDRESS]
+    rd_data = [0x10, 0x01]
+    self.transactionTestHelper(wr_data, rd_data)
+    self.mox.ReplayAll()
+    self.bbi2c = bbi2c.BBi2c({'bus_num': 2})
+    result = self.bbi2c.wr_rd(SLAVE_ADDRESS, wr_data, len(rd_data))
+    self.assertEquals(result, rd_data)
+
+  def testBlockWrite(self):
+    data = [0x7, 0x8, 0x9, 0x10, 0x11, 0x12, 0x13]
+    self.transactionTestHelper(data, [])
+    self.mox.ReplayAll()
+    self.bbi2c = bbi2c.BBi2c({'bus_num': 2})
+    self.assertEquals([], self.bbi2c.wr_rd(SLAVE_ADDRESS, data, 0))
+
+  def testBlockRead(self):
+    rd_data = [0x1, 0x2, 0x3, 0x4, 0x5, 0x6]
+    self.transactionTestHelper([], rd_data)
+    self.mox.ReplayAll()
+    self.bbi2c = bbi2c.BBi2c({'bus_num': 2})
+    result = self.bbi2c.wr_rd(SLAVE_ADDRESS, [], len(rd_data))
+    self.assertEquals(result, rd_data)
+
+  def testTransactionFailure(self):
+    bbi2c.fcntl.ioctl(DEV_FD, bbi2c.I2C_RDWR, mox.IgnoreArg()).AndRaise(
+        IOError(errno.EREMOTEIO, 'Remote I/O error'))
+    self.mox.ReplayAll()
+    self.bbi2c = bbi2c.BBi2c({'bus_num': 2})
+    with self.assertRaises(bbi2c.BBi2cError):
+      self.bbi2c.wr_rd(SLAVE_ADDRESS, [DATA_ADDRESS], 1)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -4,20 +4,11 @@
 # TODO (sbasi) crbug.com/187492 - Implement BBuart.
 """Allow creation of uart interface for beaglebone devices."""
 import logging
-import re
-import subprocess
 
 import bbmux_controller
 import common as c
 import uart
 
-BITS_RE = 'cs(?P<value>[5-8])'
-PARITY_RE = '\-?parodd'
-SBITS_RE = '(?P<value>\-?cstopb)'
-SPEED_RE = 'speed (?P<value>[0-9]*) baud'
-PARITY_MAP = {0: '-parenb', 1: 'parodd', 2: '-parodd'}
-SBITS_MAP = {0: '-cstopb', 1: '-cstopb', 2: 'cstopb'}
-
 # Map of interfaces to tty.
 TTY_MAP = {
     1: '/dev/ttyO1',  # Uart1/ec_uart
@@ -29,15 +20,6 @@ TTY_MAP = {
 
 DEFAULT_UART_SETTINGS = {'baudrate': 115200, 'bits': 8, 'parity': 0, 'sbits': 0}
 
-STTY_EXTRA_ARGS = [
-    '-ignbrk', '-brkint', '-ignpar', '-parmrk', '-inpck', '-istrip', '-inlcr',
-    '-igncr', '-icrnl', '-ixon', '-ixoff', '-iuclc', '-ixany', '-imaxbel',
-    '-iutf8', '-opost', '-olcuc', '-ocrnl', 'onlcr', '-onocr', '-onlret',
-    '-ofill', '-ofdel', 'nl0', 'cr0', 'tab0', 'bs0', 'vt0', 'ff0', '-isig',
-    '-icanon', '-iexten', '-echo', '-echoe', '-echok', '-echonl', '-noflsh',
-    '-xcase', '-tostop', '-echoprt', '-echoctl', '-echoke'
-]
-
 # Uart Signal Names
 TXD_PATTERN = 'uart%d_txd'
 TXD_MODE = 0x0
@@ -133,76 +115,11 @@ class BBuart(uart.Uart):
     """
     pass
 
-  def _get_value(self, output, regex):
-    """Parses output supplied from stty to retrieve an Uart attribute.
-
-    Args:
-      output: output supplied from stty.
-      regex: regex to retrieve a value from output. Note this regex requires
-             a group named 'value'
-
-    Raises:
-      BBuartError: If regex is invalid or failed to retrieve 'value' from the
-                   output.
-    """
-    if 'value' not in regex:
-      # Invalid regex passed in.
-      raise BBuartError('Improper regex passed in: %s.' % regex)
-    value = re.search(regex, output)
-    if not value:
-      raise BBuartError('Failed to retrieve a value for %s with output: %s'
-                        ' using regex: %s' % (self._pty, output, regex))
-    return value.group('value')
-
-  def _get_sbits(self, output):
-    """Parses stty output to retrieve Uart sbits.
-
-    Args:
-      output: output supplied from stty.
-
-    Returns:
-      integer, number of stop bits. Can be 0|1|2 inclusive where:
-          0: 1 stop bit
-          2: 2 stop bits
-    """
-    # stty only returns 1 or 2 stop bits.
-    value = self._get_value(output, SBITS_RE)
-    if '-' in value:
-      return 0
-    else:
-      return 2
-
-  def _get_parity(self, output):
-    """Parses stty output to retrieve Uart parity.
-
-    Args:
-      output: output supplied from stty.
-
-    Returns:
-      parity of 0-2 inclusive where:
-          0: no parity
-          1: odd parity
-          2: even parity
-    """
-    if '-parenb' in output:
-      # Parity is disabled.
-      parity = 0
-    else:
-      par_mode = re.search(PARITY_RE, output)
-      if par_mode.group(0) is '-parodd':
-        parity = 2
-      else:
-        parity = 1
-    return parity
-
   def get_uart_props(self):
     """Gets the uart's properties.
 
-    Calls stty and parses it's output. Example (shortened) output:
-
-    speed 115200 baud; rows 0; columns 0; line = 0;
-    intr = ^C; quit = ^\; erase = ^?; kill = ^U; eof = ^D; eol = <undef>;
-    -parenb -parodd cs8 hupcl -cstopb cread clocal -crtscts
+    The properties are read from the tty through termios once, and cached
+    afterwards.
 
     Returns:
       dict where:
@@ -218,25 +135,11 @@ class BBuart(uart.Uart):
           2: 2 stop bits
 
     Raises:
-      BBuartError: Unable to properly parse stty output.
+      BBuartError: Unable to read the tty's properties.
     """
     self._logger.debug('Getting uart properties for interface: %s.',
                        self._interface)
-    line_props = {}
-    stty_args = ['stty', '-F', self._pty, '-a']
-    self._logger.debug('Calling %s', ' '.join(stty_args))
-    try:
-      output = subprocess.check_output(stty_args)
-    except subprocess.CalledProcessError as e:
-      raise BBuartError('Failed to get uart properites for %s with error: %s.' %
-                        (self._pty, e))
-
-    line_props['baudrate'] = int(self._get_value(output, SPEED_RE), 0)
-    line_props['parity'] = self._get_parity(output)
-    line_props['bits'] = int(self._get_value(output, BITS_RE), 0)
-    line_props['sbits'] = self._get_sbits(output)
-
-    return line_props
+    return self._get_tty_props(exception_type=BBuartError)
 
   def set_uart_props(self, line_props):
     """Sets the uart's properties.
@@ -258,23 +161,7 @@ class BBuart(uart.Uart):
       BBuartError: If failed to set line properties
     """
     self._logger.debug('Setting line props to: %s', line_props)
-    self._uart_props_validation(line_props, exception_type=BBuartError)
-
-    bits = 'cs%d' % line_props['bits']
-    # According to the web, a UART set to 1 stop bit can receive 1.5 fine.
-    sbits = SBITS_MAP[line_props['sbits']]
-    parity = PARITY_MAP[line_props['parity']]
-
-    stty_args = [
-        'stty', '-F', self._pty,
-        '%d' % line_props['baudrate'], bits, sbits, parity
-    ]
-    stty_args.extend(STTY_EXTRA_ARGS)
-    try:
-      subprocess.check_output(stty_args)
-    except subprocess.CalledProcessError as e:
-      raise BBuartError('Failed to set uart properites for %s with output: %s.'
-                        ' Error: %s.' % (self._pty, e.output, e))
+    self._set_tty_props(line_props, exception_type=BBuartError)
 
   def get_pty(self):
     """Gets path to pty for communication to/from uart.
@@ -5,40 +5,18 @@
 
 import mox
 import os
-import subprocess
+import termios
 import unittest
 
 import bbuart
 
-SET_PROP_EXPECTED_ARGS = [
-    'stty', '-F', '/dev/ttyO1', '115200', 'cs8', '-cstopb', '-parenb'
-]
-SET_PROP_EXPECTED_ARGS.extend(bbuart.STTY_EXTRA_ARGS)
+TTY = '/dev/ttyO1'
+TTY_FD = 17
 TXD_MUXFILE = 'lcd_data8'
 RXD_MUXFILE = 'lcd_data9'
 MUX_SELVAL = 0x4
 
-GET_PROPS_ARGS = ['stty', '-F', '/dev/ttyO1', '-a']
-STTY_GET_ATTRIBUTES_OUTPUT = (
-    'speed 115200 baud; rows 0; columns 0; line = 0;\n'
-    'intr = ^C; quit = ^\; erase = ^?; kill = ^U; eof = ^D; eol = <undef>;'
-    ' eol2 = <undef>; swtch = <undef>;\n'
-    'start = ^Q; stop = ^S; susp = ^Z; rprnt = ^R; werase = ^W; lnext = ^V;'
-    'flush = ^O; min = 1; time = 0;\n'
-    '-parenb -parodd cs8 hupcl -cstopb cread clocal -crtscts\n'
-    '-ignbrk -brkint -ignpar -parmrk -inpck -istrip -inlcr -igncr -icrnl -ixon'
-    ' -ixoff -iuclc -ixany\n'
-    '-imaxbel -iutf8\n'
-    '-opost -olcuc -ocrnl onlcr -onocr -onlret -ofill -ofdel nl0 cr0 tab0 bs0'
-    ' vt0 ff0\n'
-    '-isig -icanon -iexten -echo -echoe -echok -echonl -noflsh -xcase -tostop'
-    ' -echoprt -echoctl -echoke\n')
-GET_UART_PROPS_EXPECTED_RESULTS = {
-    'parity': 0,
-    'baudrate': 115200,
-    'bits': 8,
-    'sbits': 0
-}
+OTHER_UART_SETTINGS = {'baudrate': 9600, 'bits': 7, 'parity': 2, 'sbits': 2}
 BAD_UART_SETTINGS = {'baudrate': 115200, 'bits': 12, 'parity': 0, 'sbits': 0}
 
 
@@ -50,7 +28,28 @@ class TestBBuart(mox.MoxTestBase):
     self._bbmux_controller = self.mox.CreateMockAnything()
     bbuart.bbmux_controller.use_omapmux().AndReturn(True)
     bbuart.bbmux_controller.BBmuxController().AndReturn(self._bbmux_controller)
-    bbuart.subprocess = self.mox.CreateMockAnything()
+    self.mox.StubOutWithMock(os, 'open')
+    self.mox.StubOutWithMock(os, 'close')
+    self.mox.StubOutWithMock(bbuart.uart, 'get_tty_props')
+    self.mox.StubOutWithMock(bbuart.uart, 'set_tty_props')
+
+  def _expectSetTtyProps(self, line_props, error=None):
+    """Expect |line_props| to be set on the tty, failing with |error|."""
+    os.open(TTY, bbuart.uart.TTY_OPEN_FLAGS).AndReturn(TTY_FD)
+    call = bbuart.uart.set_tty_props(TTY_FD, line_props)
+    if error:
+      call.AndRaise(error)
+    os.close(TTY_FD)
+
+  def _expectGetTtyProps(self, line_props=None, error=None):
+    """Expect the tty's properties to be read, failing with |error|."""
+    os.open(TTY, bbuart.uart.TTY_OPEN_FLAGS).AndReturn(TTY_FD)
+    call = bbuart.uart.get_tty_props(TTY_FD)
+    if error:
+      call.AndRaise(error)
+    else:
+      call.AndReturn(line_props)
+    os.close(TTY_FD)
 
   def _initializeBBuartDefault(self):
     """Helper to initalize BBuart with default options.
@@ -62,7 +61,7 @@ class TestBBuart(mox.MoxTestBase):
         bbuart.TXD_PATTERN % self._interface['uart_num'], bbuart.TXD_MODE)
     self._bbmux_controller.set_pin_mode(
         bbuart.RXD_PATTERN % self._interface['uart_num'], bbuart.RXD_MODE)
-    bbuart.subprocess.check_output(SET_PROP_EXPECTED_ARGS)
+    self._expectSetTtyProps(bbuart.DEFAULT_UART_SETTINGS)
 
   def _initializeBBuartWithParems(self):
     """Helper to initalize BBuart with specified parameters.
@@ -77,7 +76,7 @@ class TestBBuart(mox.MoxTestBase):
     }
     self._bbmux_controller.set_muxfile(TXD_MUXFILE, bbuart.TXD_MODE, MUX_SELVAL)
     self._bbmux_controller.set_muxfile(RXD_MUXFILE, bbuart.RXD_MODE, MUX_SELVAL)
-    bbuart.subprocess.check_output(SET_PROP_EXPECTED_ARGS)
+    self._expectSetTtyProps(bbuart.DEFAULT_UART_SETTINGS)
 
   def testInitDefault(self):
     """Initialize and ensure that initializing with default args works."""
@@ -94,74 +93,58 @@ class TestBBuart(mox.MoxTestBase):
     self.mox.VerifyAll()
 
   def testGetUartProps(self):
-    """Test get_uart_props."""
+    """Test get_uart_props returns the properties set without a tty access."""
     self._initializeBBuartDefault()
-    bbuart.subprocess.check_output(GET_PROPS_ARGS).AndReturn(
-        STTY_GET_ATTRIBUTES_OUTPUT)
     self.mox.ReplayAll()
     uart = bbuart.BBuart(self._interface)
-    self.assertEquals(GET_UART_PROPS_EXPECTED_RESULTS, uart.get_uart_props())
+    self.assertEquals(bbuart.DEFAULT_UART_SETTINGS, uart.get_uart_props())
 
   def testGetUartPropsFailure(self):
     """Test get_uart_props failure case.
 
-    This can occur when stty returns bad output.
+    This can occur when the tty cannot be read after a failed set.
     """
     self._initializeBBuartDefault()
-    bbuart.subprocess.check_output(GET_PROPS_ARGS).AndReturn('')
+    self._expectSetTtyProps(OTHER_UART_SETTINGS,
+                            termios.error(5, 'Input/output error'))
+    self._expectGetTtyProps(error=termios.error(5, 'Input/output error'))
     self.mox.ReplayAll()
     uart = bbuart.BBuart(self._interface)
+    self.assertRaises(bbuart.BBuartError, uart.set_uart_props,
+                      OTHER_UART_SETTINGS)
     self.assertRaises(bbuart.BBuartError, uart.get_uart_props)
 
-  def testSetUartPropsFailure(self):
-    """Test when set_uart_props fails due to bad line_prop."""
+  def testGetUartPropsAfterFailedSet(self):
+    """Test get_uart_props reads the tty again after a failed set."""
     self._initializeBBuartDefault()
+    self._expectSetTtyProps(OTHER_UART_SETTINGS,
+                            termios.error(5, 'Input/output error'))
+    self._expectGetTtyProps(bbuart.DEFAULT_UART_SETTINGS)
     self.mox.ReplayAll()
     uart = bbuart.BBuart(self._interface)
     self.assertRaises(bbuart.BBuartError, uart.set_uart_props,
-                      BAD_UART_SETTINGS)
+                      OTHER_UART_SETTINGS)
+    self.assertEquals(bbuart.DEFAULT_UART_SETTINGS, uart.get_uart_props())
+    # Cached from now on.
+    self.assertEquals(bbuart.DEFAULT_UART_SETTINGS, uart.get_uart_props())
 
-  def testGetValue(self):
-    """Test the _get_value helper function."""
+  def testSetUartProps(self):
+    """Test set_uart_props only accesses the tty for changed properties."""
     self._initializeBBuartDefault()
+    self._expectSetTtyProps(OTHER_UART_SETTINGS)
     self.mox.ReplayAll()
     uart = bbuart.BBuart(self._interface)
-    uart_speed = uart._get_value(STTY_GET_ATTRIBUTES_OUTPUT, bbuart.SPEED_RE)
-    self.assertEquals(int(uart_speed, 0), 115200)
-
-  def testGetValueFailByBadOutput(self):
-    """Test the _get_value helper function.
-
-    Fail due to bad output.
-    """
-    self._initializeBBuartDefault()
-    self.mox.ReplayAll()
-    uart = bbuart.BBuart(self._interface)
-    self.assertRaises(bbuart.BBuartError, uart._get_value, '', bbuart.SPEED_RE)
-
-  def testGetValueFailByBadRegex(self):
-    """Test the _get_value helper function.
+    uart.set_uart_props(OTHER_UART_SETTINGS)
+    uart.set_uart_props(dict(OTHER_UART_SETTINGS))
+    self.assertEquals(OTHER_UART_SETTINGS, uart.get_uart_props())
 
-    Fail due to bad regex.
-    """
-    self._initializeBBuartDefault()
-    self.mox.ReplayAll()
-    uart = bbuart.BBuart(self._interface)
-    self.assertRaises(bbuart.BBuartError, uart._get_value,
-                      STTY_GET_ATTRIBUTES_OUTPUT, 'bad_regex')
-
-  def testGetParity(self):
-    """Test the _get_parity helper function."""
+  def testSetUartPropsFailure(self):
+    """Test when set_uart_props fails due to bad line_prop."""
     self._initializeBBuartDefault()
     self.mox.ReplayAll()
     uart = bbuart.BBuart(self._interface)
-    # Test no parity.
-    self.assertEquals(0, uart._get_parity('speed 115200 baud; -parenb'))
-    # Test odd parity.
-    self.assertEquals(1, uart._get_parity('speed 115200 baud; parodd'))
-    # Test even parity.
-    self.assertEquals(1, uart._get_parity('speed 115200 baud; -parodd'))
-
+    self.assertRaises(bbuart.BBuartError, uart.set_uart_props,
+                      BAD_UART_SETTINGS)
 
 if __name__ == '__main__':
   unittest.main()
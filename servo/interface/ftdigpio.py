@@ -158,6 +158,40 @@ class Fgpio(gpio_interface.GpioInterface):
                                                       rd_val.value))
     return (rd_val.value & self._gpio.mask) >> offset
 
+  def bank_wr_rd(self, set_mask=0, clear_mask=0, input_mask=0):
+    """Write and/or read many GPIO bits in one transaction.
+
+    Args:
+      set_mask  : bits to configure as output and drive high
+      clear_mask: bits to configure as output and drive low
+      input_mask: bits to configure as input
+
+    Returns:
+      integer value read from all the gpios, after writing
+
+    Raises:
+      FgpioError: If the transaction fails
+    """
+    rd_val = ctypes.c_ubyte()
+    mask = set_mask | clear_mask | input_mask
+    if mask:
+      gpio = ftdi_common.Gpio()
+      gpio.mask = mask
+      gpio.direction = (set_mask | clear_mask) & ~input_mask
+      gpio.value = set_mask & ~clear_mask
+      err = self._lib.fgpio_wr_rd(
+          ctypes.byref(self._fgc), ctypes.byref(gpio), ctypes.byref(rd_val),
+          ftdi_common.INTERFACE_TYPE_GPIO)
+    else:
+      err = self._lib.fgpio_wr_rd(
+          ctypes.byref(self._fgc), 0, ctypes.byref(rd_val),
+          ftdi_common.INTERFACE_TYPE_GPIO)
+    if err:
+      raise FgpioError('doing fgpio_wr_rd', err)
+    self._logger.debug('set:0x%02x clear:0x%02x input:0x%02x returned 0x%02x',
+                       set_mask, clear_mask, input_mask, rd_val.value)
+    return rd_val.value
+
 
 def test():
   """Test code.
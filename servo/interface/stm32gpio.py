@@ -95,11 +95,6 @@ class Sgpio(gpio_interface.GpioInterface):
     self._logger.debug('Sgpio.wr_rd(offset='
                        '%s, width=%s, dir_val=%s, wr_val=%s)' %
                        (offset, width, dir_val, wr_val))
-    # Read preexisting values for debug output.
-    ret = self._susb.read_ep(4, self._susb.TIMEOUT_MS)
-    read_mask = struct.unpack('<I', ret)[0]
-    self._logger.debug('Read mask: 0x%08x' % read_mask)
-
     width_mask = (1 << width) - 1
     set_mask = 0
     clear_mask = 0
@@ -108,7 +103,35 @@ class Sgpio(gpio_interface.GpioInterface):
       set_mask = (wr_val & width_mask) << offset
       clear_mask = (~wr_val & width_mask) << offset
 
-    byte_str = struct.pack('<II', set_mask, clear_mask)
+    read_mask = self.bank_wr_rd(set_mask, clear_mask)
+    readvalue = (read_mask >> offset) & width_mask
+    self._logger.debug('Read value: 0x%x' % readvalue)
+    return readvalue
+
+  def bank_wr_rd(self, set_mask=0, clear_mask=0, input_mask=0):
+    """Write and/or read many GPIO bits in one transaction.
+
+    The stm32 gpio endpoint cannot release pins. Like wr_rd() does for pull-up
+    controls, pins in |input_mask| are driven high instead.
+
+    Args:
+      set_mask  : bits to drive high
+      clear_mask: bits to drive low
+      input_mask: bits to release, driven high
+
+    Returns:
+      integer value read from all the gpios, after writing
+
+    Raises:
+      SgpioError: If the transaction fails
+    """
+    if self._logger.isEnabledFor(logging.DEBUG):
+      # Read preexisting values for debug output.
+      ret = self._susb.read_ep(4, self._susb.TIMEOUT_MS)
+      self._logger.debug('Read mask: 0x%08x' % struct.unpack('<I', ret)[0])
+
+    set_mask |= input_mask
+    byte_str = struct.pack('<II', set_mask & ~clear_mask, clear_mask)
     ret = self._susb.write_ep(byte_str, self._susb.TIMEOUT_MS)
     if (ret != len(byte_str)):
       raise SgpioError('Wrote %d bytes, expected %d' % (ret, len(byte_str)))
@@ -122,10 +145,7 @@ class Sgpio(gpio_interface.GpioInterface):
 
     read_mask = struct.unpack('<I', ret)[0]
     self._logger.debug('Read mask: 0x%08x' % read_mask)
-
-    readvalue = (read_mask >> offset) & width_mask
-    self._logger.debug('Read value: 0x%x' % readvalue)
-    return readvalue
+    return read_mask
 
   def reinitialize(self):
     """Reinitialize the usb endpoint"""
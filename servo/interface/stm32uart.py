@@ -39,6 +39,15 @@ class Suart(uart.Uart):
   USB_USART_SET_PARITY = 1
   USB_USART_SET_BAUD = 3
   USB_USART_BAUD_MULTIPLIER = 100
+  # Bytes to request per bulk IN transfer. The transfer completes as soon as
+  # the device sends a short packet, so this only bounds the burst size.
+  RX_READ_SIZE = 4096
+  # Delay between back-to-back TX packets.
+  # TODO(crosbug.com/936182): Remove when the servo v4/micro console issues
+  # are fixed.
+  TX_PACKET_DELAY_S = 0.001
+  # Interval to check whether the PTY got reconnected after a hangup.
+  HANGUP_POLL_S = 0.1
 
   def __init__(self, vendor=0x18d1, product=0x501a, interface=0,
                serialname=None, ftdi_context=None):
@@ -64,6 +73,8 @@ class Suart(uart.Uart):
     self._props = {}
 
     self._done = threading.Event()
+    # Pipe to wake up the rx & tx threads when the interface is closed.
+    self._wake_r, self._wake_w = os.pipe()
     self._susb = stm32usb.Susb(vendor=vendor, product=product,
                                interface=interface, serialname=serialname,
                                logger=self._logger)
@@ -88,10 +99,17 @@ class Suart(uart.Uart):
     return 'stm32_uart'
 
   def close(self):
-    """Suart wind down logic."""
+    """Suart wind down logic. Closing again is a no-op."""
+    if self._done.is_set():
+      return
     self._done.set()
+    os.write(self._wake_w, b'x')
     for t in [self._rx_thread, self._tx_thread]:
       t.join(timeout=0.2)
+    # A thread still stuck in a usb transfer does not use the pipe anymore:
+    # closing |_wake_r| drops it from the tx thread's epoll set.
+    os.close(self._wake_r)
+    os.close(self._wake_w)
     del self._susb
 
   def reinitialize(self):
@@ -102,17 +120,34 @@ class Suart(uart.Uart):
     """The usb device information."""
     return self._susb.get_device_info()
 
+  def _hungup(self, ep):
+    """Check whether the pty is hung up, backing off if it is.
+
+    Args:
+      ep: epoll object with |_ptym| registered for EPOLLHUP
+
+    Returns:
+      True if the pty is not connected to anything
+    """
+    if not ep.poll(0):
+      return False
+    self._done.wait(self.HANGUP_POLL_S)
+    return True
+
   def run_rx_thread(self):
     self._logger.debug('rx thread started on %s' % self.get_pty())
 
     ep = select.epoll()
-    ep.register(self._ptym, select.EPOLLHUP)
-    while not self._done.is_set():
-      events = ep.poll(0)
-      # Check if the pty is connected to anything, or hungup.
-      if not events:
+    try:
+      ep.register(self._ptym, select.EPOLLHUP)
+      while not self._done.is_set():
+        # Check if the pty is connected to anything, or hungup.
+        if self._hungup(ep):
+          continue
         try:
-          r = self._susb.read_ep(256, self._susb.TIMEOUT_MS)
+          # The read returns as soon as data arrives, which is forwarded to the
+          # pty right away.
+          r = self._susb.read_ep(self.RX_READ_SIZE, self._susb.TIMEOUT_MS)
           if r:
             os.write(self._ptym, r)
 
@@ -121,28 +156,36 @@ class Suart(uart.Uart):
           # ep.read() also throws USBError on timeout, which we discard.
           if type(e) not in [exceptions.OSError, usb.core.USBError]:
             self._logger.debug('rx %s: %s' % (self.get_pty(), e))
-      else:
-        self._done.wait(.1)
+    finally:
+      ep.close()
 
   def run_tx_thread(self):
     self._logger.debug('tx thread started on %s' % self.get_pty())
 
     ep = select.epoll()
     readp = select.epoll()
-    ep.register(self._ptym, select.EPOLLHUP)
-    readp.register(self._ptym, select.EPOLLIN)
-    while not self._done.is_set():
-      events = ep.poll(0)
-      # Check if the pty is connected to anything, or hungup.
-      if not events:
+    try:
+      ep.register(self._ptym, select.EPOLLHUP)
+      readp.register(self._ptym, select.EPOLLIN)
+      # Wake up as soon as the interface is closed, rather than polling |_done|.
+      readp.register(self._wake_r, select.EPOLLIN)
+      packet_size = self._susb.get_write_packet_size()
+      while not self._done.is_set():
+        # Check if the pty is connected to anything, or hungup.
+        if self._hungup(ep):
+          continue
         try:
-          if readp.poll(.1):
-            r = os.read(self._ptym, 64)
-            # TODO(crosbug.com/936182): Remove when the servo v4/micro console
-            # issues are fixed.
-            time.sleep(0.001)
-            if r:
-              self._susb.write_ep(r, self._susb.TIMEOUT_MS)
+          events = readp.poll(self.HANGUP_POLL_S)
+          if not any(fd == self._ptym for fd, _ in events):
+            continue
+          # Batch everything pending up to one packet per write.
+          r = os.read(self._ptym, packet_size)
+          while r:
+            self._susb.write_ep(r, self._susb.TIMEOUT_MS)
+            if not any(fd == self._ptym for fd, _ in readp.poll(0)):
+              break
+            time.sleep(self.TX_PACKET_DELAY_S)
+            r = os.read(self._ptym, packet_size)
 
         except IOError as e:
           self._logger.debug('tx %s: %s' % (self.get_pty(), e))
@@ -152,8 +195,9 @@ class Suart(uart.Uart):
             raise
         except Exception as e:
           self._logger.debug('tx %s: %s' % (self.get_pty(), e))
-      else:
-        self._done.wait(.1)
+    finally:
+      ep.close()
+      readp.close()
 
   def run(self):
     """Creates pthreads to poll stm32 & PTY for data.
@@ -209,6 +209,10 @@ class Susb():
                          name, self.LOCK_TIMEOUT_S)
       raise SinterfaceError('Failed to acquire %s lock.' % name)
 
+  def get_write_packet_size(self):
+    """Max packet size of |_write_ep|, in bytes."""
+    return self._write_ep.wMaxPacketSize
+
   def read_ep(self, *args, **kwargs):
     """Thread safe wrapper around reading the |read_ep|"""
     self.wait_on_reset()
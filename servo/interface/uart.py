@@ -4,6 +4,7 @@
 """Common Functionality required by Servo Uart Interfaces."""
 import errno
 import os
+import re
 import termios
 import threading
 import time
@@ -15,6 +16,95 @@ MAX_BUFFER_SIZE = 500000  # Do not keep more than this number of bytes
 
 # when capturing.
 
+# Baudrates supported by termios, and the reverse mapping.
+BAUDRATE_TO_SPEED = dict((int(name[1:]), getattr(termios, name))
+                         for name in dir(termios) if re.match(r'B\d+$', name))
+SPEED_TO_BAUDRATE = dict((v, k) for k, v in BAUDRATE_TO_SPEED.items())
+BITS_TO_CSIZE = {5: termios.CS5, 6: termios.CS6, 7: termios.CS7, 8: termios.CS8}
+CSIZE_TO_BITS = dict((v, k) for k, v in BITS_TO_CSIZE.items())
+
+# Flags to open a tty with to get or set its properties.
+TTY_OPEN_FLAGS = os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK
+
+
+def _termios_flags(*names):
+  """OR the termios flags in |names|, skipping any this platform lacks."""
+  value = 0
+  for name in names:
+    value |= getattr(termios, name, 0)
+  return value
+
+
+# Raw mode flags, as in 'stty raw -echo'. Input & output are passed through
+# untouched.
+RAW_IFLAG_CLEAR = _termios_flags(
+    'IGNBRK', 'BRKINT', 'IGNPAR', 'PARMRK', 'INPCK', 'ISTRIP', 'INLCR',
+    'IGNCR', 'ICRNL', 'IXON', 'IXOFF', 'IUCLC', 'IXANY', 'IMAXBEL', 'IUTF8')
+RAW_OFLAG_CLEAR = _termios_flags(
+    'OPOST', 'OLCUC', 'OCRNL', 'ONOCR', 'ONLRET', 'OFILL', 'OFDEL', 'NLDLY',
+    'CRDLY', 'TABDLY', 'BSDLY', 'VTDLY', 'FFDLY')
+RAW_LFLAG_CLEAR = _termios_flags(
+    'ISIG', 'ICANON', 'IEXTEN', 'ECHO', 'ECHOE', 'ECHOK', 'ECHONL', 'NOFLSH',
+    'XCASE', 'TOSTOP', 'ECHOPRT', 'ECHOCTL', 'ECHOKE')
+
+
+def get_tty_props(fd):
+  """Gets the line properties of the tty |fd| through termios.
+
+  Args:
+    fd: file descriptor of the tty
+
+  Returns:
+    line properties dict, see Uart.get_uart_props(). A tty only has 1 or 2 stop
+    bits, reported as 0 or 2.
+
+  Raises:
+    termios.error: if the properties cannot be read
+    KeyError: if the baudrate is not a standard one
+  """
+  (_, _, cflag, _, _, ospeed, _) = termios.tcgetattr(fd)
+  if not cflag & termios.PARENB:
+    parity = 0
+  elif cflag & termios.PARODD:
+    parity = 1
+  else:
+    parity = 2
+  return {
+      'baudrate': SPEED_TO_BAUDRATE[ospeed],
+      'bits': CSIZE_TO_BITS[cflag & termios.CSIZE],
+      'parity': parity,
+      'sbits': 2 if cflag & termios.CSTOPB else 0
+  }
+
+
+def set_tty_props(fd, line_props):
+  """Sets the line properties of the tty |fd| through termios, in raw mode.
+
+  Args:
+    fd: file descriptor of the tty
+    line_props: line properties dict, see Uart.set_uart_props(). 1.5 stop bits
+      are set as 1, which receives 1.5 fine.
+
+  Raises:
+    termios.error: if the properties cannot be set
+    KeyError: if the baudrate is not a standard one
+  """
+  speed = BAUDRATE_TO_SPEED[line_props['baudrate']]
+  (iflag, oflag, cflag, lflag, _, _, cc) = termios.tcgetattr(fd)
+  iflag &= ~RAW_IFLAG_CLEAR
+  oflag = (oflag & ~RAW_OFLAG_CLEAR) | termios.ONLCR
+  lflag &= ~RAW_LFLAG_CLEAR
+  cflag &= ~(termios.CSIZE | termios.CSTOPB | termios.PARENB | termios.PARODD)
+  cflag |= BITS_TO_CSIZE[line_props['bits']]
+  if line_props['sbits'] == 2:
+    cflag |= termios.CSTOPB
+  if line_props['parity']:
+    cflag |= termios.PARENB
+    if line_props['parity'] == 1:
+      cflag |= termios.PARODD
+  termios.tcsetattr(fd, termios.TCSANOW,
+                    [iflag, oflag, cflag, lflag, speed, speed, cc])
+
 
 class Uart(interface.Interface):
   """Base Class for UART interface implementations.
@@ -48,6 +138,9 @@ class Uart(interface.Interface):
     self._capture_paused = False
     # Remember parent thread to be able to find out if it is still running.
     self._parent_thread = threading.current_thread()
+    # Line properties last read from or set on the tty, see _get_tty_props().
+    self._tty_props = None
+    self._tty_props_lock = threading.Lock()
 
   def pause_capture(self):
     """Wait to capture data until it is resumed."""
@@ -204,6 +297,64 @@ class Uart(interface.Interface):
     """
     raise NotImplementedError('get_pty not yet implemented.')
 
+  def _get_tty_props(self, exception_type=Exception):
+    """Gets the line properties of the tty at get_pty() through termios.
+
+    For uarts whose get_pty() is the uart's tty itself. The properties are
+    cached, as servod owns the tty: only the first call reads the tty.
+
+    Args:
+      exception_type: type of exception to throw if the properties cannot be
+        read.
+
+    Returns:
+      line properties dict, see get_uart_props().
+
+    Raises:
+      exception_type: If the properties cannot be read.
+    """
+    with self._tty_props_lock:
+      if self._tty_props is None:
+        try:
+          fd = os.open(self.get_pty(), TTY_OPEN_FLAGS)
+          try:
+            self._tty_props = get_tty_props(fd)
+          finally:
+            os.close(fd)
+        except (OSError, termios.error, KeyError) as e:
+          raise exception_type('Failed to get uart properties for %s: %r' %
+                               (self.get_pty(), e))
+      return self._tty_props.copy()
+
+  def _set_tty_props(self, line_props, exception_type=Exception):
+    """Sets the line properties of the tty at get_pty() through termios.
+
+    The tty is only accessed if |line_props| differ from the cached ones.
+
+    Args:
+      line_props: line properties dict, see set_uart_props().
+      exception_type: type of exception to throw if line_props are invalid, or
+        cannot be set.
+
+    Raises:
+      exception_type: If the properties are invalid or cannot be set.
+    """
+    self._uart_props_validation(line_props, exception_type=exception_type)
+    with self._tty_props_lock:
+      if self._tty_props == line_props:
+        return
+      self._tty_props = None
+      try:
+        fd = os.open(self.get_pty(), TTY_OPEN_FLAGS)
+        try:
+          set_tty_props(fd, line_props)
+        finally:
+          os.close(fd)
+      except (OSError, termios.error, KeyError) as e:
+        raise exception_type('Failed to set uart properties for %s to %s: %r'
+                             % (self.get_pty(), line_props, e))
+      self._tty_props = dict(line_props)
+
   def get_capture_active(self):
     """Returns state of the 'capture_active' control for this interface.
 
@@ -0,0 +1,69 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Tests termios access to tty line properties."""
+
+import os
+import termios
+import unittest
+
+import uart
+
+
+class TestTtyProps(unittest.TestCase):
+
+  def setUp(self):
+    """Open a pty to set properties on."""
+    super(TestTtyProps, self).setUp()
+    (self._master, self._tty) = os.openpty()
+
+  def tearDown(self):
+    """Close the pty."""
+    os.close(self._tty)
+    os.close(self._master)
+    super(TestTtyProps, self).tearDown()
+
+  def test_RoundTrip(self):
+    """Baudrate & stop bits read back as set.
+
+    Linux ptys force 8 data bits without parity, see test_CflagEncoding.
+    """
+    for props in ({'baudrate': 115200, 'bits': 8, 'parity': 0, 'sbits': 0},
+                  {'baudrate': 9600, 'bits': 8, 'parity': 0, 'sbits': 2}):
+      uart.set_tty_props(self._tty, props)
+      self.assertEqual(props, uart.get_tty_props(self._tty))
+
+  def test_RawMode(self):
+    """Setting properties leaves the tty in raw mode."""
+    uart.set_tty_props(self._tty, {'baudrate': 115200, 'bits': 8, 'parity': 0,
+                                   'sbits': 0})
+    (iflag, oflag, _, lflag, _, _, _) = termios.tcgetattr(self._tty)
+    self.assertFalse(iflag & termios.ICRNL)
+    self.assertFalse(oflag & termios.OPOST)
+    self.assertFalse(lflag & (termios.ICANON | termios.ECHO | termios.ISIG))
+
+  def test_CflagEncoding(self):
+    """Data bits, parity & stop bits map to the matching cflag bits."""
+    attrs = termios.tcgetattr(self._tty)
+    cflag = termios.CS7 | termios.PARENB | termios.CSTOPB
+    attrs[2] = cflag
+    attrs[5] = termios.B57600
+    tcgetattr = uart.termios.tcgetattr
+    uart.termios.tcgetattr = lambda fd: list(attrs)
+    try:
+      self.assertEqual({'baudrate': 57600, 'bits': 7, 'parity': 2, 'sbits': 2},
+                       uart.get_tty_props(self._tty))
+      attrs[2] = cflag | termios.PARODD
+      self.assertEqual(1, uart.get_tty_props(self._tty)['parity'])
+    finally:
+      uart.termios.tcgetattr = tcgetattr
+
+  def test_UnsupportedBaudrate(self):
+    """Baudrates termios does not know are rejected."""
+    with self.assertRaises(KeyError):
+      uart.set_tty_props(self._tty, {'baudrate': 1234, 'bits': 8, 'parity': 0,
+                                     'sbits': 0})
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -10,9 +10,14 @@ import threading
 import time
 
 import client
+import ctrl_sampler
 import stats_manager
 import timelined_stats_manager
 
+# Key of the milliseconds spent per sample. When the controls are queried from
+# the client, that is the duration of the query. When HighResServodPowerTracker
+# samples on a servod sampler thread, that is the interval between the start of
+# two consecutive samples, as servod does not report the query duration.
 SAMPLE_TIME_KEY = 'Sample_msecs'
 
 # Default sample rate to query ec for battery power consumption
@@ -92,6 +97,20 @@ class ServodPowerTracker(threading.Thread):
       self._stats.AddSamples(sample_tuples)
       self._stop_signal.wait(max(self._rate - (duration_ms / 1000), 0))
 
+  def _get_samples(self, ctrls):
+    """Helper to query the values of all |ctrls| from servod.
+
+    Args:
+      ctrls: list of servod ctrls to sample
+
+    Returns:
+      list of values, in the same order as |ctrls|
+
+    Raises:
+      client.ServoClientError: if the query failed
+    """
+    return self._sclient.get_batch(ctrls)
+
   def _sample_ctrls(self, ctrls):
     """Helper to query all servod ctrls, and create (name, value) tuples.
 
@@ -106,7 +125,7 @@ class ServodPowerTracker(threading.Thread):
     """
     start = time.time()
     try:
-      samples = self._sclient.set_get_all(ctrls)
+      samples = self._get_samples(ctrls)
     except client.ServoClientError:
       self._logger.warn('Attempt to get commands: %s failed. Recording them'
                         ' all as NaN.', ', '.join(ctrls))
@@ -150,7 +169,72 @@ class HighResServodPowerTracker(ServodPowerTracker):
     Query all |_ctrls| as much as possible during |_rate| interval before
     reporting the mean of those samples as one data point. Timestamp is taken at
     the end of |_rate| interval.
+
+    Sampling happens on a servod sampler thread when servod supports it, so
+    that no RPC round trip is spent per sample. Otherwise, the samples are
+    queried from here. See SAMPLE_TIME_KEY for what it measures in each case.
     """
+    try:
+      sampler_id = self._sclient.start_sampling(self._ctrls, 0)
+    except client.ServoClientError:
+      self._logger.info('servod sampling unavailable. Sampling %s from the '
+                        'client.', ', '.join(self._ctrls))
+      self._run_client_sampling()
+      return
+    try:
+      self._run_servod_sampling(sampler_id)
+    finally:
+      try:
+        self._sclient.stop_sampling(sampler_id)
+      except client.ServoClientError:
+        self._logger.warn('Failed to stop servod sampler %r.', sampler_id)
+
+  def _add_mean_samples(self, temp_stats):
+    """Helper to record the mean of all samples in |temp_stats| as one point.
+
+    Args:
+      temp_stats: StatsManager holding the samples of one |_rate| interval
+    """
+    temp_stats.CalculateStats()
+    temp_summary = temp_stats.GetSummary()
+    samples = [(measurement, summary['mean']) for
+               measurement, summary in temp_summary.items()]
+    self._stats.AddSamples(samples)
+
+  def _run_servod_sampling(self, sampler_id):
+    """Collect the samples of servod sampler |sampler_id| every |_rate|.
+
+    Args:
+      sampler_id: id of the servod sampler sampling |_ctrls|
+    """
+    cursor = 0
+    last_timestamp = None
+    width = len(self._ctrls) + 1
+    while not self._stop_signal.wait(self._rate):
+      try:
+        cursor, dropped, blob = self._sclient.get_samples(sampler_id, cursor)
+      except client.ServoClientError:
+        self._logger.warn('Attempt to get samples of %s failed.',
+                          ', '.join(self._ctrls))
+        continue
+      if dropped:
+        self._logger.warn('%d samples were lost by the servod sampler.',
+                          dropped)
+      rows = ctrl_sampler.unpack_samples(blob, width)
+      if not rows:
+        continue
+      temp_stats = stats_manager.StatsManager()
+      for row in rows:
+        for domain, sample in zip(self._ctrls, row[1:]):
+          temp_stats.AddSample(domain, sample)
+        if last_timestamp is not None:
+          temp_stats.AddSample(SAMPLE_TIME_KEY,
+                               (row[0] - last_timestamp) * 1000)
+        last_timestamp = row[0]
+      self._add_mean_samples(temp_stats)
+
+  def _run_client_sampling(self):
+    """Query all |_ctrls| from the client as much as possible every |_rate|."""
     while not self._stop_signal.is_set():
       start = time.time()
       end = start + self._rate
@@ -163,11 +247,7 @@ class HighResServodPowerTracker(ServodPowerTracker):
         for domain, sample in sample_tuples:
           temp_stats.AddSample(domain, sample)
         start = time.time()
-      temp_stats.CalculateStats()
-      temp_summary = temp_stats.GetSummary()
-      samples = [(measurement, summary['mean']) for
-                 measurement, summary in temp_summary.items()]
-      self._stats.AddSamples(samples)
+      self._add_mean_samples(temp_stats)
       # Sleep until the end of the sample rate
       self._stop_signal.wait(max(0, end - time.time()))
 
@@ -213,6 +293,11 @@ class OnboardINAPowerTracker(HighResServodPowerTracker):
     self._pwr_cfg_ctrls = [ina.replace('_mw', '_cfg_reg') for ina in
                            self._ctrls]
 
+  def _get_samples(self, ctrls):
+    """Sample INA ctrls using one I2C burst per bus on servod."""
+    _, samples = self._sclient.sample_inas(ctrls)
+    return samples
+
   def prepare(self, fast=False, powerstate=UNKNOWN_POWERSTATE):
     """prepare onboard INA measurement by configuring INAs for powerstate."""
     cfg = 'regular_power' if powerstate in [UNKNOWN_POWERSTATE,
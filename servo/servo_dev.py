@@ -99,6 +99,10 @@ class ServoDevice(object):
     """Return a tuple of the device information."""
     return self._vendor, self._product, self._serialname
 
+  def get_sysfs_path(self):
+    """Return the /sys/bus/usb/devices path of the device."""
+    return self._sysfs_path
+
   def is_connected(self):
     """Returns True if the device is connected."""
     return os.path.exists(self._sysfs_path)
@@ -25,14 +25,22 @@ All instances on the same port are in the same directory.
 # File is an extension to the standard library logger. Conform to their code
 # style.
 
+import atexit
 import collections
 import datetime
 import logging
 import logging.handlers
 import os
+try:
+  import Queue as queue
+except ImportError:
+  import queue
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
 import re
 import sys
 import tarfile
+import threading
 
 
 # Format strings used for servod logging.
@@ -230,7 +238,30 @@ def _compressOldFiles(logdir):
       ServodRotatingFileHandler.compressFn(logpath)
 
 
-def setup(logdir, port, debug_stdout=False, backup_count=LOG_BACKUP_COUNT):
+def _rootHandlers():
+  """Helper to list the root logger's handlers, including queued ones.
+
+  Returns:
+    list of handlers the root logger's records end up in
+  """
+  handlers = []
+  for handler in logging.getLogger().handlers:
+    if isinstance(handler, ServodQueueHandler):
+      handlers.extend(handler.listener.handlers)
+    else:
+      handlers.append(handler)
+  return handlers
+
+
+def _stopQueuedLogging():
+  """Helper to flush & stop the root logger's queued handlers, if any."""
+  for handler in logging.getLogger().handlers:
+    if isinstance(handler, ServodQueueHandler):
+      handler.listener.stop()
+
+
+def setup(logdir, port, debug_stdout=False, backup_count=LOG_BACKUP_COUNT,
+          queued=False):
   """Setup servod logging.
 
   This function handles setting up logging, whether it be normal basicConfig
@@ -241,12 +272,16 @@ def setup(logdir, port, debug_stdout=False, backup_count=LOG_BACKUP_COUNT):
     port: port used for current instance
     debug_stdout: whether the stdout logs should be debug
     backup_count: max number of compressed and uncompressed files to keep around
+    queued: whether the file & stdout handlers run on a background thread (**)
 
   (*) if |logdir| is None, the system will not setup log handlers, but rather
   setup logging using basicConfig()
+  (**) logging calls then only enqueue their record, and the background thread
+  formats, writes, rotates & compresses the logs. Only used with a |logdir|.
   """
   root_logger = logging.getLogger()
   # Remove all handlers that might currently exist.
+  _stopQueuedLogging()
   root_logger.handlers = []
   # Let the root logger process every log message, while the different
   # handlers chose which ones to put out.
@@ -264,7 +299,7 @@ def setup(logdir, port, debug_stdout=False, backup_count=LOG_BACKUP_COUNT):
     stdout_handler = logging.StreamHandler(sys.stdout)
     stdout_handler.setLevel(level)
     stdout_handler.formatter = logging.Formatter(fmt=fmt)
-    root_logger.addHandler(stdout_handler)
+    handlers = [stdout_handler]
     instance_logdir = _buildLogdirName(logdir, port)
     logging_ts = _generateTs()
     if not os.path.isdir(instance_logdir):
@@ -278,7 +313,14 @@ def setup(logdir, port, debug_stdout=False, backup_count=LOG_BACKUP_COUNT):
                                      level=fh_level)
       # Ensure that the global backup limit is kept across instances.
       fh.pruneOldLogsAcrossInstances()
-      root_logger.addHandler(fh)
+      handlers.append(fh)
+    if queued:
+      listener = ServodLogListener(handlers)
+      listener.start()
+      root_logger.addHandler(ServodQueueHandler(listener))
+    else:
+      for handler in handlers:
+        root_logger.addHandler(handler)
     # Compress and rotate currently open files with the old timestamps beyond
     # the uncompressed limit.
     # It's safe to modify these files, as no 2 servod instances can be listening
@@ -291,10 +333,13 @@ def setup(logdir, port, debug_stdout=False, backup_count=LOG_BACKUP_COUNT):
 
 def cleanup():
   """Helper to clean up by rotating out all open files."""
+  # Write out all queued records first, so that no log is rotated while
+  # still being written to.
+  _stopQueuedLogging()
   # Find all unique directories where the loggers have been logging to.
   # This should only be one, but that is not enforced.
   logdirs = set()
-  for handler in logging.getLogger().handlers:
+  for handler in _rootHandlers():
     if isinstance(handler, ServodRotatingFileHandler):
       logdirs.add(handler.logdir)
   for logdir in logdirs:
@@ -461,6 +506,104 @@ class ServodRotatingFileHandler(logging.handlers.RotatingFileHandler):
     self.pruneOldLogsAcrossInstances()
 
 
+class ServodLogListener(threading.Thread):
+  """Thread handing queued log records to the actual handlers.
+
+  Formatting, writing, rotating and compressing the logs all happen on this
+  thread, so that none of it is paid by the code that is logging.
+  """
+
+  # Queued to signal the thread to stop, once all prior records are handled.
+  _STOP = object()
+
+  def __init__(self, handlers):
+    """Setup listener thread.
+
+    Args:
+      handlers: list of handlers to pass each record to
+    """
+    threading.Thread.__init__(self, name=type(self).__name__)
+    self.daemon = True
+    self.handlers = handlers
+    self.queue = queue.Queue()
+    self._stop_lock = threading.Lock()
+    self._stopped = False
+    # Daemon threads are killed at exit. Handle the remaining records first.
+    atexit.register(self.stop)
+
+  @property
+  def stopped(self):
+    """Whether stop() was called. Records are no longer dequeued then."""
+    return self._stopped
+
+  def handle(self, record):
+    """Pass |record| to all handlers whose level it meets."""
+    for handler in self.handlers:
+      if record.levelno >= handler.level:
+        handler.handle(record)
+
+  def run(self):
+    """Handle queued records until stopped."""
+    while True:
+      record = self.queue.get()
+      if record is self._STOP:
+        break
+      self.handle(record)
+    for handler in self.handlers:
+      handler.flush()
+
+  def stop(self):
+    """Handle all queued records, then stop the thread."""
+    with self._stop_lock:
+      if self._stopped:
+        return
+      self._stopped = True
+    self.queue.put(self._STOP)
+    if self.is_alive() and threading.current_thread() is not self:
+      self.join()
+
+
+class ServodQueueHandler(logging.Handler):
+  """Handler that only queues records for a ServodLogListener."""
+
+  # Argument types that cannot change between queueing and formatting.
+  _IMMUTABLE_TYPES = (type(None), bool, int, float, str, type(u''))
+
+  def __init__(self, listener):
+    """Initialize handler.
+
+    Args:
+      listener: ServodLogListener handling the queued records
+    """
+    logging.Handler.__init__(self)
+    self.listener = listener
+
+  def emit(self, record):
+    """Queue |record|.
+
+    The message is only formatted on the listener's thread, unless an argument
+    could be changed by the caller in the meantime.
+    """
+    args = record.args
+    if args and not (isinstance(args, tuple) and
+                     all(isinstance(arg, self._IMMUTABLE_TYPES)
+                         for arg in args)):
+      try:
+        record.msg = record.getMessage()
+        record.args = None
+      except Exception:  # pylint: disable=broad-except
+        self.handleError(record)
+        return
+    if self.listener.stopped:
+      # Turning down: there is no thread left to hand the record to.
+      self.listener.handle(record)
+    else:
+      self.listener.queue.put(record)
+
+  def flush(self):
+    """Records are written by the listener. See ServodLogListener.stop()."""
+
+
 class FuncNameAligner(logging.Filter):
   """
   Class to align the function names without having to alter the log format
@@ -498,7 +641,16 @@ class _ControlWrapper(object):
 
   # The history of recursive set/get/set calls
   # This is a class attribute so indentation can be shared between instances.
-  call_stack = []
+  # The stack is kept per thread, as servod might serve multiple requests
+  # concurrently, and their nesting is independent of each other.
+  _thread_state = threading.local()
+
+  @classmethod
+  def _call_stack(cls):
+    """Return the call stack of the current thread."""
+    if not hasattr(cls._thread_state, 'call_stack'):
+      cls._thread_state.call_stack = []
+    return cls._thread_state.call_stack
 
   def __init__(self, name, known_exceptions=(AttributeError,)):
     """Instance initializer
@@ -509,8 +661,11 @@ class _ControlWrapper(object):
                         in _log_exception
     """
     self.logger = logging.getLogger('Controls')
-    self.logger.addFilter(FuncNameAligner(len('_log_success')))
-    self.depth = len(self.__class__.call_stack)
+    # Wrappers are created per call. Add the filter only once, or every
+    # record would go through one filter per call made so far.
+    if not any(isinstance(f, FuncNameAligner) for f in self.logger.filters):
+      self.logger.addFilter(FuncNameAligner(len('_log_success')))
+    self.depth = len(self._call_stack())
     self.indent = '  ' * self.depth
     self.name = name
     self._known_exceptions = tuple(known_exceptions)
@@ -539,7 +694,7 @@ class _ControlWrapper(object):
     self._log_start()
 
     # Record self in the stack, so inner calls are indented.
-    self.__class__.call_stack.append(str(self))
+    self._call_stack().append(str(self))
     return self
 
   def __exit__(self, exc_type, exc_val, exc_tb):
@@ -552,8 +707,9 @@ class _ControlWrapper(object):
     """
 
     # Remove one level from the call stack, since this call is done.
-    if self.__class__.call_stack:
-      self.__class__.call_stack.pop(-1)
+    call_stack = self._call_stack()
+    if call_stack:
+      call_stack.pop(-1)
 
     if exc_val is None:
       self._log_success()
@@ -9,6 +9,7 @@ import logging
 import os
 import shutil
 import tempfile
+import threading
 import unittest
 
 import servo_logging
@@ -368,5 +369,73 @@ class TestServodRotatingFileHandler(unittest.TestCase):
                                                 level=self.loglevel)
     assert os.path.isdir(output_dir)
 
+
+class TestQueuedLogging(unittest.TestCase):
+
+  def setUp(self):
+    """Set up a logger queueing into a file handler on a listener thread."""
+    unittest.TestCase.setUp(self)
+    self.logdir = tempfile.mkdtemp()
+    self.handler = servo_logging.ServodRotatingFileHandler(
+        logdir=self.logdir, ts=servo_logging._generateTs(), fmt='',
+        level=logging.DEBUG)
+    self.listener = servo_logging.ServodLogListener([self.handler])
+    self.listener.start()
+    self.test_logger = logging.getLogger('QueuedTest')
+    self.test_logger.setLevel(logging.DEBUG)
+    self.test_logger.propagate = False
+    self.test_logger.addHandler(servo_logging.ServodQueueHandler(self.listener))
+
+  def tearDown(self):
+    """Stop the listener, remove handlers & delete logging directory."""
+    self.listener.stop()
+    self.test_logger.handlers = []
+    self.handler.close()
+    shutil.rmtree(self.logdir)
+    unittest.TestCase.tearDown(self)
+
+  def _ReadLog(self):
+    """Helper to stop the listener and read the log file."""
+    self.listener.stop()
+    with open(self.handler.baseFilename, 'r') as log:
+      return log.read().splitlines()
+
+  def test_QueuedRecordsWrittenOnStop(self):
+    """All queued records are written out once the listener stops."""
+    for i in range(100):
+      self.test_logger.info('line %d', i)
+    self.assertEqual(['line %d' % i for i in range(100)], self._ReadLog())
+
+  def test_MutableArgsFormattedOnEnqueue(self):
+    """Arguments changed after the logging call do not alter the record."""
+    value = ['before']
+    self.test_logger.info('value %s', value)
+    value[0] = 'after'
+    self.assertEqual(["value ['before']"], self._ReadLog())
+
+  def test_RolloverOnListenerThread(self):
+    """Rotation happens on the listener thread, not the logging one."""
+    rollover_threads = []
+    do_rollover = self.handler.doRollover
+
+    def recording_rollover():
+      rollover_threads.append(threading.current_thread())
+      do_rollover()
+
+    self.handler.doRollover = recording_rollover
+    self.handler.maxBytes = 40
+    self.test_logger.info('This is an attempt to make 40 bytes laaa')
+    self.test_logger.info('This is an attempt to make 40 bytes laaa')
+    self.listener.stop()
+    self.assertTrue(rollover_threads)
+    self.assertTrue(all(t is self.listener for t in rollover_threads))
+
+  def test_RecordsHandledAfterStop(self):
+    """Records logged after the listener stopped are still written."""
+    self.listener.stop()
+    self.test_logger.info('late line')
+    self.assertEqual(['late line'], self._ReadLog())
+
+
 if __name__ == '__main__':
   unittest.main()
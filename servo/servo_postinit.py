@@ -23,6 +23,10 @@ POST_INIT = collections.defaultdict(dict)
 DUAL_V4_VAR = 'DUAL_V4_CFG'
 DUAL_V4_VAR_EMPTY = 'empty'
 
+# Set by launchers that already ran the device kick once for all the servod
+# instances they start.
+USB_KICKED_VAR = 'SERVOD_USB_KICKED'
+
 
 ServoType = collections.namedtuple('ServoType', [
     # str - String to use in servod DUT control names.
@@ -184,6 +188,9 @@ class ServoV4PostInit(BasePostInit):
     we can detect and initialize extra devices properly.  This method is here
     to hold all those necessary pre-postinit actions.
     """
+    if USB_KICKED_VAR in os.environ:
+      # The launcher did it for all instances before starting them.
+      return
     # Run 'lsusb' so that servo micros are configured and show up in sysfs.
     subprocess.call(['lsusb'])
 
@@ -2,9 +2,13 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 """Servo Server."""
+import collections
 import logging
+import multiprocessing.pool
 import os
 import re
+import sys
+import threading
 try:
   from SimpleXMLRPCServer import SimpleXMLRPCServer
 except ImportError:
@@ -14,7 +18,14 @@ except ImportError:
 import time
 import usb
 import weakref
+try:
+  from xmlrpclib import Binary
+except ImportError:
+  from xmlrpc.client import Binary
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
 
+import ctrl_sampler
 import drv as servo_drv
 import interface as _interface
 import servo_dev
@@ -24,6 +35,17 @@ import servo_postinit
 
 HwDriverError = servo_drv.hw_driver.HwDriverError
 
+try:
+  # pylint: disable=exec-used
+  exec('def _reraise(exc_info):\n'
+       '  raise exc_info[0], exc_info[1], exc_info[2]\n')
+except SyntaxError:
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+  def _reraise(exc_info):
+    """Raise the exception in |exc_info| with its original traceback."""
+    raise exc_info[1].with_traceback(exc_info[2])
+
 
 class ServodError(Exception):
   """Exception class for servod."""
@@ -49,6 +71,14 @@ class Servod(object):
   # of these (or their subclasses) will be logged with "Please take a look."
   KNOWN_EXCEPTIONS = (AttributeError, NameError, HwDriverError)
 
+  # Max number of worker threads used to serve a single get_batch() request.
+  MAX_BATCH_WORKERS = 8
+
+  # Default number of samples kept by a start_sampling() sampler.
+  DEFAULT_SAMPLE_CAPACITY = 100000
+  # Seconds without get_samples() after which a sampler stops on its own.
+  SAMPLER_IDLE_TIMEOUT = 60
+
   def init_servo_interfaces(self, vendor, product, serialname, interfaces):
     """Init the servo interfaces with the given interfaces.
 
@@ -108,7 +138,8 @@ class Servod(object):
         self._interface_list[i] = result
 
   def __init__(self, config, vendor, product, serialname=None, interfaces=None,
-               board='', model='', version=None, usbkm232=None):
+               board='', model='', version=None, usbkm232=None,
+               precompile=False):
     """Servod constructor.
 
     Args:
@@ -126,6 +157,8 @@ class Servod(object):
           sending keyboard commands to DUTs that do not have built in
           keyboards. Used in FAFT tests. Use None for on board AVR MCU.
           e.g. '/dev/ttyUSB0' or None.
+      precompile: Boolean. Instantiate the drivers of all controls at init
+          rather than on first use. See precompile_drv_dict().
 
     Raises:
       ServodError: if unable to locate init method for particular interface
@@ -140,9 +173,33 @@ class Servod(object):
     # list of objects (Fi2c, Fgpio) to physical interfaces (gpio, i2c) that ftdi
     # interfaces are mapped to
     self._interface_list = []
-    # Dict of Dict to map control name, function name to to tuple (params, drv)
-    # Ex) _drv_dict[name]['get'] = (params, drv)
+    # Dict of Dict to map control name, function name to to tuple
+    # (params, drv, device_info, lock)
+    # Ex) _drv_dict[name]['get'] = (params, drv, device_info, lock)
     self._drv_dict = {}
+    # Dict to map an interface index to the set of control names whose
+    # |_drv_dict| entries use that interface.
+    self._drv_dict_index = collections.defaultdict(set)
+    # True once precompile_drv_dict() built |_drv_dict| for all controls, so
+    # that entries dropped on interface changes are rebuilt right away.
+    self._precompiled = False
+    # Guards |_drv_dict| and |_interface_locks| when requests are served
+    # concurrently.
+    self._drv_dict_lock = threading.RLock()
+    # Dict to map an interface (or a 'servo' interface control name) to the
+    # lock serializing access to it. See _get_lock() for details.
+    self._interface_locks = {}
+    # Dict to map a tuple of control names to the plan used to sample them
+    # in sample_inas(). See _build_ina_sample_plan() for details.
+    self._ina_sample_plans = {}
+    # Dict to map a sampler id to the CtrlSampler started by start_sampling().
+    self._samplers = {}
+    self._samplers_lock = threading.Lock()
+    self._next_sampler_id = 0
+    # Worker threads running the groups of get_batch() & hwinit(), started on
+    # first use. See _run_groups().
+    self._batch_pool = None
+    self._batch_pool_lock = threading.Lock()
     self._base_board = ''
     self._board = board
     if model:
@@ -162,11 +219,15 @@ class Servod(object):
     self.init_servo_interfaces(vendor, product, serialname, interfaces)
     servo_postinit.post_init(self)
     self._syscfg.finalize()
+    if precompile:
+      self.precompile_drv_dict()
 
   def reinitialize(self):
     """Reinitialize all interfaces that support reinitialization"""
     for i, interface in enumerate(self._interface_list):
       interface.reinitialize()
+    # Devices behind the interfaces may have been reset.
+    servo_drv.i2c_reg.invalidate_shadows()
     # Indicate interfaces are safe to use again.
     for device in self._devices.values():
         device.connect()
@@ -188,10 +249,36 @@ class Servod(object):
       interfaces: The list of interfaces to set.
     """
     size = len(interfaces)
+    replaced = self._interface_list[position:(position + size)]
     self._interface_list[position:(position + size)] = interfaces
+    with self._drv_dict_lock:
+      # Drop the locks of interfaces no longer in use, so that they are freed.
+      in_use = set(id(interface) for interface in self._interface_list)
+      for interface in replaced:
+        if id(interface) not in in_use:
+          self._interface_locks.pop(id(interface), None)
+      names = set()
+      for index in range(position, position + size):
+        names.update(self._drv_dict_index.pop(index, set()))
+      for name in names:
+        self._drv_dict.pop(name, None)
+      if names:
+        # Sample plans hold on to drivers, which might just have been dropped.
+        self._ina_sample_plans = {}
+      if self._precompiled:
+        self._precompile_controls(names)
 
   def close(self):
     """Servod turn down logic."""
+    with self._samplers_lock:
+      samplers = list(self._samplers.values())
+      self._samplers = {}
+    for sampler in samplers:
+      sampler.stop()
+    with self._batch_pool_lock:
+      if self._batch_pool is not None:
+        self._batch_pool.terminate()
+        self._batch_pool = None
     for i, interface in enumerate(self._interface_list):
       self._logger.info('Turning down interface %d' % i)
       interface.close()
@@ -221,7 +308,75 @@ class Servod(object):
     When the servo interfaces are relocated, the cached values may become wrong.
     Should call this method to clear the cached values.
     """
-    self._drv_dict = {}
+    with self._drv_dict_lock:
+      self._drv_dict = {}
+      self._drv_dict_index = collections.defaultdict(set)
+      self._ina_sample_plans = {}
+      if self._precompiled:
+        self._precompile_controls(self._syscfg.syscfg_dict['control'])
+
+  def precompile_drv_dict(self):
+    """Instantiate the drivers of all controls & aliases up front.
+
+    Afterwards, the first access to a control is as fast as any later one.
+    Entries dropped because interfaces changed are rebuilt right away, see
+    set_servo_interfaces() and clear_cached_drv().
+    """
+    start = time.time()
+    with self._drv_dict_lock:
+      self._precompiled = True
+      self._precompile_controls(self._syscfg.syscfg_dict['control'])
+    self._logger.info('Precompiled drivers for %d controls in %.2fs.',
+                      len(self._drv_dict), time.time() - start)
+
+  def _precompile_controls(self, names):
+    """Helper to build the |_drv_dict| entries of |names|.
+
+    Controls whose driver cannot be built are skipped, so that the error is
+    surfaced when the control is used.
+
+    Args:
+      names: iterable of control names
+    """
+    for name in names:
+      for is_get in (True, False):
+        # pylint: disable=broad-except
+        try:
+          self._get_param_drv_locked(name, is_get)
+        except Exception as e:
+          self._logger.debug('Not precompiling %s for %s: %s',
+                             'get' if is_get else 'set', name, e)
+
+  def _get_lock(self, interface, control_name):
+    """Get the lock serializing access to |interface|.
+
+    Requests touching the same interface are serialized, while requests on
+    different interfaces can be served concurrently. The lock follows the
+    interface object rather than its index, so interfaces relocated through
+    set_servo_interfaces() or shared across indices keep a single lock.
+
+    Controls on the 'servo' interface are usually compositions of other
+    controls, which serialize on their own interfaces. Those are only
+    serialized against themselves, using a lock per control name.
+
+    Args:
+      interface: interface object the control's driver is built on, or None
+                 if the control lives on the 'servo' interface
+      control_name: name of the control the lock is for
+
+    Returns:
+      threading.RLock to hold while accessing the control's driver
+    """
+    if interface is None:
+      key = ('servo', control_name)
+    else:
+      # Store the interface alongside the lock to ensure its id() is not reused
+      # while the entry exists.
+      key = id(interface)
+    with self._drv_dict_lock:
+      if key not in self._interface_locks:
+        self._interface_locks[key] = (interface, threading.RLock())
+      return self._interface_locks[key][1]
 
   def _get_servo_specific_param(self, params, param_key, control_name):
     """Get |param_key| from params by looking for servo specific params first.
@@ -282,22 +437,27 @@ class Servod(object):
       is_get: boolean to determine
 
     Returns:
-      tuple (params, drv, device_info) where:
+      tuple (params, drv, device_info, lock) where:
         params: param dictionary for control
         drv: instance object of driver for particular control
         device_info: servo device information
+        lock: lock to hold while using drv. See _get_lock()
 
     Raises:
       ServodError: Error occurred while examining params dict
     """
-    self._logger.debug('')
+    with self._drv_dict_lock:
+      return self._get_param_drv_locked(control_name, is_get)
+
+  def _get_param_drv_locked(self, control_name, is_get):
+    """Implementation of _get_param_drv(). Requires |_drv_dict_lock|."""
     # if already setup just return tuple from driver dict
-    if control_name in self._drv_dict:
-      if is_get and ('get' in self._drv_dict[control_name]):
-        return self._drv_dict[control_name]['get']
-      if not is_get and ('set' in self._drv_dict[control_name]):
-        return self._drv_dict[control_name]['set']
+    cmd = 'get' if is_get else 'set'
+    entries = self._drv_dict.get(control_name)
+    if entries and cmd in entries:
+      return entries[cmd]
 
+    self._logger.debug('Building %s driver for %s', cmd, control_name)
     params = self._syscfg.lookup_control_params(control_name, is_get)
 
     # Get the most suitable drv given the servo instance.
@@ -318,9 +478,12 @@ class Servod(object):
 
     if interface_id == 'servo':
       interface = weakref.proxy(self)
+      lock = self._get_lock(None, control_name)
+      index = None
     else:
       index = int(interface_id)
       interface = self._interface_list[index]
+      lock = self._get_lock(interface, control_name)
 
     device_info = None
     if hasattr(interface, 'get_device_info'):
@@ -328,13 +491,10 @@ class Servod(object):
     drv_module = getattr(servo_drv, drv_name)
     drv_class = getattr(drv_module, self._camel_case(drv_name))
     drv = drv_class(interface, params)
-    if control_name not in self._drv_dict:
-      self._drv_dict[control_name] = {}
-    if is_get:
-      self._drv_dict[control_name]['get'] = (params, drv, device_info)
-    else:
-      self._drv_dict[control_name]['set'] = (params, drv, device_info)
-    return (params, drv, device_info)
+    self._drv_dict.setdefault(control_name, {})[cmd] = (params, drv,
+                                                       device_info, lock)
+    self._drv_dict_index[index].add(control_name)
+    return (params, drv, device_info, lock)
 
   def doc_all(self):
     """Return all documenation for controls.
@@ -370,6 +530,9 @@ class Servod(object):
   def set_get_all(self, cmds):
     """Set &| get one or more control values.
 
+    The commands run one after another, and stop at the first error. Use
+    get_batch() to read controls on different interfaces in parallel.
+
     Args:
       cmds: list of control[:value] to get or set.
 
@@ -385,6 +548,461 @@ class Servod(object):
         rv.append(self.get(cmd))
     return rv
 
+  def _get_batch_key(self, name):
+    """Helper to find out which get_batch() group |name| belongs to.
+
+    Args:
+      name: name string of control
+
+    Returns:
+      the lock serializing |name|'s interface, or None if that cannot be
+      determined. In that case, get() will surface any errors on its own.
+    """
+    if 'serialname' in name:
+      return None
+    # pylint: disable=broad-except
+    try:
+      return self._get_param_drv(name)[3]
+    except Exception:
+      return None
+
+  def _run_groups(self, func, groups):
+    """Helper to call |func| on each group, running groups in parallel.
+
+    The groups run on a pool of MAX_BATCH_WORKERS worker threads, kept across
+    calls. |func| must not raise, nor use the pool itself.
+
+    Args:
+      func: function taking one group as argument
+      groups: list of groups
+    """
+    groups = list(groups)
+    if len(groups) <= 1:
+      for group in groups:
+        func(group)
+      return
+    with self._batch_pool_lock:
+      if self._batch_pool is None:
+        self._batch_pool = multiprocessing.pool.ThreadPool(
+            self.MAX_BATCH_WORKERS)
+      pool = self._batch_pool
+    pool.map(func, groups, chunksize=1)
+
+  def get_batch(self, names):
+    """Get multiple control values, reading different interfaces in parallel.
+
+    The controls are grouped by the interface they are on. Each group is read
+    on its own worker thread, in the order the controls were requested.
+
+    Args:
+      names: list of control names to get
+
+    Returns:
+      list of control values in the same order as |names|
+
+    Raises:
+      The first error encountered, in the order of |names|, with its original
+      traceback. A group stops at its first error, and no group starts a get
+      that comes after a failed one in |names|. Gets on other interfaces that
+      were already under way still complete.
+    """
+    groups = collections.OrderedDict()
+    for i, name in enumerate(names):
+      groups.setdefault(self._get_batch_key(name), []).append(i)
+    results = [None] * len(names)
+    # Mapping from index in |names| to the sys.exc_info() of its failed get.
+    errors = {}
+    errors_lock = threading.Lock()
+
+    def get_group(indices):
+      """Get all controls in |indices| sequentially, up to the first error."""
+      for i in indices:
+        with errors_lock:
+          if errors and min(errors) < i:
+            return
+        # pylint: disable=broad-except
+        # The error is raised again in the requesting thread.
+        try:
+          results[i] = self.get(names[i])
+        except Exception:
+          with errors_lock:
+            errors[i] = sys.exc_info()
+          return
+
+    self._run_groups(get_group, groups.values())
+    if errors:
+      _reraise(errors[min(errors)])
+    return results
+
+  def _gpio_bank_entry(self, name, is_get):
+    """Helper to look up control |name| for a gpio bank.
+
+    Args:
+      name: control name
+      is_get: boolean, whether the control is to be read or set
+
+    Returns:
+      tuple (params, drv, device, lock) as _get_param_drv() returns it, or None
+      if |name| cannot be accessed as part of a gpio bank
+    """
+    # pylint: disable=broad-except
+    try:
+      entry = self._get_param_drv(name, is_get)
+    except Exception:
+      # get() & set() will surface the error on their own.
+      return None
+    if not servo_drv.gpio.GpioBank.supports(entry[1]):
+      return None
+    return entry
+
+  @staticmethod
+  def _gpio_bank_step(lock, entries):
+    """Helper to turn |entries| of one interface into a gpio bank.
+
+    Args:
+      lock: lock of the interface the entries are on
+      entries: list of (index, params, drv, device) tuples, with at least two
+               entries, no two driving the same pin
+
+    Returns:
+      tuple (lock, devices, bank, indices, params), see _build_gpio_bank_plan()
+    """
+    indices = [i for i, _, _, _ in entries]
+    params = [p for _, p, _, _ in entries]
+    bank = servo_drv.gpio.GpioBank([d for _, _, d, _ in entries])
+    devices = set(dev for _, _, _, dev in entries)
+    return (lock, devices, bank, indices, params)
+
+  def _build_gpio_bank_plan(self, names):
+    """Helper to group |names| into gpio banks for get_group().
+
+    Args:
+      names: list of control names
+
+    Returns:
+      tuple (banks, others) where:
+        banks: list of (lock, devices, bank, indices, params) tuples, one per
+               interface lock with at least two gpio controls. |indices| are
+               the positions in |names| of the controls |bank| drives, |params|
+               their param dicts
+        others: list of positions in |names| to access one by one
+    """
+    groups = collections.OrderedDict()
+    others = []
+    for i, name in enumerate(names):
+      entry = self._gpio_bank_entry(name, is_get=True)
+      if entry is None:
+        others.append(i)
+        continue
+      (params, drv, device, lock) = entry
+      (pins, entries) = groups.setdefault(lock, [0, []])
+      mask = servo_drv.gpio.GpioBank.pin_mask(drv)
+      if pins & mask:
+        # Already read through another control of the bank.
+        others.append(i)
+        continue
+      groups[lock][0] = pins | mask
+      entries.append((i, params, drv, device))
+    banks = []
+    for lock, (_, entries) in groups.items():
+      if len(entries) < 2:
+        others.extend(i for i, _, _, _ in entries)
+        continue
+      banks.append(self._gpio_bank_step(lock, entries))
+    others.sort()
+    return (banks, others)
+
+  def _build_gpio_set_plan(self, names):
+    """Helper to split |names| into the steps of set_group(), in order.
+
+    Consecutive gpio controls on the same interface are set as one bank. A
+    control that cannot be part of that bank ends it: a control on another
+    interface, one that is not a bank capable gpio, or one driving a pin
+    already in the bank. This way the controls take effect in the order of
+    |names|, and e.g. a reset pulse setting the same control twice works.
+
+    Args:
+      names: list of control names
+
+    Returns:
+      list of steps, each a (lock, devices, bank, indices, params) tuple as in
+      _build_gpio_bank_plan(). For a control to set on its own through set(),
+      |indices| holds its position in |names| and the rest is None.
+    """
+    steps = []
+    runs = []
+    for i, name in enumerate(names):
+      entry = self._gpio_bank_entry(name, is_get=False)
+      if entry is None:
+        runs.append((None, 0, [(i, None, None, None)]))
+        continue
+      (params, drv, device, lock) = entry
+      mask = servo_drv.gpio.GpioBank.pin_mask(drv)
+      if runs and runs[-1][0] is lock and not runs[-1][1] & mask:
+        (_, pins, entries) = runs.pop()
+        runs.append((lock, pins | mask, entries + [(i, params, drv, device)]))
+      else:
+        runs.append((lock, mask, [(i, params, drv, device)]))
+    for lock, _, entries in runs:
+      if len(entries) < 2:
+        steps.append((None, None, None, [entries[0][0]], None))
+      else:
+        steps.append(self._gpio_bank_step(lock, entries))
+    return steps
+
+  def set_group(self, cmds):
+    """Set multiple gpio controls at the same time.
+
+    Consecutive gpio controls on the same interface are set in a single
+    transaction, so their pins change together. Any other control in |cmds| is
+    set through set(). Everything is set in the order of |cmds|, see
+    _build_gpio_set_plan().
+
+    Args:
+      cmds: list of control:value to set
+
+    Returns:
+      True
+
+    Raises:
+      ServodError: if an entry in |cmds| has no value
+      HwDriverError: Error occurred while using a driver
+    """
+    names = []
+    values = []
+    for cmd in cmds:
+      if ':' not in cmd:
+        raise ServodError('No value to set for %r' % cmd)
+      (control, value) = cmd.split(':', 1)
+      names.append(control)
+      values.append(value)
+    for lock, devices, bank, indices, params in self._build_gpio_set_plan(
+        names):
+      if bank is None:
+        self.set(names[indices[0]], values[indices[0]])
+        continue
+      for device in devices:
+        if device in self._devices:
+          self._devices[device].wait(self.INTERFACE_AVAILABILITY_TIMEOUT)
+      with servo_logging.WrapSetCall(
+          ','.join(names[i] for i in indices),
+          ','.join(values[i] for i in indices),
+          known_exceptions=self.KNOWN_EXCEPTIONS):
+        wr_vals = [self._syscfg.resolve_val(params[j], values[i])
+                   for j, i in enumerate(indices)]
+        with lock:
+          bank.set(wr_vals)
+    return True
+
+  def get_group(self, names):
+    """Get multiple gpio controls from the same read.
+
+    Gpio controls on the same interface are read in a single transaction. Any
+    other control in |names| is read through get_batch().
+
+    Args:
+      names: list of control names to get
+
+    Returns:
+      list of control values in the same order as |names|
+    """
+    (banks, others) = self._build_gpio_bank_plan(names)
+    values = [None] * len(names)
+    for lock, devices, bank, indices, params in banks:
+      for device in devices:
+        if device in self._devices:
+          self._devices[device].wait(self.INTERFACE_AVAILABILITY_TIMEOUT)
+      # pylint: disable=broad-except
+      try:
+        with lock:
+          vals = bank.get()
+      except Exception as e:
+        # A failed bank read is retried control by control, which has its own
+        # error reporting.
+        self._logger.debug('gpio bank read of %s failed: %s. Falling back to '
+                           'single reads.', [names[i] for i in indices], e)
+        others.extend(indices)
+        continue
+      for j, i in enumerate(indices):
+        values[i] = self._syscfg.reformat_val(params[j], vals[j])
+    others.sort()
+    for i, value in zip(others, self.get_batch([names[i] for i in others])):
+      values[i] = value
+    return values
+
+  def _build_ina_sample_plan(self, names):
+    """Helper to group |names| into INA2xx bursts for sample_inas().
+
+    Args:
+      names: list of control names to sample
+
+    Returns:
+      tuple (bursts, others) where:
+        bursts: list of (lock, devices, sampler, indices, params) tuples, one
+                per interface lock. |indices| are the positions in |names| of
+                the controls |sampler| samples, |params| their param dicts
+        others: list of positions in |names| that cannot be sampled in a burst
+    """
+    groups = collections.OrderedDict()
+    others = []
+    for i, name in enumerate(names):
+      # pylint: disable=broad-except
+      try:
+        (params, drv, device, lock) = self._get_param_drv(name)
+      except Exception:
+        # get() will surface the error on its own.
+        others.append(i)
+        continue
+      if not servo_drv.ina2xx.Ina2xxBurstSampler.supports(drv):
+        others.append(i)
+        continue
+      groups.setdefault(lock, []).append((i, params, drv, device))
+    bursts = []
+    for lock, entries in groups.items():
+      indices = [i for i, _, _, _ in entries]
+      params = [p for _, p, _, _ in entries]
+      sampler = servo_drv.ina2xx.Ina2xxBurstSampler([d for _, _, d, _ in
+                                                     entries])
+      devices = set(dev for _, _, _, dev in entries)
+      bursts.append((lock, devices, sampler, indices, params))
+    return (bursts, others)
+
+  def sample_inas(self, names):
+    """Sample INA2xx power rail controls with one I2C burst per bus.
+
+    Bus & shunt voltage controls of INA2xx ADCs, and current & power controls
+    of ADCs without current & power registers, are computed from registers
+    all read in a single multi_wr_rd() per I2C bus. Any other control in
+    |names|, e.g. the current of an INA219, is read through get_batch(), so
+    that it matches a single get().
+
+    Args:
+      names: list of control names to sample
+
+    Returns:
+      [timestamp, values] where:
+        timestamp: time in seconds since epoch when sampling started
+        values: list of control values, in the same order as |names|
+    """
+    key = tuple(names)
+    with self._drv_dict_lock:
+      if key not in self._ina_sample_plans:
+        self._ina_sample_plans[key] = self._build_ina_sample_plan(names)
+      (bursts, others) = self._ina_sample_plans[key]
+    timestamp = time.time()
+    values = [None] * len(names)
+    for lock, devices, sampler, indices, params in bursts:
+      for device in devices:
+        if device in self._devices:
+          self._devices[device].wait(self.INTERFACE_AVAILABILITY_TIMEOUT)
+      # pylint: disable=broad-except
+      try:
+        with lock:
+          (_, samples) = sampler.sample()
+      except Exception as e:
+        # A failed burst is retried control by control, which has its own
+        # retry & error reporting logic.
+        self._logger.debug('INA burst for %s failed: %s. Falling back to '
+                           'single reads.', [names[i] for i in indices], e)
+        for i in indices:
+          values[i] = self.get(names[i])
+      else:
+        for j, i in enumerate(indices):
+          values[i] = self._syscfg.reformat_val(params[j], samples[j])
+    for i, value in zip(others, self.get_batch([names[i] for i in others])):
+      values[i] = value
+    return [timestamp, values]
+
+  def start_sampling(self, names, interval,
+                     capacity=DEFAULT_SAMPLE_CAPACITY):
+    """Start sampling controls continuously on a servod thread.
+
+    Samples are taken through sample_inas() and stored in a ring buffer, to be
+    retrieved in bulk through get_samples(). This keeps RPC overhead out of the
+    sampling interval. A sampler whose samples are not retrieved for
+    SAMPLER_IDLE_TIMEOUT seconds stops, and is discarded.
+
+    Args:
+      names: list of control names to sample
+      interval: seconds between the start of two samples. 0 to sample as fast
+                as possible
+      capacity: number of samples kept before the oldest are overwritten
+
+    Returns:
+      sampler id to pass to get_samples() and stop_sampling()
+    """
+    sampler = ctrl_sampler.CtrlSampler(lambda: self.sample_inas(names), names,
+                                       interval, capacity,
+                                       self.SAMPLER_IDLE_TIMEOUT)
+    with self._samplers_lock:
+      # Drop the samplers that stopped on their own, along with their buffer.
+      for stale_id in [i for i, s in self._samplers.items()
+                       if not s.is_alive()]:
+        del self._samplers[stale_id]
+      sampler_id = self._next_sampler_id
+      self._next_sampler_id += 1
+      self._samplers[sampler_id] = sampler
+    self._logger.info('Sampler %d started for %s every %ss.', sampler_id,
+                      ', '.join(names), interval)
+    sampler.start()
+    return sampler_id
+
+  def _get_sampler(self, sampler_id):
+    """Helper to look up sampler |sampler_id|.
+
+    Raises:
+      ServodError: if there is no such sampler, or it stopped on its own
+    """
+    with self._samplers_lock:
+      if sampler_id not in self._samplers:
+        raise ServodError('No sampler with id %r' % sampler_id)
+      sampler = self._samplers[sampler_id]
+      if not sampler.is_alive():
+        del self._samplers[sampler_id]
+        raise ServodError('Sampler %r stopped: samples not retrieved for %ss' %
+                          (sampler_id, self.SAMPLER_IDLE_TIMEOUT))
+      return sampler
+
+  def get_samples(self, sampler_id, cursor=0):
+    """Retrieve the samples taken since |cursor| by sampler |sampler_id|.
+
+    Args:
+      sampler_id: id returned by start_sampling()
+      cursor: cursor returned by the previous get_samples(), 0 for all samples
+
+    Returns:
+      [cursor, dropped, blob] where:
+        cursor: cursor to pass to the next get_samples()
+        dropped: number of samples since |cursor| that were overwritten before
+                 being retrieved
+        blob: Binary of the samples packed by ctrl_sampler.pack_samples(). Each
+              sample is the timestamp followed by the value of each control, in
+              the order passed to start_sampling(). NaN for failed reads.
+    """
+    sampler = self._get_sampler(sampler_id)
+    (cursor, dropped, rows) = sampler.read(cursor)
+    if dropped:
+      self._logger.warn('Sampler %d: %d samples overwritten before retrieval.',
+                        sampler_id, dropped)
+    return [cursor, dropped, Binary(ctrl_sampler.pack_samples(rows))]
+
+  def stop_sampling(self, sampler_id):
+    """Stop sampler |sampler_id| and discard its samples.
+
+    Args:
+      sampler_id: id returned by start_sampling()
+
+    Raises:
+      ServodError: if there is no such sampler
+    """
+    with self._samplers_lock:
+      sampler = self._samplers.pop(sampler_id, None)
+    if sampler is None:
+      raise ServodError('No sampler with id %r' % sampler_id)
+    sampler.stop()
+    self._logger.info('Sampler %d stopped.', sampler_id)
+    return True
+
   def add_serial_number(self, name, serial_number):
     """Adds the serial number to the _serialnames dictionary.
 
@@ -441,11 +1059,12 @@ class Servod(object):
 
     with servo_logging.WrapGetCall(
             name, known_exceptions=self.KNOWN_EXCEPTIONS) as wrapper:
-      (params, drv, device) = self._get_param_drv(name)
+      (params, drv, device, lock) = self._get_param_drv(name)
       if device in self._devices:
         self._devices[device].wait(self.INTERFACE_AVAILABILITY_TIMEOUT)
 
-      val = drv.get()
+      with lock:
+        val = drv.get()
       rd_val = self._syscfg.reformat_val(params, val)
       wrapper.got_result(rd_val)
       return rd_val
@@ -488,39 +1107,72 @@ class Servod(object):
     """
     with servo_logging.WrapSetCall(
             name, wr_val_str, known_exceptions=self.KNOWN_EXCEPTIONS):
-      (params, drv, device) = self._get_param_drv(name, False)
+      (params, drv, device, lock) = self._get_param_drv(name, False)
       if device in self._devices:
         self._devices[device].wait(self.INTERFACE_AVAILABILITY_TIMEOUT)
       wr_val = self._syscfg.resolve_val(params, wr_val_str)
 
-      drv.set(wr_val)
+      with lock:
+        try:
+          drv.set(wr_val)
+        finally:
+          if 'resets_expanders' in params:
+            # The expanders' registers are back to their power on defaults.
+            servo_drv.i2c_reg.invalidate_shadows()
 
     # TODO(crbug.com/841097) Figure out why despite allow_none=True for both
     # xmlrpc server & client I still have to return something to appease the
     # marshall/unmarshall
     return True
 
-  def hwinit(self, verbose=False):
-    """Initialize all controls.
+  def _hwinit_phases(self):
+    """Helper to split the hwinit list into phases of independent groups.
 
-    These values are part of the system config XML files of the form
-    init=<value>.  This command should be used by clients wishing to return the
-    servo and DUT its connected to a known good/safe state.
+    hwinit runs in declared order, except for controls marked with the
+    init_independent key. Consecutive independent controls whose get & set go
+    through the same interface are grouped by that interface, keeping their
+    declared order, and groups on different interfaces run concurrently. Any
+    other control runs alone, in its own phase, after all controls declared
+    before it and before all controls declared after it.
 
-    Note that initialization errors are ignored (as in some cases they could
-    be caused by DUT firmware deficiencies). This might need to be fine tuned
-    later.
+    Returns:
+      list of phases, each a list of groups that can run concurrently. Each
+      group is a list of (control_name, value) to initialize in order.
+    """
+    phases = []
+    groups = collections.OrderedDict()
+    for control_name, value in self._syscfg.hwinit:
+      key = None
+      # pylint: disable=broad-except
+      try:
+        (_, _, _, get_lock) = self._get_param_drv(control_name)
+        (params, _, _, set_lock) = self._get_param_drv(control_name,
+                                                        is_get=False)
+        if ('init_independent' in params and get_lock is set_lock and
+            params.get('interface') != 'servo'):
+          key = get_lock
+      except Exception:
+        # Initializing the control alone surfaces the error.
+        pass
+      if key is None:
+        if groups:
+          phases.append(list(groups.values()))
+          groups = collections.OrderedDict()
+        phases.append([[(control_name, value)]])
+      else:
+        groups.setdefault(key, []).append((control_name, value))
+    if groups:
+      phases.append(list(groups.values()))
+    return phases
+
+  def _hwinit_group(self, group, verbose):
+    """Initialize the controls of one hwinit group, in order.
 
     Args:
+      group: list of (control_name, value) tuples
       verbose: boolean, if True prints info about control initialized.
-        Otherwise prints nothing.
-
-    Returns:
-      This function is called across RPC and as such is expected to return
-      something unless transferring 'none' across is allowed. Hence adding a
-      mock return value to make things simpler.
     """
-    for control_name, value in self._syscfg.hwinit:
+    for control_name, value in group:
       try:
         # Workaround for bug chrome-os-partner:42349. Without this check, the
         # gpio will briefly pulse low if we set it from high to high.
@@ -536,6 +1188,33 @@ class Servod(object):
                            'error is not just a setup issue, consider filing '
                            'a bug. Also checkout go/servo-ki.')
 
+  def hwinit(self, verbose=False):
+    """Initialize all controls.
+
+    These values are part of the system config XML files of the form
+    init=<value>.  This command should be used by clients wishing to return the
+    servo and DUT its connected to a known good/safe state.
+
+    Controls are initialized in declared order. Only controls marked with the
+    init_independent key may be initialized concurrently with controls on
+    other interfaces, see _hwinit_phases().
+
+    Note that initialization errors are ignored (as in some cases they could
+    be caused by DUT firmware deficiencies). This might need to be fine tuned
+    later.
+
+    Args:
+      verbose: boolean, if True prints info about control initialized.
+        Otherwise prints nothing.
+
+    Returns:
+      This function is called across RPC and as such is expected to return
+      something unless transferring 'none' across is allowed. Hence adding a
+      mock return value to make things simpler.
+    """
+    for phase in self._hwinit_phases():
+      self._run_groups(lambda group: self._hwinit_group(group, verbose), phase)
+
     # If there is the control of 'active_v4_device', set active_v4_device to
     # the default device as initialization.
     try:
@@ -0,0 +1,102 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Unit tests for servo_server."""
+
+import threading
+import unittest
+
+import servo_server
+
+INDEPENDENT = {'init_independent': ''}
+
+
+class FakeSyscfg(object):
+  """System config holding only an hwinit list."""
+
+  def __init__(self, hwinit):
+    self.hwinit = hwinit
+
+
+class TestHwinitPhases(unittest.TestCase):
+
+  def setUp(self):
+    """Set up a servod whose controls are looked up in |self.controls|."""
+    unittest.TestCase.setUp(self)
+    self.locks = {'ec': threading.Lock(), 'cpu': threading.Lock(),
+                  'gpio': threading.Lock(), 'servo': threading.Lock()}
+    # control name -> (params, get interface, set interface)
+    self.controls = {}
+    self.servod = servo_server.Servod.__new__(servo_server.Servod)
+    # pylint: disable=protected-access
+    self.servod._get_param_drv = self._get_param_drv
+
+  def _get_param_drv(self, control_name, is_get=True):
+    """Look up |control_name| like Servod._get_param_drv does."""
+    params, get_iface, set_iface = self.controls[control_name]
+    iface = get_iface if is_get else set_iface
+    params = dict(params, interface=iface)
+    return (params, None, None, self.locks[iface])
+
+  def _add(self, name, iface, params=None, set_iface=None):
+    """Add control |name| with its get & set on |iface| (or |set_iface|)."""
+    self.controls[name] = (params or {}, iface, set_iface or iface)
+
+  def _phases(self, names):
+    """Return the hwinit phases of controls |names|, as names only."""
+    self.servod._syscfg = FakeSyscfg([(name, 'on') for name in names])
+    # pylint: disable=protected-access
+    return [[[name for name, _ in group] for group in phase]
+            for phase in self.servod._hwinit_phases()]
+
+  def test_DeclaredOrder(self):
+    """Controls that are not independent each run alone, in order."""
+    self._add('a', 'gpio')
+    self._add('b', 'ec')
+    self._add('c', 'gpio')
+    self.assertEqual([[['a']], [['b']], [['c']]],
+                     self._phases(['a', 'b', 'c']))
+
+  def test_IndependentGroupedByInterface(self):
+    """Consecutive independent controls are grouped by their interface."""
+    self._add('ec1', 'ec', INDEPENDENT)
+    self._add('cpu1', 'cpu', INDEPENDENT)
+    self._add('ec2', 'ec', INDEPENDENT)
+    self._add('cpu2', 'cpu', INDEPENDENT)
+    self.assertEqual([[['ec1', 'ec2'], ['cpu1', 'cpu2']]],
+                     self._phases(['ec1', 'cpu1', 'ec2', 'cpu2']))
+
+  def test_BoundaryBetweenIndependent(self):
+    """Independent controls are not moved across other controls."""
+    self._add('ec1', 'ec', INDEPENDENT)
+    self._add('reset', 'gpio')
+    self._add('ec2', 'ec', INDEPENDENT)
+    self._add('cpu1', 'cpu', INDEPENDENT)
+    self.assertEqual([[['ec1']], [['reset']], [['ec2'], ['cpu1']]],
+                     self._phases(['ec1', 'reset', 'ec2', 'cpu1']))
+
+  def test_ServoInterfaceAlone(self):
+    """Controls on the servo interface run alone even if independent."""
+    self._add('ec1', 'ec', INDEPENDENT)
+    self._add('virtual', 'servo', INDEPENDENT)
+    self._add('ec2', 'ec', INDEPENDENT)
+    self.assertEqual([[['ec1']], [['virtual']], [['ec2']]],
+                     self._phases(['ec1', 'virtual', 'ec2']))
+
+  def test_GetAndSetOnDifferentInterfacesAlone(self):
+    """Controls reading and writing through different interfaces run alone."""
+    self._add('ec1', 'ec', INDEPENDENT)
+    self._add('mixed', 'ec', INDEPENDENT, set_iface='gpio')
+    self.assertEqual([[['ec1']], [['mixed']]],
+                     self._phases(['ec1', 'mixed']))
+
+  def test_UnknownControlAlone(self):
+    """Controls that cannot be looked up run alone to report their error."""
+    self._add('ec1', 'ec', INDEPENDENT)
+    self.assertEqual([[['ec1']], [['missing']]],
+                     self._phases(['ec1', 'missing']))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -16,15 +16,24 @@ import select
 import signal
 try:
   from SimpleXMLRPCServer import SimpleXMLRPCServer
+  from SimpleXMLRPCServer import SimpleXMLRPCRequestHandler
 except ImportError:
   from xmlrpc.server import SimpleXMLRPCServer
+  from xmlrpc.server import SimpleXMLRPCRequestHandler
   # TODO(crbug.com/999878): This is for python3 compatibility.
   # Remove once fully moved to python3.
 import socket
+try:
+  import SocketServer as socketserver
+except ImportError:
+  import socketserver
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
 import sys
 import threading
 import time
 
+import binary_rpc
 import interface.ftdi_common
 import recovery
 import servo_interfaces
@@ -104,6 +113,41 @@ def usb_find(vendor, product, serialname):
   return matched_devices
 
 
+class KeepAliveXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
+  """XMLRPC request handler keeping the client connection open.
+
+  Speaking HTTP/1.1 lets clients send many requests over one connection instead
+  of opening a new one per request. A connection left idle for |timeout|
+  seconds is closed to release its thread.
+  """
+
+  protocol_version = 'HTTP/1.1'
+
+  # Seconds an idle connection is kept open.
+  timeout = 60
+
+  def log_error(self, format, *args):  # pylint: disable=redefined-builtin
+    """Log errors, e.g. idle connection timeouts, to the debug log."""
+    logging.debug('%s: %s', self.address_string(), format % args)
+
+
+class ThreadedXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+  """XMLRPC server handling each connection on its own thread.
+
+  Servod serializes the requests per interface, so requests touching different
+  interfaces can be served at the same time. As each connection has its own
+  thread, connections are also kept alive between requests.
+  """
+
+  # Do not wait for in-flight requests on turn down.
+  daemon_threads = True
+
+  def __init__(self, addr, requestHandler=KeepAliveXMLRPCRequestHandler,
+               **kwargs):
+    SimpleXMLRPCServer.__init__(self, addr, requestHandler=requestHandler,
+                                **kwargs)
+
+
 # pylint: disable=g-bad-exception-name
 class ServodError(Exception):
   """Exception class for servod server."""
@@ -149,10 +193,13 @@ class ServodStarter(object):
       end_port = sopts.port
     else:
       end_port, start_port = DEFAULT_PORT_RANGE
+    server_class = SimpleXMLRPCServer
+    if sopts.threaded:
+      server_class = ThreadedXMLRPCServer
     for self._servo_port in range(start_port, end_port - 1, -1):
       try:
-        self._server = SimpleXMLRPCServer((self._host, self._servo_port),
-                                          logRequests=False)
+        self._server = server_class((self._host, self._servo_port),
+                                    logRequests=False)
         break
       except socket.error as e:
         if e.errno == errno.EADDRINUSE:
@@ -172,7 +219,8 @@ class ServodStarter(object):
       sys.exit(-1)
     servo_logging.setup(logdir=sopts.log_dir, port=self._servo_port,
                         debug_stdout=sopts.debug,
-                        backup_count=sopts.log_dir_backup_count)
+                        backup_count=sopts.log_dir_backup_count,
+                        queued=sopts.async_logging)
 
     if sopts.dual_v4:
       # Leave the right breadcrumbs for servo_postinit to know whether to setup
@@ -249,7 +297,8 @@ class ServodStarter(object):
         scfg, vendor=servo_device.idVendor, product=servo_device.idProduct,
         serialname=usb_get_iserial(servo_device),
         interfaces=devopts.interfaces.split(), board=devopts.board,
-        model=devopts.model, version=board_version, usbkm232=devopts.usbkm232)
+        model=devopts.model, version=board_version, usbkm232=devopts.usbkm232,
+        precompile=sopts.precompile_drivers)
 
     # Small timeout to allow interface threads to initialize.
     time.sleep(0.5)
@@ -260,6 +309,7 @@ class ServodStarter(object):
     self._server.register_instance(self._servod)
     self._server_thread = threading.Thread(target=self._serve)
     self._server_thread.daemon = True
+    self._binary_servers = self._create_binary_servers(sopts)
     self._turndown_initiated = False
     # pylint: disable=protected-access
     # Needs access to the servod instance.
@@ -273,9 +323,35 @@ class ServodStarter(object):
       self._logger.info('Received signal: %d. Attempting to turn off', signum)
       self._server.shutdown()
       self._server.server_close()
+      for binary_server in self._binary_servers:
+        binary_server.shutdown()
+        binary_server.server_close()
       self._servod.close()
       self._logger.info('Successfully turned off')
 
+  def _create_binary_servers(self, sopts):
+    """Create the binary RPC listeners requested on the cmdline.
+
+    Args:
+      sopts: server args Namespace, see _parse_args()
+
+    Returns:
+      list of binary_rpc servers serving the servod instance
+    """
+    servers = []
+    try:
+      if sopts.binary_port is not None:
+        servers.append(binary_rpc.BinaryRPCServer((self._host,
+                                                   sopts.binary_port)))
+      if sopts.binary_socket:
+        servers.append(binary_rpc.UnixBinaryRPCServer(sopts.binary_socket))
+    except socket.error as e:
+      self._logger.fatal('Problem opening binary RPC socket: %s', e)
+      sys.exit(-1)
+    for server in servers:
+      server.register_instance(self._servod)
+    return servers
+
   def _parse_args(self, cmdline):
     """Parse commandline arguments.
 
@@ -284,7 +360,9 @@ class ServodStarter(object):
 
     Returns:
       tuple: (server, dev) args Namespaces after parsing & processing cmdline
-        server: holds --port, --host, --log-dir, --allow-dual-v4, --debug flags
+        server: holds --port, --host, --log-dir, --async-logging,
+                --allow-dual-v4, --threaded, --precompile-drivers,
+                --binary-port, --binary-socket, --debug flags
         dev: holds all the device flags (serialname, interfaces, configs etc -
              see below) necessary to configure a servo device.
     """
@@ -319,9 +397,31 @@ class ServodStarter(object):
                              'inactive when no log dir requested.' %
                              (servo_logging.MAX_LOG_BYTES,
                               servo_logging.UNCOMPRESSED_BACKUP_COUNT))
+    server_pars.add_argument('--async-logging', default=False,
+                             action='store_true',
+                             help='Write, rotate and compress the log dir '
+                             'files on a background thread, so that logging '
+                             'does not slow down control calls.')
     server_pars.add_argument('--allow-dual-v4', dest='dual_v4', default=False,
                              action='store_true',
                              help='Allow dual micro and ccd on servo v4.')
+    server_pars.add_argument('--threaded', default=False, action='store_true',
+                             help='Serve requests concurrently. Requests are '
+                             'serialized per interface, so controls on '
+                             'different interfaces do not block each other.')
+    server_pars.add_argument('--precompile-drivers', default=False,
+                             action='store_true',
+                             help='Instantiate the drivers of all controls at '
+                             'startup, so that the first use of a control is '
+                             'as fast as any later one.')
+    server_pars.add_argument('--binary-port', default=None, type=int,
+                             help='Also serve the binary RPC protocol on this '
+                             'TCP port. It is cheaper than xmlrpc for high '
+                             'rate traffic.')
+    server_pars.add_argument('--binary-socket', default=None, type=str,
+                             help='Also serve the binary RPC protocol on a '
+                             'Unix socket at this path, for clients on the '
+                             'same host.')
     server_pars.add_argument('--recovery_mode', default=False,
                              action='store_true',
                              help='Start servod through issues to allow for '
@@ -551,6 +651,16 @@ class ServodStarter(object):
     except Exception:
       self._exit_status = 1
 
+  def _serve_binary(self, server):
+    """Wrapper around a binary RPC server's serve_forever."""
+    # pylint: disable=broad-except
+    self._logger.info('Serving binary RPC on %s', server.server_address)
+    try:
+      server.serve_forever()
+    except Exception:
+      self._logger.exception('Binary RPC server on %s failed',
+                             server.server_address)
+
   def serve(self):
     """Add signal handlers, start servod on its own thread & wait for signal.
 
@@ -569,6 +679,11 @@ class ServodStarter(object):
       sys.exit(1)
     self._watchdog_thread.start()
     self._server_thread.start()
+    for binary_server in self._binary_servers:
+      binary_thread = threading.Thread(target=self._serve_binary,
+                                       args=(binary_server,))
+      binary_thread.daemon = True
+      binary_thread.start()
     # Indicate that servod is running for any process waiting to know.
     self._scratchutil.MarkActive(self._servo_port)
     signal.pause()
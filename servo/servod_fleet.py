@@ -0,0 +1,292 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Start a servod instance for every servo on the host, in parallel."""
+
+from __future__ import print_function
+
+import argparse
+import errno
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import servo_interfaces
+import servo_parsing
+import servo_postinit
+import servod
+import utils.scratch as scratch
+import utils.usb_hierarchy as usb_hierarchy
+
+# Seconds to wait for all instances to be up and registered.
+DEFAULT_STARTUP_TIMEOUT = 180
+# Seconds between two checks of the instances coming up.
+POLL_INTERVAL = 0.2
+
+# Servos served by the servod instance of the servo v4 they hang on, if any.
+SECONDARY_SERVO_IDS = (servo_interfaces.SERVO_MICRO_DEFAULTS +
+                       servo_interfaces.CCD_DEFAULTS +
+                       servo_interfaces.C2D2_DEFAULTS)
+
+# servod flags picking one servo or port. The launcher sets those per instance.
+PER_INSTANCE_FLAGS = ('-s', '--serialname', '-n', '--name', '-p', '--port')
+
+STOP_SIGNALS = (signal.SIGHUP, signal.SIGINT, signal.SIGQUIT, signal.SIGTERM)
+
+
+class FleetError(Exception):
+  """Error class for the fleet launcher."""
+
+
+def discover_servos():
+  """Find the servos that need a servod instance of their own.
+
+  The USB devices are enumerated once, from sysfs. Servo micros, C2D2s and
+  CCD endpoints hanging on a servo v4 are left to the servod instance of that
+  servo v4.
+
+  Returns:
+    list of usb_hierarchy.SysfsEntry, one per servo
+  """
+  hierarchy = usb_hierarchy.Hierarchy
+  entries = hierarchy.GetAllUsbDeviceSysfsEntries(
+      servo_interfaces.SERVO_ID_DEFAULTS)
+  v4_hubs = [hierarchy.GetSysfsParentHubStub(entry.path) for entry in entries
+             if (entry.vid, entry.pid) in servo_interfaces.SERVO_V4_DEFAULTS]
+  servos = []
+  for entry in entries:
+    if ((entry.vid, entry.pid) in SECONDARY_SERVO_IDS and
+        any(hierarchy.DevOnHubPortFromSysfs(hub, entry.path)
+            for hub in v4_hubs)):
+      continue
+    servos.append(entry)
+  return sorted(servos, key=lambda entry: entry.path)
+
+
+class FleetLauncher(object):
+  """Start & supervise one servod process per servo.
+
+  The servos are discovered once, and devices are kicked once, in the
+  launcher. It then forks all servod instances at once, so that their startup
+  and post-init probes run concurrently. The instances inherit the USB sysfs
+  index built during discovery, and register themselves in the scratch.
+  """
+
+  def __init__(self, servod_cmdline, scratchutil=None):
+    """Constructor.
+
+    Args:
+      servod_cmdline: list, servod cmdline shared by all instances
+      scratchutil: scratch.Scratch the instances register in
+    """
+    self._logger = logging.getLogger(type(self).__name__)
+    self._cmdline = servod_cmdline
+    self._scratchutil = scratchutil or scratch.Scratch()
+    # Mapping from child pid to serial of its servo.
+    self._children = {}
+    # Mapping from serial to exit status of the instances that ended.
+    self._exit_status = {}
+
+  def _instance_cmdline(self, servo):
+    """Return the servod cmdline for |servo|, a usb_hierarchy.SysfsEntry."""
+    return self._cmdline + ['--vendor', '0x%04x' % servo.vid,
+                            '--product', '0x%04x' % servo.pid,
+                            '--serialname', servo.serial]
+
+  def _run_instance(self, servo):
+    """Run a servod instance for |servo| in a forked child. Never returns."""
+    status = 1
+    try:
+      # pylint: disable=broad-except
+      for ss in STOP_SIGNALS:
+        signal.signal(ss, signal.SIG_DFL)
+      os.environ.pop(servo_parsing.NAME_ENV_VAR, None)
+      servod.main(self._instance_cmdline(servo))
+      status = 0
+    except SystemExit as e:
+      status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except BaseException:
+      self._logger.exception('servod for %s failed', servo.serial)
+    finally:
+      # Skip the launcher's atexit handlers & buffered output.
+      os._exit(status)
+
+  def launch(self, servos):
+    """Fork a servod instance for each servo.
+
+    Stop signals received by the launcher from then on are forwarded to the
+    instances.
+
+    Args:
+      servos: list of usb_hierarchy.SysfsEntry, see discover_servos()
+    """
+    handler = lambda signum, unused, launcher=self: launcher.stop()
+    for ss in STOP_SIGNALS:
+      signal.signal(ss, handler)
+    # The instances do not need to kick the devices again.
+    os.environ[servo_postinit.USB_KICKED_VAR] = '1'
+    for servo in servos:
+      pid = os.fork()
+      if not pid:
+        self._run_instance(servo)
+      self._logger.info('Started servod pid %d for servo vid: 0x%04x '
+                        'pid: 0x%04x sid: %s', pid, servo.vid, servo.pid,
+                        servo.serial)
+      self._children[pid] = servo.serial
+
+  def _reap(self, block=False):
+    """Collect the instances that ended.
+
+    Args:
+      block: wait for one instance to end
+
+    Returns:
+      False if there are no instances left, True otherwise
+    """
+    while self._children:
+      try:
+        pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+      except OSError as e:
+        if e.errno == errno.EINTR:
+          continue
+        if e.errno == errno.ECHILD:
+          self._children.clear()
+          break
+        raise
+      if not pid:
+        return True
+      serial = self._children.pop(pid, None)
+      if serial is None:
+        continue
+      self._exit_status[serial] = os.WEXITSTATUS(status) if \
+          os.WIFEXITED(status) else 1
+      self._logger.info('servod for %s ended with status %d', serial,
+                        self._exit_status[serial])
+      block = False
+    return bool(self._children)
+
+  def _is_active(self, serial):
+    """Whether the instance serving |serial| registered and is active."""
+    try:
+      return self._scratchutil.FindById(serial)[scratch.ACTIVE_ENTRY_KEY]
+    except scratch.ScratchError:
+      return False
+
+  def wait_active(self, timeout=DEFAULT_STARTUP_TIMEOUT):
+    """Wait for all the instances to be active, or to have ended.
+
+    Args:
+      timeout: seconds to wait at most
+
+    Returns:
+      list of the serials of the instances that are active
+    """
+    pending = set(self._children.values())
+    active = []
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+      self._reap()
+      for serial in list(pending):
+        if self._is_active(serial):
+          self._logger.info('servod for %s is active on port %d', serial,
+                            self._scratchutil.FindById(serial)['port'])
+          active.append(serial)
+          pending.discard(serial)
+        elif serial in self._exit_status:
+          pending.discard(serial)
+      if pending:
+        time.sleep(POLL_INTERVAL)
+    for serial in pending:
+      self._logger.error('servod for %s not active after %ds', serial, timeout)
+    return active
+
+  def stop(self):
+    """Ask all instances to turn down."""
+    for pid in self._children:
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except OSError as e:
+        if e.errno != errno.ESRCH:
+          raise
+
+  def supervise(self):
+    """Wait for all the instances to end.
+
+    Returns:
+      0 if all instances ended successfully, 1 otherwise
+    """
+    while self._reap(block=True):
+      pass
+    return int(any(self._exit_status.values()))
+
+
+def _parse_args(cmdline):
+  """Parse the launcher's arguments.
+
+  Args:
+    cmdline: list of cmdline arguments
+
+  Returns:
+    tuple (fleet args Namespace, list of servod arguments for all instances)
+  """
+  parser = argparse.ArgumentParser(
+      description='Start a servod instance for every servo on the host. '
+      'Arguments not listed here are passed to every servod instance.')
+  parser.add_argument('--startup-timeout', type=int,
+                      default=DEFAULT_STARTUP_TIMEOUT,
+                      help='seconds to wait for all instances to be active')
+  parser.add_argument('--list', action='store_true', default=False,
+                      help='only list the servos instances would be started '
+                      'for')
+  args, servod_cmdline = parser.parse_known_args(cmdline)
+  for arg in servod_cmdline:
+    if arg.split('=')[0] in PER_INSTANCE_FLAGS:
+      parser.error('%s is set per instance by the launcher' % arg)
+  return (args, servod_cmdline)
+
+
+def real_main(cmdline):
+  """Discover the servos, start their servod instances & supervise them."""
+  args, servod_cmdline = _parse_args(cmdline)
+  logging.basicConfig(level=logging.INFO,
+                      format='%(asctime)s - %(name)s - %(levelname)s - '
+                      '%(message)s')
+  # Run 'lsusb' once so that servo micros are configured and show up in sysfs.
+  with open(os.devnull, 'w') as devnull:
+    subprocess.call(['lsusb'], stdout=devnull)
+  servos = discover_servos()
+  if args.list:
+    for servo in servos:
+      print('vid: 0x%04x pid: 0x%04x sid: %s' % (servo.vid, servo.pid,
+                                                 servo.serial))
+    return
+  if not servos:
+    logging.error('No servos found')
+    sys.exit(1)
+  missing = [servo.path for servo in servos if not servo.serial]
+  if missing:
+    raise FleetError('Servos without a serial number cannot be told apart: '
+                     '%s' % ', '.join(missing))
+  launcher = FleetLauncher(servod_cmdline)
+  launcher.launch(servos)
+  active = launcher.wait_active(args.startup_timeout)
+  logging.info('%d of %d servod instances active', len(active), len(servos))
+  sys.exit(launcher.supervise())
+
+
+# pylint: disable=dangerous-default-value
+# Ability to pass an arbitrary or artifical cmdline for testing is desirable.
+def main(cmdline=sys.argv[1:]):
+  try:
+    real_main(cmdline)
+  except FleetError as e:
+    print('Error: ', e)
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,71 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Unit-tests for the discovery of the servos to start servod instances for."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import servod_fleet
+from utils.usb_hierarchy import Hierarchy
+
+SERVO_V4 = (0x18d1, 0x501b)
+SERVO_MICRO = (0x18d1, 0x501a)
+CCD_CR50 = (0x18d1, 0x5014)
+
+
+class TestDiscoverServos(unittest.TestCase):
+  """Test servod_fleet.discover_servos() on a mocked usb sysfs."""
+
+  def setUp(self):
+    """Mock /sys/bus/usb/devices with an empty temp directory."""
+    unittest.TestCase.setUp(self)
+    self._usb_dir = tempfile.mkdtemp()
+    Hierarchy.MockUsbSysfsPathForTest(self._usb_dir)
+    self._devnum = 1
+
+  def tearDown(self):
+    """Remove /sys/bus/usb/devices mocking & destroy temp directory."""
+    shutil.rmtree(self._usb_dir)
+    Hierarchy.RestoreDefaultUsbSysfsPathForTest()
+    unittest.TestCase.tearDown(self)
+
+  def _AddServo(self, port_path, vid_pid, serial):
+    """Add a fake sysfs entry for a servo at |port_path| on root hub 1."""
+    dev_dir = os.path.join(self._usb_dir, '1-%s' % port_path)
+    os.mkdir(dev_dir)
+    self._devnum += 1
+    for attr_file, content in [(Hierarchy.DEV_FILE, '%d' % self._devnum),
+                               (Hierarchy.BUS_FILE, '1'),
+                               (Hierarchy.VID_FILE, '%04x' % vid_pid[0]),
+                               (Hierarchy.PID_FILE, '%04x' % vid_pid[1]),
+                               (Hierarchy.SERIAL_FILE, serial)]:
+      with open(os.path.join(dev_dir, attr_file), 'w') as f:
+        f.write(content)
+
+  def _Serials(self):
+    return [servo.serial for servo in servod_fleet.discover_servos()]
+
+  def test_NoServos(self):
+    """No servos, no instances."""
+    self.assertEqual([], self._Serials())
+
+  def test_SecondaryServosBehindV4(self):
+    """Servo micros & CCD behind a servo v4 are served by its instance."""
+    self._AddServo('2.1', SERVO_V4, 'v4-a')
+    self._AddServo('2.2', SERVO_MICRO, 'micro-a')
+    self._AddServo('2.3.1', CCD_CR50, 'ccd-a')
+    self._AddServo('3.1', SERVO_V4, 'v4-b')
+    self.assertEqual(['v4-a', 'v4-b'], self._Serials())
+
+  def test_StandaloneSecondaryServo(self):
+    """A servo micro not hanging on a servo v4 gets its own instance."""
+    self._AddServo('2.1', SERVO_V4, 'v4-a')
+    self._AddServo('4', SERVO_MICRO, 'micro-b')
+    self.assertEqual(['v4-a', 'micro-b'], self._Serials())
+
+
+if __name__ == '__main__':
+  unittest.main()
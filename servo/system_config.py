@@ -3,10 +3,19 @@
 # found in the LICENSE file.
 """System configuration module."""
 import collections
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
 import glob
+import hashlib
 import logging
 import os
 import re
+import stat
+import tempfile
 import xml.etree.ElementTree
 
 # valid tags in system config xml.  Any others will be ignored
@@ -15,6 +24,13 @@ CONTROL_TAG = 'control'
 SYSCFG_TAG_LIST = [MAP_TAG, CONTROL_TAG]
 ALLOWABLE_INPUT_TYPES = {'float': float, 'int': int, 'str': str}
 
+# Directory to store compiled system configs in. The cache is off unless the
+# environment variable is set. Compiled configs are pickles, so they are only
+# loaded from a directory & files owned by the user and writable by no one else.
+CACHE_DIR_ENV = 'SERVOD_SYSCFG_CACHE_DIR'
+# Bump whenever the layout of compiled configs changes.
+CACHE_VERSION = 1
+
 
 # pylint: disable=g-bad-exception-name
 # TODO(coconutruben): figure out if it's worth it to rename this so that it
@@ -94,10 +110,20 @@ class SystemConfig(object):
   Private Attributes:
     _loaded_xml_files: set of filenames already loaded to avoid sourcing XML
       multiple times.
+    _cache_dir: directory holding compiled configs, or None if disabled.
+    _state_key: digest identifying the files, contents and arguments that
+      produced the current state. See add_cfg_file() for details.
+    _read_files: list of files parsed by the ongoing add_cfg_file() call.
   """
 
-  def __init__(self):
-    """SystemConfig constructor."""
+  def __init__(self, cache_dir=None):
+    """SystemConfig constructor.
+
+    Args:
+      cache_dir: directory to store compiled configs in. Defaults to
+        $SERVOD_SYSCFG_CACHE_DIR. None or an empty string, when that is not
+        set either, disables the cache.
+    """
     self._logger = logging.getLogger('SystemConfig')
     self._logger.debug('')
     self.control_tags = collections.defaultdict(list)
@@ -106,6 +132,11 @@ class SystemConfig(object):
     self.hwinit = []
     self._loaded_xml_files = []
     self._board_cfg = None
+    if cache_dir is None:
+      cache_dir = os.environ.get(CACHE_DIR_ENV)
+    self._cache_dir = cache_dir or None
+    self._state_key = str(CACHE_VERSION)
+    self._read_files = []
 
   def find_cfg_file(self, filename):
     """Find the filename for a system XML config file.
@@ -177,8 +208,13 @@ class SystemConfig(object):
     Special key parameters in config files:
       clobber_ok: signifies this control may _clobber_ an existing definition
         of the same name.  Note, its value is ignored ( clobber_ok='' )
-
-    NOTE, method is recursive when parsing 'include' elements from XML.
+      init_independent: signifies this control's init does not depend on, nor
+        affect, the init of controls on other interfaces, so servod may
+        initialize it concurrently with those.  Note, its value is ignored
+        ( init_independent='' )
+      resets_expanders: signifies setting this control may reset i2c gpio
+        expanders, so that servod forgets the register values it last wrote to
+        them.  Note, its value is ignored ( resets_expanders='' )
 
     The arguments name_prefix and interface_increment are used to support
     multiple servo micros. The interfaces of the extra servo micros, like
@@ -186,6 +222,154 @@ class SystemConfig(object):
     extra servo micros should be shifted their interface numbers. Adding
     the name prefix avoid conflict with the main servo micro.
 
+    Args:
+      filename: string of path to system file ( xml )
+      name_prefix: string to prepend to all control names
+      interface_increment: number to add to all interfaces
+
+    Compiled results are cached, so that the XML is only parsed again if a
+    file it depends on changed. See _load_compiled() for details.
+
+    Raises:
+      SystemConfigError: for schema violations, or file not found.
+    """
+    cfgname = self.find_cfg_file(filename)
+    if not cfgname:
+      msg = 'Unable to find system file %s' % filename
+      self._logger.error(msg)
+      raise SystemConfigError(msg)
+    if (cfgname, name_prefix, interface_increment) in self._loaded_xml_files:
+      self._logger.warn('Already sourced system file (%s, %s, %d).', cfgname,
+                        name_prefix, interface_increment)
+      return
+    # The result depends on the state the file is added to. hwinit is
+    # included explicitly as servo_postinit restores it between files.
+    lookup_key = hashlib.sha1(repr((self._state_key, self.hwinit, cfgname,
+                                    name_prefix,
+                                    interface_increment)).encode()).hexdigest()
+    files = self._load_compiled(lookup_key)
+    if files is None:
+      self._read_files = []
+      self._add_cfg_file(cfgname, name_prefix, interface_increment)
+      files = self._file_signatures(self._read_files)
+      self._store_compiled(lookup_key, files)
+    digests = sorted((path, digest) for path, (_, digest) in files.items())
+    self._state_key = hashlib.sha1(
+        repr((lookup_key, digests)).encode()).hexdigest()
+
+  @staticmethod
+  def _file_signatures(paths):
+    """Helper to compute the signature of each file in |paths|.
+
+    Args:
+      paths: list of file paths
+
+    Returns:
+      dict of path to (mtime, sha1 hexdigest of its content)
+    """
+    signatures = {}
+    for path in paths:
+      with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+      signatures[path] = (os.path.getmtime(path), digest)
+    return signatures
+
+  def _cache_path(self, lookup_key):
+    """Helper to get the path of the compiled config for |lookup_key|."""
+    return os.path.join(self._cache_dir, '%s.pickle' % lookup_key)
+
+  @staticmethod
+  def _is_trusted(path):
+    """Helper to check that |path| is safe to unpickle from.
+
+    Args:
+      path: path of the cache directory or of a compiled config
+
+    Returns:
+      True if |path| is not a symlink, is owned by the current user and is not
+      writable by group or others. False otherwise.
+    """
+    st = os.lstat(path)
+    return (not stat.S_ISLNK(st.st_mode) and st.st_uid == os.getuid() and
+            not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+  def _load_compiled(self, lookup_key):
+    """Load the compiled config for |lookup_key| if it is still valid.
+
+    A compiled config is valid if every file it was compiled from still has the
+    same mtime, or else the same content hash. Compiled configs that someone
+    else could have written are ignored, see _is_trusted().
+
+    Args:
+      lookup_key: digest of the starting state and add_cfg_file() arguments
+
+    Returns:
+      dict of file signatures, see _file_signatures(), if the compiled config
+      was loaded. None otherwise.
+    """
+    if not self._cache_dir:
+      return None
+    # pylint: disable=broad-except
+    # A broken cache only costs the time to parse the XML again.
+    try:
+      cache_path = self._cache_path(lookup_key)
+      if not (self._is_trusted(self._cache_dir) and
+              self._is_trusted(cache_path)):
+        self._logger.warn('Ignoring compiled config %s: it or its directory is '
+                          'not owned by the user or is writable by others.',
+                          cache_path)
+        return None
+      with open(cache_path, 'rb') as f:
+        (files, state) = pickle.load(f)
+      for path, (mtime, digest) in files.items():
+        if os.path.getmtime(path) == mtime:
+          continue
+        if self._file_signatures([path])[path][1] != digest:
+          self._logger.debug('Compiled config stale, %s changed.', path)
+          return None
+    except Exception as e:
+      self._logger.debug('No compiled config %s: %s', lookup_key, e)
+      return None
+    (self.syscfg_dict, self.hwinit, self.aliases,
+     self._loaded_xml_files) = state
+    self._logger.debug('Loaded compiled config %s', lookup_key)
+    return files
+
+  def _store_compiled(self, lookup_key, files):
+    """Store the current state as the compiled config for |lookup_key|.
+
+    Args:
+      lookup_key: digest of the starting state and add_cfg_file() arguments
+      files: dict of file signatures the state was compiled from
+    """
+    if not self._cache_dir:
+      return
+    state = (self.syscfg_dict, self.hwinit, self.aliases,
+             self._loaded_xml_files)
+    # pylint: disable=broad-except
+    try:
+      if not os.path.isdir(self._cache_dir):
+        os.makedirs(self._cache_dir, 0o700)
+      # Write to a temporary file first, so that concurrent servod instances
+      # never load a partially written config.
+      fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir)
+      with os.fdopen(fd, 'wb') as f:
+        pickle.dump((files, state), f, pickle.HIGHEST_PROTOCOL)
+      os.rename(tmp_path, self._cache_path(lookup_key))
+    except Exception as e:
+      self._logger.debug('Failed to store compiled config %s: %s', lookup_key,
+                         e)
+
+  @staticmethod
+  def _element_str(element):
+    """Helper to dump |element| for error messages."""
+    return xml.etree.ElementTree.tostring(element)
+
+  def _add_cfg_file(self, filename, name_prefix, interface_increment):
+    """Parse system config file |filename| into the system config object.
+
+    NOTE, method is recursive when parsing 'include' elements from XML.
+
     Args:
       filename: string of path to system file ( xml )
       name_prefix: string to prepend to all control names
@@ -209,13 +393,13 @@ class SystemConfig(object):
 
     self._logger.info('Loading XML config (%s, %s, %d)', filename, name_prefix,
                       interface_increment)
+    self._read_files.append(filename)
     root = xml.etree.ElementTree.parse(filename).getroot()
     for element in root.findall('include'):
-      self.add_cfg_file(
+      self._add_cfg_file(
           element.find('name').text, name_prefix, interface_increment)
     for tag in SYSCFG_TAG_LIST:
       for element in root.findall(tag):
-        element_str = xml.etree.ElementTree.tostring(element)
         try:
           name = element.find('name').text
           if tag == CONTROL_TAG and name_prefix:
@@ -224,8 +408,8 @@ class SystemConfig(object):
           # TODO(tbroch) would rather have lineno but dumping element seems
           # better than nothing.  Utimately a DTD/XSD for the XML schema will
           # catch these anyways.
-          raise SystemConfigError('%s: no name ... see XML\n%s' % (tag,
-                                                                   element_str))
+          raise SystemConfigError('%s: no name ... see XML\n%s' % (
+              tag, self._element_str(element)))
         try:
           doc = ' '.join(element.find('doc').text.split())
         except AttributeError:
@@ -267,29 +451,30 @@ class SystemConfig(object):
           for params in params_list:
             if 'cmd' not in params.attrib:
               raise SystemConfigError('%s %s multiple params but no cmd\n%s' %
-                                      (tag, name, element_str))
+                                      (tag, name, self._element_str(element)))
             cmd = params.attrib['cmd']
             if cmd == 'get':
               if get_dict:
                 raise SystemConfigError(
-                    '%s %s multiple get params defined\n%s' % (tag, name,
-                                                               element_str))
+                    '%s %s multiple get params defined\n%s' %
+                    (tag, name, self._element_str(element)))
               get_dict = params.attrib
             elif cmd == 'set':
               if set_dict:
                 raise SystemConfigError(
-                    '%s %s multiple set params defined\n%s' % (tag, name,
-                                                               element_str))
+                    '%s %s multiple set params defined\n%s' %
+                    (tag, name, self._element_str(element)))
               set_dict = params.attrib
             else:
               raise SystemConfigError("%s %s cmd of 'get'|'set' not found\n%s" %
-                                      (tag, name, element_str))
+                                      (tag, name, self._element_str(element)))
         elif len(params_list) == 1:
           get_dict = params_list[0].attrib
           set_dict = get_dict
         else:
           raise SystemConfigError('%s %s has illegal number of params %d\n%s' %
-                                  (tag, name, len(params_list), element_str))
+                                  (tag, name, len(params_list),
+                                   self._element_str(element)))
 
         # Save the control name to the params dicts, such that the driver can
         # refer to it.
@@ -301,8 +486,8 @@ class SystemConfig(object):
         if (tag == CONTROL_TAG and name in self.syscfg_dict[tag] and
             not clobber_ok):
           raise SystemConfigError(
-              "Duplicate %s %s without 'clobber_ok' key\n%s" % (tag, name,
-                                                                element_str))
+              "Duplicate %s %s without 'clobber_ok' key\n%s" %
+              (tag, name, self._element_str(element)))
 
         if tag == MAP_TAG:
           self.syscfg_dict[tag][name] = {'doc': doc, 'map_params': get_dict}
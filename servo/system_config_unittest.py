@@ -4,6 +4,10 @@
 
 """Unit tests for SystemConfig."""
 
+import os
+import shutil
+import stat
+import tempfile
 import unittest
 
 import system_config
@@ -214,5 +218,102 @@ class TestSystemConfig(unittest.TestCase):
     assert not found_tagged_controls
 
 
+class TestSystemConfigCache(unittest.TestCase):
+  """Unittests for the compiled system config cache."""
+
+  BASE_XML = """<root>
+  <include><name>%s</name></include>
+  <control>
+    <name>ctrl</name>
+    <alias>ctrl_alias</alias>
+    <params interface="1" drv="na" init="1"></params>
+  </control>
+</root>"""
+
+  INCLUDED_XML = """<root>
+  <control>
+    <name>%s</name>
+    <params interface="2" drv="na"></params>
+  </control>
+</root>"""
+
+  def setUp(self):
+    """Create XML files and a cache directory."""
+    super(TestSystemConfigCache, self).setUp()
+    self.tempdir = tempfile.mkdtemp()
+    self.cache_dir = os.path.join(self.tempdir, 'cache')
+    self.included = self._WriteFile('included.xml',
+                                    self.INCLUDED_XML % 'included_ctrl')
+    self.base = self._WriteFile('base.xml', self.BASE_XML % self.included)
+
+  def tearDown(self):
+    """Delete the XML files and cache."""
+    shutil.rmtree(self.tempdir)
+    super(TestSystemConfigCache, self).tearDown()
+
+  def _WriteFile(self, name, content):
+    """Helper to write |content| to |name| in the temporary directory."""
+    path = os.path.join(self.tempdir, name)
+    with open(path, 'w') as f:
+      f.write(content)
+    return path
+
+  def _Load(self, cache_dir=None):
+    """Helper to load the base file with prefix & increment into a config."""
+    if cache_dir is None:
+      cache_dir = self.cache_dir
+    syscfg = system_config.SystemConfig(cache_dir=cache_dir)
+    syscfg.add_cfg_file(self.base, 'pre_', 10)
+    return syscfg
+
+  def test_CachedConfigMatchesParsed(self):
+    """A config loaded from the cache equals the parsed one."""
+    parsed = self._Load()
+    self.assertEqual(1, len(os.listdir(self.cache_dir)))
+    cached = self._Load()
+    self.assertEqual(parsed.syscfg_dict, cached.syscfg_dict)
+    self.assertEqual(parsed.hwinit, cached.hwinit)
+    self.assertEqual(parsed.aliases, cached.aliases)
+    self.assertEqual(parsed._loaded_xml_files, cached._loaded_xml_files)
+    controls = cached.syscfg_dict[system_config.CONTROL_TAG]
+    self.assertEqual(12, controls['pre_included_ctrl']['get_params']
+                     ['interface'])
+    self.assertIs(controls['pre_ctrl'], controls['pre_ctrl_alias'])
+
+  def test_ChangedIncludeInvalidatesCache(self):
+    """Changing an included file leads to parsing the XML again."""
+    self._Load()
+    self._WriteFile('included.xml', self.INCLUDED_XML % 'new_ctrl')
+    # Ensure the mtime differs even on filesystems with coarse timestamps.
+    os.utime(self.included, (0, 0))
+    syscfg = self._Load()
+    self.assertIn('pre_new_ctrl', syscfg.syscfg_dict[system_config.CONTROL_TAG])
+
+  def test_CacheDisabled(self):
+    """An empty cache directory disables the cache."""
+    self._Load(cache_dir='')
+    self.assertFalse(os.path.exists(self.cache_dir))
+
+  def test_CacheOffByDefault(self):
+    """Without $SERVOD_SYSCFG_CACHE_DIR, nothing is cached."""
+    env = os.environ.pop(system_config.CACHE_DIR_ENV, None)
+    try:
+      syscfg = system_config.SystemConfig()
+    finally:
+      if env is not None:
+        os.environ[system_config.CACHE_DIR_ENV] = env
+    self.assertIsNone(syscfg._cache_dir)
+
+  def test_WritableByOthersNotLoaded(self):
+    """A compiled config writable by others is parsed again & replaced."""
+    self._Load()
+    (name,) = os.listdir(self.cache_dir)
+    path = os.path.join(self.cache_dir, name)
+    os.chmod(path, 0o666)
+    cached = self._Load()
+    self.assertIn('pre_ctrl', cached.syscfg_dict[system_config.CONTROL_TAG])
+    self.assertFalse(os.stat(path).st_mode & stat.S_IWOTH)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -5,12 +5,13 @@
 
 from __future__ import print_function
 
+import errno
 import logging
 import os
-import re
 import signal
-import subprocess
-import time
+
+# Whether CheckForPIDNamespace() already succeeded once.
+_pid_namespace_ok = False
 
 
 def CheckForPIDNamespace():
@@ -19,11 +20,89 @@ def CheckForPIDNamespace():
   Raises:
     OSError if we are running within the chroot with PID namespaces.
   """
+  global _pid_namespace_ok
+  if _pid_namespace_ok:
+    # The namespace of a running process does not change.
+    return
   with open('/proc/1/cmdline') as f:
     if 'cros_sdk' in f.readline():
       raise OSError('You must run this tool in a chroot that was entered'
                     ' with "cros_sdk --no-ns-pid" (see crbug.com/444931 for'
                     ' details)')
+  _pid_namespace_ok = True
+
+
+def _ReadStat(pid):
+  """Return the fields of /proc/<pid>/stat after the command name, or []."""
+  try:
+    with open('/proc/%d/stat' % pid) as f:
+      stat = f.read()
+  except IOError:
+    return []
+  # The command name in parenthesis can contain spaces. The fields after it
+  # are: state, ppid, ...
+  return stat[stat.rfind(')') + 2:].split()
+
+
+def _ReadParentPid(pid):
+  """Return the parent pid of |pid| from /proc/<pid>/stat, or None."""
+  fields = _ReadStat(pid)
+  return int(fields[1]) if len(fields) > 1 else None
+
+
+def _IsServod(pid):
+  """Whether |pid| is a servod process (or gone)."""
+  try:
+    with open('/proc/%d/cmdline' % pid) as f:
+      return 'servod' in f.read()
+  except IOError:
+    return True
+
+
+def FindTTYHolders(tty):
+  """Scan /proc for the processes other than servod holding |tty| open.
+
+  Processes of other users are not visible unless running as root. lsof had
+  the same limitation.
+
+  Args:
+    tty: path to the TTY
+
+  Returns:
+    list of (pid, ppid) tuples of the processes with an fd open on |tty|. ppid
+    is None if the parent is not to be frozen.
+  """
+  tty = os.path.realpath(tty)
+  own_pid = os.getpid()
+  holders = []
+  for entry in os.listdir('/proc'):
+    if not entry.isdigit():
+      continue
+    pid = int(entry)
+    if pid == own_pid:
+      continue
+    fd_dir = '/proc/%d/fd' % pid
+    try:
+      fds = os.listdir(fd_dir)
+    except OSError:
+      # Process gone, or not ours to look at.
+      continue
+    for fd in fds:
+      try:
+        if os.readlink(os.path.join(fd_dir, fd)) == tty:
+          break
+      except OSError:
+        continue
+    else:
+      continue
+    if _IsServod(pid):
+      continue
+    ppid = _ReadParentPid(pid)
+    if ppid is not None and (ppid <= 1 or ppid == own_pid or _IsServod(ppid)):
+      # Never freeze init or servod.
+      ppid = None
+    holders.append((pid, ppid))
+  return holders
 
 
 class TerminalFreezer(object):
@@ -32,46 +111,53 @@ class TerminalFreezer(object):
   def __init__(self, tty):
     self._tty = tty
     self._logger = logging.getLogger('Terminal Freezer (%s)' % self._tty)
-    self._processes = None
+    self._processes = []
     CheckForPIDNamespace()
 
-  def __enter__(self):
-    ret = ''
-    try:
-      ret = subprocess.check_output(['lsof', '-FR', self._tty],
-                                    stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError:
-      # Ignore non-zero return codes.
-      pass
-
-    self._processes = re.findall(r'^(?:R|p)(\d+)$', ret, re.MULTILINE)
+  def _Signal(self, pid, sig):
+    """Send |sig| to |pid|.
 
-    # Don't kill servod, we need that.
-    servod_processes = []
-    for p in self._processes:
-      with open('/proc/%s/cmdline' % p) as f:
-        if 'servod' in f.readline():
-          servod_processes.append(p)
+    Returns:
+      False if |pid| no longer exists, True otherwise
 
-    self._logger.debug('servod processes: %r', servod_processes)
-    for p in servod_processes:
-      self._processes.remove(p)
+    Raises:
+      OSError: if sending the signal failed for another reason
+    """
+    try:
+      os.kill(pid, sig)
+    except OSError as e:
+      if e.errno != errno.ESRCH:
+        raise
+      return False
+    return True
 
+  def __enter__(self):
+    # Scan on every freeze: a process opening the TTY at any time must be
+    # frozen before servod uses it.
+    holders = FindTTYHolders(self._tty)
+    if not holders:
+      # Nobody else reads the TTY: nothing to freeze.
+      return
+    self._logger.debug('processes holding the tty (pid, ppid): %r', holders)
     # SIGSTOP parents before children.
     try:
-      for p in reversed(self._processes):
-        self._logger.debug('Sending SIGSTOP to process %s!', p)
-        time.sleep(0.02)
-        os.kill(int(p), signal.SIGSTOP)
+      for pid, ppid in holders:
+        for p in (ppid, pid):
+          if p is None or p in self._processes:
+            continue
+          self._logger.debug('Sending SIGSTOP to process %d!', p)
+          if self._Signal(p, signal.SIGSTOP):
+            self._processes.append(p)
     except OSError:
       self.__exit__(None, None, None)
       raise
 
   def __exit__(self, _t, _v, _b):
     # ...and wake 'em up again in reverse order.
-    for p in self._processes:
-      self._logger.debug('Sending SIGCONT to process %s!', p)
+    for p in reversed(self._processes):
+      self._logger.debug('Sending SIGCONT to process %d!', p)
       try:
-        os.kill(int(p), signal.SIGCONT)
+        self._Signal(p, signal.SIGCONT)
       except OSError as e:
-        self._logger.error('Error when trying to unfreeze process %s: %s', p, e)
+        self._logger.error('Error when trying to unfreeze process %d: %s', p, e)
+    self._processes = []
@@ -0,0 +1,108 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Unit tests for terminal_freezer."""
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+import terminal_freezer
+
+
+class TestTerminalFreezer(unittest.TestCase):
+
+  def setUp(self):
+    """Open a pty, which the test processes hold open."""
+    unittest.TestCase.setUp(self)
+    self.master, self.slave = os.openpty()
+    self.tty = os.ttyname(self.slave)
+    self.procs = []
+
+  def tearDown(self):
+    """Kill the processes holding the pty, and close it."""
+    for proc in self.procs:
+      if proc.poll() is None:
+        proc.kill()
+        proc.wait()
+    os.close(self.master)
+    os.close(self.slave)
+    unittest.TestCase.tearDown(self)
+
+  def _Hold(self, *argv):
+    """Start a process running |argv| with the pty as its stdin."""
+    argv = argv or ('sleep', '30')
+    proc = subprocess.Popen(argv, stdin=self.slave)
+    self.procs.append(proc)
+    # Wait for the process to exec, so that it holds the pty as |argv|.
+    cmdline = '\0'.join(argv) + '\0'
+    for _ in range(100):
+      with open('/proc/%d/cmdline' % proc.pid) as f:
+        if f.read() == cmdline:
+          break
+      time.sleep(0.01)
+    return proc
+
+  @staticmethod
+  def _State(pid):
+    """Return the state letter of |pid| from /proc/<pid>/stat."""
+    # pylint: disable=protected-access
+    return terminal_freezer._ReadStat(pid)[0]
+
+  def test_FindNoHolders(self):
+    """A pty held only by this process has no holders to freeze."""
+    self.assertEqual([], terminal_freezer.FindTTYHolders(self.tty))
+
+  def test_FindHolder(self):
+    """Processes holding the pty are found, but not this parent of theirs."""
+    proc = self._Hold()
+    # This process is the parent, and is never frozen.
+    self.assertEqual([(proc.pid, None)],
+                     terminal_freezer.FindTTYHolders(self.tty))
+
+  def test_FindSkipsServod(self):
+    """servod processes holding the pty are not found."""
+    self._Hold(sys.executable, '-c', 'import time; time.sleep(30)', 'servod')
+    self.assertEqual([], terminal_freezer.FindTTYHolders(self.tty))
+
+  def test_FreezeHolder(self):
+    """Holders are stopped inside the freezer, and continued after it."""
+    proc = self._Hold()
+    with terminal_freezer.TerminalFreezer(self.tty):
+      self.assertEqual('T', self._State(proc.pid))
+    self.assertNotEqual('T', self._State(proc.pid))
+
+  def test_FreezeNewHolder(self):
+    """A process opening the pty right after a freeze is frozen next time."""
+    with terminal_freezer.TerminalFreezer(self.tty):
+      pass
+    proc = self._Hold()
+    with terminal_freezer.TerminalFreezer(self.tty):
+      self.assertEqual('T', self._State(proc.pid))
+
+  def test_FreezeExitedHolder(self):
+    """A holder exiting before it is stopped does not fail the freeze."""
+    proc = self._Hold()
+    freezer = terminal_freezer.TerminalFreezer(self.tty)
+    find = terminal_freezer.FindTTYHolders
+
+    def find_then_exit(tty):
+      """Find the holders, then let the holder exit."""
+      holders = find(tty)
+      proc.kill()
+      proc.wait()
+      return holders
+
+    terminal_freezer.FindTTYHolders = find_then_exit
+    try:
+      with freezer:
+        pass
+    finally:
+      terminal_freezer.FindTTYHolders = find
+
+
+if __name__ == '__main__':
+  unittest.main()
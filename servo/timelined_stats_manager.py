@@ -5,7 +5,7 @@
 """Calculates statistics for lists of data and pretty print them."""
 
 from __future__ import print_function
-import copy
+import collections
 import time
 
 import numpy
@@ -22,11 +22,25 @@ class TimelinedStatsManager(stats_manager.StatsManager):
 
   When calculating stats a timeline is also generated that starts at t=0
 
+  Samples are stored in one float64 array, a column per domain, sharing the
+  timestamp column. The array is preallocated and filled with NaN, so that
+  domains missing from a sample, or new domains, need no explicit padding.
+  Rows and columns double in size whenever they run out.
+
   Attributes:
     _tkey: key used for the timestamps column
     _tlkey: key used for the timeline column
+    _store: 2D numpy array of samples, rows past |_count| are unused
+    _count: number of rows recorded
+    _columns: dict of domain to its column index in |_store|
+    _lists: |_data| as lists, built on first access since the last change
+    _row: dict StatsManager.AddSample() records into while AddSamples() runs
   """
 
+  # Initial number of rows & columns to allocate.
+  INITIAL_ROWS = 1024
+  INITIAL_COLUMNS = 8
+
   # pylint: disable=W0102
   def __init__(self, title='', smid='', hide_domains=[], order=[],
                time_key=TIME_KEY, timeline_key=TLINE_KEY):
@@ -45,6 +59,8 @@ class TimelinedStatsManager(stats_manager.StatsManager):
     """
     self._tkey = time_key
     self._tlkey = timeline_key
+    self._row = None
+    self._reset_store()
     super(TimelinedStatsManager, self).__init__(title=title,
                                                 smid=smid,
                                                 hide_domains=hide_domains,
@@ -53,13 +69,58 @@ class TimelinedStatsManager(stats_manager.StatsManager):
     self._hide_domains.append(self._tkey)
     self._hide_domains.append(self._tlkey)
 
+  def _reset_store(self, rows=INITIAL_ROWS, columns=INITIAL_COLUMNS):
+    """Helper to drop all samples and allocate an empty store."""
+    self._store = numpy.full((rows, columns), numpy.nan)
+    self._count = 0
+    self._columns = {}
+    self._lists = None
+
+  @property
+  def _data(self):
+    """Dict of domain to the list of its samples.
+
+    While AddSamples() runs, this is the row StatsManager.AddSample() records
+    the samples into instead.
+    """
+    if self._row is not None:
+      return self._row
+    if self._lists is None:
+      self._lists = dict((domain, self._store[:self._count, col].tolist())
+                         for domain, col in self._columns.items())
+    return self._lists
+
+  @_data.setter
+  def _data(self, data):
+    """Replace all samples with |data|, a dict of domain to equal length lists.
+
+    StatsManager initializes |_data| with an empty dict, which ends up here.
+    """
+    rows = max([len(samples) for samples in data.values()] + [0])
+    self._reset_store(max(rows, self.INITIAL_ROWS),
+                      max(len(data), self.INITIAL_COLUMNS))
+    for domain, samples in data.items():
+      self._store[:len(samples), self._column(domain)] = samples
+    self._count = rows
+
+  def _column(self, domain):
+    """Helper to get the column of |domain|, adding it if needed."""
+    if domain not in self._columns:
+      if len(self._columns) == self._store.shape[1]:
+        extra = numpy.full((self._store.shape[0], self._store.shape[1]),
+                           numpy.nan)
+        self._store = numpy.hstack((self._store, extra))
+      self._columns[domain] = len(self._columns)
+    return self._columns[domain]
+
   def CalculateStats(self):
     """Generate relative timeline before calling StatsManager CalculateStats."""
-    if self._tkey in self._data:
+    if self._tkey in self._columns:
       # |tkey| might have been removed during trimming.
-      timeline = self._data[self._tkey]
-      timeline = [entry - timeline[0] for entry in timeline]
-      self._data[self._tlkey] = timeline
+      timeline = self._store[:self._count, self._columns[self._tkey]]
+      self._store[:self._count, self._column(self._tlkey)] = (timeline -
+                                                              timeline[0])
+      self._lists = None
     super(TimelinedStatsManager, self).CalculateStats()
 
   def AddSample(self, domain, sample):
@@ -79,30 +140,35 @@ class TimelinedStatsManager(stats_manager.StatsManager):
     Record each (domain, sample) pair and the timestamp when the
     pairs were recorded.
 
-    To avoid timeline discrepancies, this method ensures that each domain in
-    |_data| is of equal size. This is accomplished by adding NaN values
-    whenever there is no data-point for a domain at a given timestamp.
+    To avoid timeline discrepancies, each domain has a value for every
+    timestamp. Domains without a data-point at a given timestamp are recorded
+    as NaN.
+
+    Each sample goes through StatsManager.AddSample(), which converts it and
+    keeps track of the domain's unit.
 
     Args:
       samples: a list of (domain, sample) tuples
     """
-    samples.append((self._tkey, time.time()))
-    domains_so_far = set(self._data.keys())
-    domains_incoming = set([entry[0] for entry in samples])
-    if len(domains_incoming) != len(samples):
+    samples = samples + [(self._tkey, time.time())]
+    if len(set(domain for domain, _ in samples)) != len(samples):
       raise stats_manager.StatsManagerError('Domain appears multiple times.')
-    # Add a NaN for each previous time-stamp for new domains
-    new_domains = domains_incoming - domains_so_far
-    nan_col = [float('NaN')] * len(self._data[self._tkey])
-    for domain in new_domains:
-      self._data[domain] = copy.copy(nan_col)
-    # Add a NaN for each known domain that has no sample in |samples|
-    known_domains_missing = domains_so_far - domains_incoming
-    known_domains_missing_nans = [(domain, float('NaN')) for domain in
-                                  known_domains_missing]
-    samples.extend(known_domains_missing_nans)
-    for domain, sample in samples:
-      super(TimelinedStatsManager, self).AddSample(domain, sample)
+    self._row = collections.defaultdict(list)
+    try:
+      for domain, sample in samples:
+        super(TimelinedStatsManager, self).AddSample(domain, sample)
+      row = self._row
+    finally:
+      self._row = None
+    if self._count == self._store.shape[0]:
+      extra = numpy.full(self._store.shape, numpy.nan)
+      self._store = numpy.vstack((self._store, extra))
+    for domain, (value,) in row.items():
+      # Adding a column might reallocate |_store|, so look it up first.
+      col = self._column(domain)
+      self._store[self._count, col] = value
+    self._count += 1
+    self._lists = None
 
   def TrimSamples(self, tstart=None, tend=None, padding=0):
     """Trim raw data to [tstart + padding, tend + padding].
@@ -117,26 +183,23 @@ class TimelinedStatsManager(stats_manager.StatsManager):
       # Avoid doing any work if there will be no trimming.
       return
 
-    timeline = numpy.array(self._data[self._tkey])
+    timeline = self._store[:self._count, self._columns[self._tkey]]
     if tstart is None:
       tstart = timeline[0]
     tstart += padding
     if tend is None:
       tend = timeline[-1]
     tend += padding
-    # pylint: disable=W0212
-    domains_to_remove = set()
-    for domain, samples in self._data.items():
-      sample_arr = numpy.array(samples)
-      trimmed_samples = sample_arr[numpy.bitwise_and(tstart <= timeline,
-                                                     timeline <= tend)].tolist()
-      if trimmed_samples:
-        self._data[domain] = trimmed_samples
-      else:
+    keep = numpy.logical_and(tstart <= timeline, timeline <= tend)
+    # All domains have the same rows, so either all or none become empty.
+    if not keep.any():
+      for domain in self._columns:
         self._logger.warn('Trimming to start ts: %.2f end ts: %.2f padding: %d'
                           ' has caused domain %r to become empty. Removing it '
                           'from the TimelinedStatsManager.', tstart, tend,
                           padding, domain)
-        domains_to_remove.add(domain)
-    for domain in domains_to_remove:
-      del self._data[domain]
+      self._reset_store()
+      return
+    self._store = self._store[:self._count][keep]
+    self._count = self._store.shape[0]
+    self._lists = None
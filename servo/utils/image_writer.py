@@ -0,0 +1,490 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Utility to stream (compressed) images onto block devices."""
+
+import bz2
+import errno
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import stat
+import struct
+import threading
+import zlib
+
+try:
+  import lzma
+except ImportError:
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+  lzma = None
+
+try:
+  from urllib2 import urlopen
+except ImportError:
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+  from urllib.request import urlopen
+
+# Size of the writes to the device. Large writes keep usb storage busy.
+BLOCK_SIZE = 4 * 1024 * 1024
+# Size of the reads from the image source.
+READ_SIZE = 1024 * 1024
+# Alignment required by O_DIRECT writes. The block size is a multiple of it.
+DIRECT_IO_ALIGNMENT = 4096
+
+# ioctl to zero a range of a block device, from linux/fs.h: _IO(0x12, 127).
+BLKZEROOUT = 0x127f
+
+# Magic bytes at the start of the supported compressed formats.
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+URL_PREFIXES = ('http://', 'https://')
+
+
+class ImageWriterError(Exception):
+  """Error class for image writing errors."""
+
+
+class Progress(object):
+  """Thread-safe progress of an image write.
+
+  The progress is measured on the image source, i.e. on the compressed image,
+  as the size of the decompressed image is not known up front.
+
+  Attributes:
+    state: one of IDLE, WRITING, VERIFYING, DONE, FAILED
+  """
+
+  IDLE = 'idle'
+  WRITING = 'writing'
+  VERIFYING = 'verifying'
+  DONE = 'done'
+  FAILED = 'failed'
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.state = self.IDLE
+    self._done = 0
+    self._total = None
+
+  def Start(self, total):
+    """Start tracking a new write of |total| source bytes (None if unknown)."""
+    with self._lock:
+      self.state = self.WRITING
+      self._done = 0
+      self._total = total
+
+  def Update(self, done):
+    """Record that |done| source bytes were consumed."""
+    with self._lock:
+      self._done = done
+
+  def SetState(self, state):
+    """Move on to |state|."""
+    with self._lock:
+      self.state = state
+
+  def Get(self):
+    """Return a tuple (state, percentage done or None if unknown)."""
+    with self._lock:
+      if self.state in (self.VERIFYING, self.DONE):
+        return (self.state, 100.0)
+      if not self._total:
+        return (self.state, None)
+      return (self.state, min(100.0, 100.0 * self._done / self._total))
+
+  def __str__(self):
+    state, percent = self.Get()
+    if percent is None:
+      return state
+    return '%s %.1f%%' % (state, percent)
+
+
+class _PassThrough(object):
+  """Decompressor for uncompressed images."""
+
+  def decompress(self, data):
+    return data
+
+  def flush(self):
+    return b''
+
+
+class _StreamsDecompressor(object):
+  """Decompress all the concatenated streams of a compressed image.
+
+  Parallel compressors like pigz & pbzip2 write one stream per chunk of the
+  image, while a single decompressor stops at the end of the first stream.
+  A new decompressor is started on the data left after each stream. Zero
+  padding between streams is skipped, as gzip & xz do.
+  """
+
+  def __init__(self, factory):
+    """Constructor.
+
+    Args:
+      factory: callable returning a new decompressor for one stream, with
+        decompress(data) and unused_data, like bz2.BZ2Decompressor
+    """
+    self._factory = factory
+    self._decompressor = factory()
+    # Whether the current decompressor got the start of a stream.
+    self._in_stream = False
+
+  def _NextStream(self):
+    """Start decompressing a new stream."""
+    self._decompressor = self._factory()
+    self._in_stream = False
+
+  def decompress(self, data):
+    chunks = []
+    while data:
+      if not self._in_stream:
+        data = data.lstrip(b'\0')
+        if not data:
+          break
+        self._in_stream = True
+      try:
+        chunks.append(self._decompressor.decompress(data))
+      except EOFError:
+        # TODO(crbug.com/999878): python2's bz2 has no eof attribute and
+        # only tells about the end of a stream when given more data.
+        # Remove once fully moved to python3.
+        self._NextStream()
+        continue
+      data = self._decompressor.unused_data
+      if data or getattr(self._decompressor, 'eof', False):
+        self._NextStream()
+    return b''.join(chunks)
+
+  def flush(self):
+    """Return the remaining output, checking the last stream is complete.
+
+    Raises:
+      ImageWriterError: if the image ends in the middle of a stream
+    """
+    flush = getattr(self._decompressor, 'flush', None)
+    chunk = flush() if flush else b''
+    # TODO(crbug.com/999878): python2's decompressors have no eof attribute,
+    # so truncated streams are only caught on python3.
+    # Remove once fully moved to python3.
+    if self._in_stream and not getattr(self._decompressor, 'eof', True):
+      raise ImageWriterError('Image ends in the middle of a compressed '
+                             'stream.')
+    return chunk
+
+
+def _GzipDecompressor():
+  """Return a decompressor for one gzip stream."""
+  return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _GetDecompressor(head):
+  """Return a streaming decompressor for an image starting with |head|.
+
+  Args:
+    head: first bytes of the image
+
+  Returns:
+    object with decompress(data) & flush() methods, like zlib's
+
+  Raises:
+    ImageWriterError: if the image is compressed in an unsupported way
+  """
+  if head.startswith(GZIP_MAGIC):
+    return _StreamsDecompressor(_GzipDecompressor)
+  if head.startswith(BZIP2_MAGIC):
+    return _StreamsDecompressor(bz2.BZ2Decompressor)
+  if head.startswith(XZ_MAGIC):
+    if lzma is None:
+      raise ImageWriterError('xz images need the lzma module.')
+    return _StreamsDecompressor(lzma.LZMADecompressor)
+  return _PassThrough()
+
+
+def _OpenSource(image_path):
+  """Open |image_path| for streaming.
+
+  Args:
+    image_path: path or http(s) url of the image
+
+  Returns:
+    tuple (file object, size in bytes or None if unknown)
+
+  Raises:
+    IOError: if the image cannot be opened
+  """
+  if image_path.startswith(URL_PREFIXES):
+    source = urlopen(image_path)
+    length = source.info().get('Content-Length')
+    return (source, int(length) if length else None)
+  source = open(image_path, 'rb')
+  return (source, os.fstat(source.fileno()).st_size)
+
+
+class ImageWriter(object):
+  """Write an image onto a device as a stream.
+
+  The image is read, decompressed (gzip, bzip2 or xz, recognized by their
+  magic bytes), written & hashed in one pass, with large aligned writes
+  bypassing the page cache where the device supports O_DIRECT. All-zero blocks
+  are not transferred: they are zeroed with BLKZEROOUT on block devices, or
+  left as holes in regular files. Once written, the device is read back to
+  verify its hash.
+
+  When resuming, the blocks at the start of the device that already hold the
+  image, e.g. from a previous write that got interrupted, are not written
+  again. Each block is read back and compared until the first one that
+  differs, so a fresh write only costs one extra block read.
+  """
+
+  def __init__(self, dev_path, block_size=BLOCK_SIZE, skip_zeros=True,
+               verify=True, progress=None, resume=False):
+    """Constructor.
+
+    Args:
+      dev_path: path of the device (or file) to write the image to
+      block_size: size of the writes, a multiple of DIRECT_IO_ALIGNMENT
+      skip_zeros: whether to skip transferring all-zero blocks
+      verify: whether to read back the image & compare hashes
+      progress: Progress to report to, if any
+      resume: whether to skip the leading blocks the device already holds
+    """
+    if block_size % DIRECT_IO_ALIGNMENT:
+      raise ImageWriterError('block size %d is not a multiple of %d' %
+                             (block_size, DIRECT_IO_ALIGNMENT))
+    self._logger = logging.getLogger(type(self).__name__)
+    self._dev_path = dev_path
+    self._block_size = block_size
+    self._skip_zeros = skip_zeros
+    self._verify = verify
+    self._progress = progress or Progress()
+    self._resume = resume
+    self._zeros = b'\0' * block_size
+
+  def Write(self, image_path):
+    """Write the image at |image_path| to the device.
+
+    Args:
+      image_path: path or http(s) url of the image
+
+    Returns:
+      size in bytes of the (decompressed) image written
+
+    Raises:
+      ImageWriterError: if the image cannot be written or verified
+      IOError, OSError: on errors accessing the image or device
+    """
+    try:
+      size, digest = self._WriteImage(image_path)
+      if self._verify:
+        self._progress.SetState(Progress.VERIFYING)
+        self._VerifyImage(size, digest)
+    except BaseException:
+      self._progress.SetState(Progress.FAILED)
+      raise
+    self._progress.SetState(Progress.DONE)
+    return size
+
+  def _ReadImage(self, source, source_size):
+    """Yield the decompressed contents of |source|, reporting progress."""
+    data = source.read(READ_SIZE)
+    decompressor = _GetDecompressor(data)
+    consumed = 0
+    while data:
+      consumed += len(data)
+      self._progress.Update(consumed)
+      chunk = decompressor.decompress(data)
+      if chunk:
+        yield chunk
+      data = source.read(READ_SIZE)
+    chunk = decompressor.flush()
+    if chunk:
+      yield chunk
+    if source_size is not None and consumed < source_size:
+      raise ImageWriterError('Image source ended after %d of %d bytes.' %
+                             (consumed, source_size))
+
+  def _ReadBlocks(self, source, source_size):
+    """Yield the image in blocks of |_block_size|, the last one shorter."""
+    pending = bytearray()
+    for chunk in self._ReadImage(source, source_size):
+      pending.extend(chunk)
+      while len(pending) >= self._block_size:
+        yield bytes(pending[:self._block_size])
+        del pending[:self._block_size]
+    if pending:
+      yield bytes(pending)
+
+  def _OpenDevice(self):
+    """Open the device for writing, with O_DIRECT if supported.
+
+    Returns:
+      tuple (fd, whether O_DIRECT is in use)
+    """
+    flags = os.O_WRONLY | os.O_CREAT
+    if not self._resume:
+      flags |= os.O_TRUNC
+    direct = getattr(os, 'O_DIRECT', 0)
+    if direct:
+      try:
+        return (os.open(self._dev_path, flags | direct, 0o644), True)
+      except OSError as e:
+        if e.errno != errno.EINVAL:
+          raise
+        self._logger.debug('%s does not support O_DIRECT.', self._dev_path)
+    return (os.open(self._dev_path, flags, 0o644), False)
+
+  def _WriteImage(self, image_path):
+    """Stream the image at |image_path| onto the device.
+
+    Returns:
+      tuple (image size, sha256 hex digest of the image)
+    """
+    source, source_size = _OpenSource(image_path)
+    self._progress.Start(source_size)
+    fd, direct = self._OpenDevice()
+    is_blockdev = stat.S_ISBLK(os.fstat(fd).st_mode)
+    # Page aligned buffer, as needed by O_DIRECT.
+    buf = mmap.mmap(-1, self._block_size)
+    digest = hashlib.sha256()
+    offset = 0
+    # Start & length of the pending run of zero blocks not written yet.
+    zero_start = zero_len = 0
+    # Device read back while the leading blocks it holds match the image.
+    resumed = self._OpenReadBack() if self._resume else None
+    try:
+      for block in self._ReadBlocks(source, source_size):
+        digest.update(block)
+        if resumed:
+          if self._ReadBack(resumed, offset, len(block)) == block:
+            offset += len(block)
+            continue
+          resumed.close()
+          resumed = None
+          self._StopResuming(fd, offset, is_blockdev)
+        full = len(block) == self._block_size
+        if self._skip_zeros and full and block == self._zeros:
+          if not zero_len:
+            zero_start = offset
+          zero_len += len(block)
+          offset += len(block)
+          continue
+        if zero_len:
+          self._SkipZeros(fd, zero_start, zero_len, is_blockdev)
+          zero_len = 0
+        if not full and direct:
+          # The tail cannot be written with O_DIRECT unless it is aligned.
+          fcntl.fcntl(fd, fcntl.F_SETFL,
+                      fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_DIRECT)
+          direct = False
+        buf.seek(0)
+        buf.write(block)
+        self._WriteAll(fd, buf, len(block))
+        offset += len(block)
+      if zero_len:
+        self._SkipZeros(fd, zero_start, zero_len, is_blockdev)
+      if not is_blockdev:
+        # Zero blocks at the end of a regular file are holes up to its end.
+        os.ftruncate(fd, offset)
+    finally:
+      if resumed:
+        resumed.close()
+      buf.close()
+      os.fsync(fd)
+      os.close(fd)
+      source.close()
+    return (offset, digest.hexdigest())
+
+  def _OpenReadBack(self):
+    """Open the device to read back what it holds, bypassing the page cache."""
+    dev = open(self._dev_path, 'rb')
+    if hasattr(os, 'posix_fadvise'):
+      # Read the device, not what is left in the page cache.
+      os.posix_fadvise(dev.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return dev
+
+  @staticmethod
+  def _ReadBack(dev, offset, length):
+    """Read |length| bytes at |offset| of |dev|, fewer at the device's end."""
+    dev.seek(offset)
+    return dev.read(length)
+
+  def _StopResuming(self, fd, offset, is_blockdev):
+    """Write the image from |offset| on, the first block the device lacks.
+
+    Regular files are truncated there, so that skipped zero blocks past it
+    read back as zeros.
+    """
+    self._logger.info('%s already holds the first %d bytes of the image.',
+                      self._dev_path, offset)
+    if not is_blockdev:
+      os.ftruncate(fd, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+
+  @staticmethod
+  def _WriteAll(fd, buf, length):
+    """Write the first |length| bytes of |buf| to |fd|."""
+    written = 0
+    while written < length:
+      try:
+        chunk = memoryview(buf)[written:length]
+      except TypeError:
+        # TODO(crbug.com/999878): python2 mmaps only support buffer(), which
+        # does not copy either. Remove once fully moved to python3.
+        # pylint: disable=undefined-variable
+        chunk = buffer(buf, written, length - written)
+      written += os.write(fd, chunk)
+
+  def _SkipZeros(self, fd, start, length, is_blockdev):
+    """Zero |length| bytes at |start| without transferring them.
+
+    Block devices are zeroed with BLKZEROOUT, or written with zeros if the
+    device does not support it. Regular files were truncated when opened, so
+    skipping the range leaves a hole that reads back as zeros.
+
+    On return, the file offset of |fd| is |start| + |length|.
+    """
+    if is_blockdev:
+      try:
+        fcntl.ioctl(fd, BLKZEROOUT, struct.pack('QQ', start, length))
+      except (IOError, OSError) as e:
+        self._logger.debug('BLKZEROOUT failed: %s. Writing zeros.', e)
+        os.lseek(fd, start, os.SEEK_SET)
+        zeros = mmap.mmap(-1, self._block_size)
+        try:
+          for _ in range(length // self._block_size):
+            self._WriteAll(fd, zeros, self._block_size)
+        finally:
+          zeros.close()
+    os.lseek(fd, start + length, os.SEEK_SET)
+
+  def _VerifyImage(self, size, expected):
+    """Read back |size| bytes of the device and compare their hash.
+
+    Raises:
+      ImageWriterError: if the hash does not match |expected|
+    """
+    digest = hashlib.sha256()
+    with open(self._dev_path, 'rb') as dev:
+      if hasattr(os, 'posix_fadvise'):
+        # Read the device, not what is left in the page cache.
+        os.posix_fadvise(dev.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+      remaining = size
+      while remaining:
+        data = dev.read(min(remaining, self._block_size))
+        if not data:
+          raise ImageWriterError('%s ended after %d of %d bytes.' %
+                                 (self._dev_path, size - remaining, size))
+        digest.update(data)
+        remaining -= len(data)
+    if digest.hexdigest() != expected:
+      raise ImageWriterError('Image on %s does not match the source.' %
+                             self._dev_path)
@@ -0,0 +1,190 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+try:
+  import lzma
+except ImportError:
+  # TODO(crbug.com/999878): This is for python3 compatibility.
+  # Remove once fully moved to python3.
+  lzma = None
+
+from . import image_writer
+
+BLOCK_SIZE = image_writer.DIRECT_IO_ALIGNMENT * 2
+
+
+class TestImageWriter(unittest.TestCase):
+
+  def setUp(self):
+    """Prepare an image with data, zero blocks and a short tail."""
+    super(TestImageWriter, self).setUp()
+    self._tmpdir = tempfile.mkdtemp()
+    self._image = (b'\xaa' * BLOCK_SIZE + b'\0' * BLOCK_SIZE * 3 +
+                   b'\x55' * BLOCK_SIZE + b'tail')
+    self._dev = os.path.join(self._tmpdir, 'dev')
+    self._progress = image_writer.Progress()
+    self._writer = image_writer.ImageWriter(self._dev, block_size=BLOCK_SIZE,
+                                            progress=self._progress)
+
+  def tearDown(self):
+    """Remove the temp directory created during the test."""
+    shutil.rmtree(self._tmpdir)
+    super(TestImageWriter, self).tearDown()
+
+  def _WriteSource(self, name, opener=open):
+    """Write |_image| to |name| in the temp directory through |opener|."""
+    path = os.path.join(self._tmpdir, name)
+    f = opener(path, 'wb')
+    f.write(self._image)
+    f.close()
+    return path
+
+  def _WriteStreams(self, name, compress):
+    """Write |_image| to |name| as two streams compressed by |compress|."""
+    half = len(self._image) // 2
+    path = os.path.join(self._tmpdir, name)
+    with open(path, 'wb') as f:
+      f.write(compress(self._image[:half]))
+      f.write(compress(self._image[half:]))
+    return path
+
+  @staticmethod
+  def _Gzip(data):
+    """Return |data| as one gzip stream."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+  def _ReadDev(self):
+    with open(self._dev, 'rb') as f:
+      return f.read()
+
+  def test_Raw(self):
+    """A raw image is written as is."""
+    size = self._writer.Write(self._WriteSource('image.bin'))
+    self.assertEqual(len(self._image), size)
+    self.assertEqual(self._image, self._ReadDev())
+    self.assertEqual('done 100.0%', str(self._progress))
+
+  def test_Gzip(self):
+    """gzip images are decompressed."""
+    self._writer.Write(self._WriteSource('image.bin.gz', gzip.open))
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_Bzip2(self):
+    """bzip2 images are decompressed."""
+    self._writer.Write(self._WriteSource('image.bin.bz2', bz2.BZ2File))
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_GzipMultiStream(self):
+    """All the streams of a gzip image, as pigz writes, are decompressed."""
+    size = self._writer.Write(self._WriteStreams('image.bin.gz', self._Gzip))
+    self.assertEqual(len(self._image), size)
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_Bzip2MultiStream(self):
+    """All the streams of a bzip2 image, as pbzip2 writes, are decompressed."""
+    size = self._writer.Write(self._WriteStreams('image.bin.bz2',
+                                                 bz2.compress))
+    self.assertEqual(len(self._image), size)
+    self.assertEqual(self._image, self._ReadDev())
+
+  @unittest.skipIf(lzma is None, 'needs the lzma module')
+  def test_Xz(self):
+    """xz images, with several streams, are decompressed."""
+    size = self._writer.Write(self._WriteStreams('image.bin.xz',
+                                                 lzma.compress))
+    self.assertEqual(len(self._image), size)
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_StreamPadding(self):
+    """Zero padding after a stream is skipped."""
+    path = os.path.join(self._tmpdir, 'image.bin.gz')
+    with open(path, 'wb') as f:
+      f.write(self._Gzip(self._image) + b'\0' * 512)
+    self._writer.Write(path)
+    self.assertEqual(self._image, self._ReadDev())
+
+  @unittest.skipIf(not hasattr(zlib.decompressobj(), 'eof'),
+                   'needs decompressors telling the end of their stream')
+  def test_TruncatedStream(self):
+    """An image ending in the middle of a stream fails the write."""
+    path = os.path.join(self._tmpdir, 'image.bin.gz')
+    with open(path, 'wb') as f:
+      f.write(self._Gzip(self._image)[:-16])
+    with self.assertRaises(image_writer.ImageWriterError):
+      self._writer.Write(path)
+    self.assertEqual(image_writer.Progress.FAILED, self._progress.state)
+
+  def test_OverwritesStaleData(self):
+    """Skipped zero blocks do not leave previous data behind."""
+    with open(self._dev, 'wb') as f:
+      f.write(b'\xff' * len(self._image) * 2)
+    self._writer.Write(self._WriteSource('image.bin'))
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_TrailingZeros(self):
+    """Zero blocks at the end of the image are written too."""
+    self._image = b'\xaa' * BLOCK_SIZE + b'\0' * BLOCK_SIZE * 2
+    self._writer.Write(self._WriteSource('image.bin'))
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_VerifyMismatch(self):
+    """Verification fails if the device does not hold the image."""
+    # pylint: disable=protected-access
+    self._writer.Write(self._WriteSource('image.bin'))
+    with self.assertRaises(image_writer.ImageWriterError):
+      self._writer._VerifyImage(len(self._image), 'bogus')
+
+  def test_MissingImage(self):
+    """A missing image fails the write and is reported in the progress."""
+    with self.assertRaises(IOError):
+      self._writer.Write(os.path.join(self._tmpdir, 'missing'))
+    self.assertEqual(image_writer.Progress.FAILED, self._progress.state)
+
+  def test_ResumeSkipsWrittenBlocks(self):
+    """Resuming only writes the blocks from the first one that differs."""
+    source = self._WriteSource('image.bin')
+    with open(self._dev, 'wb') as f:
+      f.write(self._image[:BLOCK_SIZE * 4] + b'\xff' * BLOCK_SIZE * 3)
+    writer = image_writer.ImageWriter(self._dev, block_size=BLOCK_SIZE,
+                                      resume=True)
+    written = []
+    # pylint: disable=protected-access
+    write_all = writer._WriteAll
+
+    def record_write(fd, buf, length):
+      """Record the offset of each write."""
+      written.append(os.lseek(fd, 0, os.SEEK_CUR))
+      write_all(fd, buf, length)
+
+    writer._WriteAll = record_write
+    writer.Write(source)
+    self.assertEqual(self._image, self._ReadDev())
+    self.assertEqual([BLOCK_SIZE * 4, BLOCK_SIZE * 5], written)
+
+  def test_ResumeNothingWritten(self):
+    """Resuming onto a device holding other data writes the whole image."""
+    with open(self._dev, 'wb') as f:
+      f.write(b'\xff' * len(self._image) * 2)
+    writer = image_writer.ImageWriter(self._dev, block_size=BLOCK_SIZE,
+                                      resume=True)
+    writer.Write(self._WriteSource('image.bin'))
+    self.assertEqual(self._image, self._ReadDev())
+
+  def test_BadBlockSize(self):
+    """Block sizes must allow aligned writes."""
+    with self.assertRaises(image_writer.ImageWriterError):
+      image_writer.ImageWriter(self._dev, block_size=1000)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -5,9 +5,11 @@
 """Utility to manage information about different instances."""
 
 import json
+import errno
 import logging
 import os
 import socket
+import tempfile
 
 import servo.client as client
 
@@ -17,6 +19,10 @@ SERVO_SCRATCH_DIR = '/tmp/servoscratch'
 # Key used to store whether the instance is active yet or still coming up.
 ACTIVE_ENTRY_KEY = 'active'
 
+# Prefix of the temporary files entries are written to before being renamed
+# into place. Files with this prefix are not entries.
+TMP_ENTRY_PREFIX = '.'
+
 
 class ScratchError(Exception):
   """Error class for servo scratch utility."""
@@ -122,10 +128,22 @@ class Scratch(object):
       self._WriteEntry(entry)
 
   def _WriteEntry(self, entry):
-    """Write entry to file."""
+    """Write entry to file.
+
+    The entry is written to a temporary file that is then renamed over the
+    entry's file, so that readers never see a partially written entry.
+    """
     entryf = self._EntryF(entry)
-    with open(entryf, 'w') as f:
-      json.dump(entry, f)
+    fd, tmpf = tempfile.mkstemp(prefix=TMP_ENTRY_PREFIX, dir=self._dir)
+    try:
+      # Entries are read by the clients of all users.
+      os.fchmod(fd, 0o644)
+      with os.fdopen(fd, 'w') as f:
+        json.dump(entry, f)
+      os.rename(tmpf, entryf)
+    except BaseException:
+      os.remove(tmpf)
+      raise
 
   def GetAllEntries(self):
     """Find and load servod instance info for all registered servod instances.
@@ -136,16 +154,18 @@ class Scratch(object):
     entries = []
     for f in os.listdir(self._dir):
       entryf = os.path.join(self._dir, f)
-      if os.path.islink(entryf):
+      if f.startswith(TMP_ENTRY_PREFIX) or os.path.islink(entryf):
         continue
-      with open(entryf, 'r') as f:
-        try:
+      try:
+        with open(entryf, 'r') as f:
           entries.append(json.load(f))
-        except ValueError:
-          self._logger.warn('Removing file %r as it contains invalid JSON.',
-                            entryf)
-          # Invalid json file
-          os.remove(entryf)
+      except IOError as e:
+        if e.errno != errno.ENOENT:
+          raise
+        # The entry got removed since listing the directory.
+      except ValueError:
+        self._logger.warn('Skipping file %r as it contains invalid JSON.',
+                          entryf)
     return entries
 
   def GenerateEntryFromPort(self, port):
@@ -195,19 +215,18 @@ class Scratch(object):
 
     Raises:
       ScratchError: if no entry found under |indentifier| or if entry found
-                    is invalid json
+                    is invalid json. Invalid entries are left in place.
     """
     entryf = os.path.join(self._dir, str(identifier))
-    if not os.path.exists(entryf):
-      raise ScratchError(self._NO_FOUND_WARNING % identifier)
-    with open(entryf, 'r') as f:
-      try:
+    try:
+      with open(entryf, 'r') as f:
         entry = json.load(f)
-      except ValueError:
-        # Invalid json file
-        os.remove(entryf)
-        raise ScratchError('id: %s had invalid json formatting. Removed.' %
-                           identifier)
+    except IOError as e:
+      if e.errno != errno.ENOENT:
+        raise
+      raise ScratchError(self._NO_FOUND_WARNING % identifier)
+    except ValueError:
+      raise ScratchError('id: %s had invalid json formatting.' % identifier)
     return entry
 
   def _Sanitize(self):
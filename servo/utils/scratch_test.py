@@ -206,8 +206,8 @@ class TestScratch(unittest.TestCase):
     assert os.path.exists(entryfn)
     with self.assertRaises(scratch.ScratchError):
       self._scratch.FindById(identifier)
-    # FindById removes invalid json files
-    assert not os.path.exists(entryfn)
+    # FindById leaves invalid json files in place
+    assert os.path.exists(entryfn)
 
   def test_FindByIdBadId(self):
     """Verify FindById raises ScratchError when using an unknown id."""
@@ -235,6 +235,23 @@ class TestScratch(unittest.TestCase):
     for entry in entries:
       assert mentries[entry['port']] == entry
 
+  def test_GetAllEntriesSkipsBadJSON(self):
+    """Verify GetAllEntries() skips, but keeps, entries with invalid JSON."""
+    self._manually_add_entry()
+    entryfn = os.path.join(self._scratchdir, 'nonsense')
+    with open(entryfn, 'w') as entryf:
+      entryf.write('This is not JSON')
+    assert self._scratch.GetAllEntries() == [self._entry]
+    assert os.path.exists(entryfn)
+
+  def test_WriteEntryLeavesNoTempFiles(self):
+    """Verify entries are written in place of the entry file, atomically."""
+    self._scratch.AddEntry(self._dport, self._dserials, self._dpid)
+    self._scratch.MarkActive(self._dport)
+    files = os.listdir(self._scratchdir)
+    assert not [f for f in files if f.startswith(scratch.TMP_ENTRY_PREFIX)]
+    assert self._scratch.FindById(self._dport)['active']
+
   def test_SanitizeNothingToDo(self):
     """Verify Sanitize does not remove active scratch entry."""
     self._manually_add_entry()
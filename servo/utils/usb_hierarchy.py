@@ -9,6 +9,7 @@ import collections
 import fcntl
 import os
 import re
+import threading
 
 import usb
 
@@ -17,6 +18,12 @@ class HierarchyError(Exception):
   """Hierarchy error class."""
 
 
+# Attributes of one device in the sysfs index. Attributes that the device does
+# not expose, or that fail to parse, are None.
+SysfsEntry = collections.namedtuple('SysfsEntry', ['path', 'bus', 'dev', 'vid',
+                                                   'pid', 'serial'])
+
+
 class Hierarchy(object):
   """A helper class to analyze the sysfs hierarchy of USB devices."""
 
@@ -25,6 +32,8 @@ class Hierarchy(object):
   # Actually used sysfs path for USB device information. Split here is to
   # allow safe mocking and restoring of the default path.
   SYSFS_PATH = DEFAULT_SYSFS_PATH
+  # Directory holding a /dev/bus/usb/<bus>/<dev> node per enumerated device.
+  DEVFS_PATH = '/dev/bus/usb'
   # Regex to discover usb device folders in |SYSFS_PATH|. The match group
   # here is to extract the usb hub port path to the device.
   DEV_RE = re.compile(r'\d+-\d+(\.\d+)*\Z')
@@ -45,6 +54,13 @@ class Hierarchy(object):
   # elixir.bootlin.com/linux/v5.8-rc4/source/include/uapi/asm-generic/ioctl.h
   USBDEVFS_RESET = ord('U') << 8 | 20
 
+  # Index of the attributes of all devices in |SYSFS_PATH|, shared by all
+  # lookups. It holds a list of SysfsEntry and the signature of the device
+  # layout it was built from. See _GetSysfsIndex().
+  _sysfs_index = None
+  _sysfs_index_signature = None
+  _sysfs_index_lock = threading.Lock()
+
   @classmethod
   def MockUsbSysfsPathForTest(cls, mock_dir):
     """Set the sysfs usb devices path to |mock_dir| for testing.
@@ -53,11 +69,101 @@ class Hierarchy(object):
       mock_dir: directory where mock [...]/usb/devices/ directories will be
     """
     cls.SYSFS_PATH = mock_dir
+    cls.InvalidateSysfsIndex()
 
   @classmethod
   def RestoreDefaultUsbSysfsPathForTest(cls):
     """Restore the sysfs usb devices path to its default value."""
     cls.SYSFS_PATH = cls.DEFAULT_SYSFS_PATH
+    cls.InvalidateSysfsIndex()
+
+  @classmethod
+  def InvalidateSysfsIndex(cls):
+    """Drop the sysfs index, e.g. on a hotplug event.
+
+    The next lookup walks |SYSFS_PATH| again.
+    """
+    with cls._sysfs_index_lock:
+      cls._sysfs_index = None
+      cls._sysfs_index_signature = None
+
+  @classmethod
+  def _SysfsLayoutSignature(cls):
+    """Cheap snapshot of the enumerated devices, to detect hotplug events.
+
+    Reading the attributes of every device is expensive. Instead, this only
+    lists the device directories in |SYSFS_PATH| and the device nodes in
+    |DEVFS_PATH|. A device plugged or unplugged changes the former, a device
+    re-enumerating at the same port (new devnum) changes the latter.
+
+    Returns:
+      hashable signature, equal as long as no device came or went
+    """
+    dev_dirs = frozenset(usb_dir for usb_dir in os.listdir(cls.SYSFS_PATH)
+                         if cls.DEV_RE.match(usb_dir))
+    dev_nodes = []
+    try:
+      for bus in os.listdir(cls.DEVFS_PATH):
+        dev_nodes.extend((bus, dev) for dev in
+                         os.listdir(os.path.join(cls.DEVFS_PATH, bus)))
+    except OSError:
+      # No devfs (e.g. in a container). Rely on the sysfs layout only.
+      pass
+    return (dev_dirs, frozenset(dev_nodes))
+
+  @classmethod
+  def _BuildSysfsIndex(cls, dev_dirs):
+    """Read the attributes of all devices in |dev_dirs|.
+
+    Args:
+      dev_dirs: device directory names in |SYSFS_PATH|
+
+    Returns:
+      list of SysfsEntry, one per device exposing its bus & dev numbers
+    """
+    index = []
+    for usb_dir in dev_dirs:
+      usb_dir = os.path.join(cls.SYSFS_PATH, usb_dir)
+      try:
+        dev = Hierarchy.DevNumFromSysfs(usb_dir)
+        bus = Hierarchy.BusNumFromSysfs(usb_dir)
+      except (IOError, HierarchyError):
+        # This means no bus/dev files. Skip
+        continue
+      attrs = []
+      for read_attr in (Hierarchy.VendorIDFromSysfs,
+                        Hierarchy.ProductIDFromSysfs,
+                        Hierarchy.SerialFromSysfs):
+        try:
+          attrs.append(read_attr(usb_dir))
+        except (IOError, HierarchyError):
+          # Not all devices expose all attributes, e.g. a serial.
+          attrs.append(None)
+      index.append(SysfsEntry(usb_dir, bus, dev, *attrs))
+    return index
+
+  @classmethod
+  def _GetSysfsIndex(cls):
+    """Return the sysfs index, rebuilding it if devices changed.
+
+    Returns:
+      list of SysfsEntry for all devices in |SYSFS_PATH|
+    """
+    signature = cls._SysfsLayoutSignature()
+    with cls._sysfs_index_lock:
+      if cls._sysfs_index is None or cls._sysfs_index_signature != signature:
+        cls._sysfs_index = cls._BuildSysfsIndex(signature[0])
+        cls._sysfs_index_signature = signature
+      return cls._sysfs_index
+
+  @classmethod
+  def _EntryCurrent(cls, entry):
+    """Whether |entry| still describes the device at its sysfs path."""
+    try:
+      return (Hierarchy.DevNumFromSysfs(entry.path) == entry.dev and
+              Hierarchy.BusNumFromSysfs(entry.path) == entry.bus)
+    except (IOError, HierarchyError):
+      return False
 
   def __init__(self):
     # Get the current USB sysfs hierarchy.
@@ -136,23 +242,40 @@ class Hierarchy(object):
       list of /sys/bus/usb/devices/... path to the devices that match vid/pid
       pairs
     """
-    usb_hierarchy = Hierarchy()
-    dev_paths = []
+    return [entry.path for entry in
+            Hierarchy.GetAllUsbDeviceSysfsEntries(vid_pid_list)]
+
+  @staticmethod
+  def GetAllUsbDeviceSysfsEntries(vid_pid_list=None):
+    """Return the sysfs attributes of all USB devices matching VID/PID's.
+
+    This reads the devices in one pass, e.g. to look at all servos at once.
+
+    Args:
+      vid_pid_list: List of tuple (vid, pid). See GetAllUsbDeviceSysfsPaths()
+                    for the wildcards.
+
+    Returns:
+      list of SysfsEntry of the devices that match vid/pid pairs
+    """
+    index = Hierarchy._GetSysfsIndex()
     if vid_pid_list is None:
-      # Return all paths if the list is None
-      return list(usb_hierarchy.hierarchy.values())
+      # Return all entries if the list is None
+      return list(index)
+    entries = []
     # The |vid_lookup| maps all acceptable pid's for that vid.
     vid_lookup = collections.defaultdict(list)
     for vid, pid in vid_pid_list:
       vid_lookup[vid].append(pid)
-    for path in usb_hierarchy.hierarchy.values():
-      vid = Hierarchy.VendorIDFromSysfs(path)
-      pid = Hierarchy.ProductIDFromSysfs(path)
-      if None in vid_lookup[vid] or pid in vid_lookup[vid]:
+    for entry in index:
+      if entry.vid is None:
+        continue
+      pids = vid_lookup.get(entry.vid, [])
+      if None in pids or entry.pid in pids:
         # A device only matches if the vid/pid pair is known, or if the pid
         # is a wildcard (pid = None)
-        dev_paths.append(path)
-    return dev_paths
+        entries.append(entry)
+    return entries
 
   @staticmethod
   def GetUsbDeviceSysfsPath(vid, pid, serial):
@@ -169,18 +292,17 @@ class Hierarchy(object):
     Raises:
       HierarchyError: if more than one device are found with those attributes.
     """
-    usb_hierarchy = Hierarchy()
-    dev_paths = []
-    for path in usb_hierarchy.hierarchy.values():
-      path_vid = Hierarchy.VendorIDFromSysfs(path)
-      path_pid = Hierarchy.ProductIDFromSysfs(path)
-      try:
-        path_serial = Hierarchy.SerialFromSysfs(path)
-      except HierarchyError:
-        # Not all devices have a serial file. In that case, ignore the device.
-        continue
-      if (path_vid, path_pid, path_serial) == (vid, pid, serial):
-        dev_paths.append(path)
+    def find_matches():
+      # Devices without a serial file are ignored.
+      return [entry for entry in Hierarchy._GetSysfsIndex()
+              if entry.serial is not None and
+              (entry.vid, entry.pid, entry.serial) == (vid, pid, serial)]
+    matches = find_matches()
+    if not all(Hierarchy._EntryCurrent(entry) for entry in matches):
+      # A device re-enumerated in a way the layout signature missed.
+      Hierarchy.InvalidateSysfsIndex()
+      matches = find_matches()
+    dev_paths = [entry.path for entry in matches]
     if len(dev_paths) > 1:
       if serial:
         suffix = ('Devices that share the same vid/pid should have a unique '
@@ -340,21 +462,11 @@ class Hierarchy(object):
 
     The dict key will be a tuple of (bus, dev) and value be the sysfs path.
 
+    The walk itself is shared with the other lookups through the sysfs index,
+    and only redone when devices came or went since.
     """
-    hierarchy = {}
-    for usb_dir in os.listdir(self.SYSFS_PATH):
-      if self.DEV_RE.match(usb_dir):
-        usb_dir = os.path.join(self.SYSFS_PATH, usb_dir)
-        try:
-          dev = Hierarchy.DevNumFromSysfs(usb_dir)
-          bus = Hierarchy.BusNumFromSysfs(usb_dir)
-        except (IOError, HierarchyError):
-          # This means no bus/dev files. Skip
-          continue
-
-        hierarchy[(bus, dev)] = usb_dir
-
-    self.hierarchy = hierarchy
+    self.hierarchy = dict(((entry.bus, entry.dev), entry.path)
+                          for entry in Hierarchy._GetSysfsIndex())
 
   @staticmethod
   def GetSysfsParentHubStub(sysfs_dev_path):
@@ -273,6 +273,54 @@ class TestUsbHierarchy(unittest.TestCase):
     with self.assertRaisesRegexp(HierarchyError, 'Found 2 devices with'):
       _ = Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid, serial=sid)
 
+  def test_GetUsbDeviceSysfsPathIndexSeesHotplug(self):
+    """A device plugged in after a lookup is found by the next lookup."""
+    vid, pid, sid = self._vid, self._pid, self._serial
+    assert Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid, serial=sid) is None
+    TestUsbHierarchy.AddFakeUsbEntry(usb_devices_dir=self._usb_dir,
+                                     hub_port_path=self._hub_port_path,
+                                     devnum=self._devnum,
+                                     busnum=self._busnum,
+                                     vid=self._vid,
+                                     pid=self._pid,
+                                     serial=self._serial)
+    assert Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid, serial=sid)
+
+  def test_GetUsbDeviceSysfsPathIndexReused(self):
+    """Lookups reuse the index until it is invalidated."""
+    dev_dir = TestUsbHierarchy.AddFakeUsbEntry(
+        usb_devices_dir=self._usb_dir, hub_port_path=self._hub_port_path,
+        devnum=self._devnum, busnum=self._busnum, vid=self._vid, pid=self._pid,
+        serial=self._serial)
+    vid, pid = self._vid, self._pid
+    assert Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid,
+                                           serial=self._serial)
+    # Rewriting the serial in place is not a hotplug event the index detects.
+    with open(os.path.join(dev_dir, Hierarchy.SERIAL_FILE), 'w') as f:
+      f.write('newserial')
+    assert not Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid,
+                                               serial='newserial')
+    Hierarchy.InvalidateSysfsIndex()
+    assert Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid,
+                                           serial='newserial') == dev_dir
+
+  def test_GetUsbDeviceSysfsPathDevnumChange(self):
+    """A stale index entry is detected through its devnum & rebuilt."""
+    dev_dir = TestUsbHierarchy.AddFakeUsbEntry(
+        usb_devices_dir=self._usb_dir, hub_port_path=self._hub_port_path,
+        devnum=self._devnum, busnum=self._busnum, vid=self._vid, pid=self._pid,
+        serial=self._serial)
+    vid, pid, sid = self._vid, self._pid, self._serial
+    assert Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid, serial=sid)
+    # The device re-enumerates at the same port, now with a new devnum.
+    with open(os.path.join(dev_dir, Hierarchy.DEV_FILE), 'w') as f:
+      f.write('%d' % (self._devnum + 1))
+    assert Hierarchy.GetUsbDeviceSysfsPath(vid=vid, pid=pid,
+                                           serial=sid) == dev_dir
+    self._hierarchy.RefreshHierarchy()
+    self._fake_dev.address = self._devnum + 1
+    assert self._hierarchy.GetDevPortPath(self._fake_dev) == dev_dir
+
   def test_GetDevPortPath(self):
     """Retrieving the /sys/bus/usb/devices path for a device works."""
     # Define own root hub number instead of using default to verify path name.
@@ -4,15 +4,58 @@
 
 """Watchdog for servo devices falling off the usb stack."""
 
+import errno
 import logging
 import os
+import select
 import signal
+import socket
 import threading
+import time
+
+import utils.usb_hierarchy as usb_hierarchy
+
+# Netlink protocol & multicast group of the kernel's uevents.
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+# Receive buffer for uevents. Hubs full of devices can send bursts of them.
+UEVENT_RCVBUF = 1024 * 1024
+UEVENT_MSG_SIZE = 8192
+
+
+def parse_uevent(msg):
+  """Parse a kernel uevent message.
+
+  A kernel uevent is a header 'action@devpath' followed by KEY=VALUE
+  properties, all NUL-separated.
+
+  Args:
+    msg: raw uevent message
+
+  Returns:
+    dict of the uevent's properties, e.g. ACTION, DEVPATH, SUBSYSTEM, or None
+    if |msg| is not a kernel uevent
+  """
+  if isinstance(msg, bytes) and not isinstance(msg, str):
+    msg = msg.decode('utf-8', 'replace')
+  fields = msg.split('\0')
+  if '@' not in fields[0]:
+    return None
+  props = {}
+  for field in fields[1:]:
+    key, sep, value = field.partition('=')
+    if sep:
+      props[key] = value
+  return props
 
 
 class DeviceWatchdog(threading.Thread):
   """Watchdog to ensure servod stops when a servo device gets lost.
 
+  The watchdog listens to the kernel's USB uevents on a netlink socket, and
+  reacts to a device's removal or re-enumeration as soon as it happens. If the
+  socket cannot be opened, it falls back to polling the devices.
+
   Public Attributes:
     done: event to signal that the watchdog functionality can stop
   """
@@ -20,12 +63,14 @@ class DeviceWatchdog(threading.Thread):
   # Rate in seconds used to poll when a reinit capable device is attached.
   REINIT_POLL_RATE = 0.1
 
-  def __init__(self, servod, poll_rate=1.0):
+  def __init__(self, servod, poll_rate=1.0, use_uevents=True):
     """Setup watchdog thread.
 
     Args:
       servod: servod server the watchdog is watching over.
-      poll_rate: poll rate in seconds
+      poll_rate: poll rate in seconds. When listening to uevents, the devices
+                 are still checked at this rate in case an event is lost.
+      use_uevents: listen to uevents, rather than relying on polling alone
     """
     threading.Thread.__init__(self)
     self.daemon = True
@@ -35,10 +80,11 @@ class DeviceWatchdog(threading.Thread):
     self._servod = servod
     self._rate = poll_rate
     self._devices = []
+    self._uevent_sock = self._open_uevent_socket() if use_uevents else None
 
     for device in self._servod.get_devices():
       self._devices.append(device)
-      if device.reinit_ok():
+      if device.reinit_ok() and not self._uevent_sock:
         self._rate = self.REINIT_POLL_RATE
         self._logger.info('Reinit capable device found. Polling rate set '
                           'to %.2fs.', self._rate)
@@ -47,6 +93,28 @@ class DeviceWatchdog(threading.Thread):
     # the device type i.e. servo_micro.
     self._logger.info('Watchdog setup for devices: %s', self._devices)
 
+  def _open_uevent_socket(self):
+    """Open a netlink socket receiving the kernel's uevents.
+
+    Returns:
+      socket, or None if uevents are not available
+    """
+    try:
+      sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                           NETLINK_KOBJECT_UEVENT)
+    except (AttributeError, socket.error) as e:
+      self._logger.info('Cannot listen to uevents, polling instead: %s', e)
+      return None
+    try:
+      sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_RCVBUF)
+      sock.bind((0, UEVENT_KERNEL_GROUP))
+    except socket.error as e:
+      self._logger.info('Cannot listen to uevents, polling instead: %s', e)
+      sock.close()
+      return None
+    sock.setblocking(False)
+    return sock
+
   def deactivate(self):
     """Signal to watchdog to stop polling."""
     self.done.set()
@@ -63,46 +131,158 @@ class DeviceWatchdog(threading.Thread):
     os.kill(os.getpid(), self._turndown_signal)
     self.done.set()
 
+  def _device_missing(self, device, missing_devices, scheduled=True):
+    """Handle |device| having gone missing.
+
+    Each call for a device that is already missing counts as a reinit attempt.
+    Only checks on the polling schedule do, so that uevents do not use up the
+    attempts faster.
+
+    Args:
+      device: servo device object
+      missing_devices: dict of the ids of the devices currently missing
+      scheduled: whether the device was found missing by a scheduled check
+
+    Returns:
+      False if servod is being turned down, True otherwise
+    """
+    self._logger.debug('Device - %s not found.', device)
+    if not device.reinit_ok():
+      self.disconnect(device)
+      return False
+    if scheduled or device.get_id() not in missing_devices:
+      missing_devices[device.get_id()] = 1
+      device.disconnect()
+    return True
+
+  def _check_devices(self, missing_devices, devnums, scheduled=True):
+    """Check that all devices are still there, with the same devnum.
+
+    Args:
+      missing_devices: dict of the ids of the devices currently missing
+      devnums: dict of the last known devnum of each device id
+      scheduled: whether this check is on the polling schedule, rather than
+                 triggered by uevents
+
+    Returns:
+      False if servod is being turned down, True otherwise
+    """
+    for device in self._devices:
+      dev_id = device.get_id()
+      if device.is_connected():
+        # Device was found. If it is in the disconnected devices, then it
+        # needs to be reinitialized.
+        # If the device's devnum has changed, then a reenumeration happened
+        # that the watchdog missed. This is fine for reeinit capable devices,
+        # but not for the rest.
+        devnum = device.usb_devnum()
+        if devnum != devnums[dev_id]:
+          if not device.reinit_ok():
+            # Reenumeration here is bad and not recoverable.
+            self._logger.error('Device - %s - changed devnum from %d to %d.',
+                               device, devnums[dev_id], devnum)
+            self.disconnect(device)
+            return False
+          # Here, the device is reinit_ok()
+          # Refresh the device number.
+          devnums[device.get_id()] = devnum
+          # Need to remove it from the missing_devices if it was there
+          # so we know how many are still disconnected.
+          missing_devices.pop(dev_id, None)
+          if not missing_devices:
+            # Once the last missing device has been found again, reinitialize
+            # them all.
+            self._servod.reinitialize()
+      elif not self._device_missing(device, missing_devices, scheduled):
+        return False
+    return True
+
+  def _read_uevents(self):
+    """Read all pending uevents.
+
+    Returns:
+      list of USB device uevents, each as a dict of properties. None if
+      uevents were lost, and the devices need a full check.
+    """
+    uevents = []
+    while True:
+      try:
+        msg = self._uevent_sock.recv(UEVENT_MSG_SIZE)
+      except socket.error as e:
+        if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+          return uevents
+        if e.errno == errno.ENOBUFS:
+          self._logger.warning('uevents overflowed the socket buffer.')
+          return None
+        raise
+      uevent = parse_uevent(msg)
+      if (uevent and uevent.get('SUBSYSTEM') == 'usb' and
+          uevent.get('DEVTYPE') == 'usb_device'):
+        uevents.append(uevent)
+
+  def _handle_uevents(self, missing_devices, devnums):
+    """Process pending uevents.
+
+    Removals of watched devices are handled in order, so that a device that
+    was removed & added back since the last check is still treated as having
+    disconnected. A final check then picks up re-enumerations.
+
+    Returns:
+      False if servod is being turned down, True otherwise
+    """
+    uevents = self._read_uevents()
+    if uevents == []:
+      return True
+    # Devices came or went: cached sysfs lookups are stale.
+    usb_hierarchy.Hierarchy.InvalidateSysfsIndex()
+    if uevents:
+      by_name = dict((os.path.basename(device.get_sysfs_path()), device)
+                     for device in self._devices)
+      for uevent in uevents:
+        device = by_name.get(os.path.basename(uevent.get('DEVPATH', '')))
+        if device and uevent.get('ACTION') == 'remove':
+          if device.get_id() in missing_devices:
+            continue
+          if not self._device_missing(device, missing_devices,
+                                      scheduled=False):
+            return False
+    return self._check_devices(missing_devices, devnums, scheduled=False)
+
   def run(self):
-    """Poll |_devices| every |_rate| seconds. Send SIGTERM if device lost."""
+    """Watch |_devices| until done. Send SIGTERM if a device is lost.
+
+    With uevents, devices are checked on every USB device uevent, and every
+    |_rate| seconds in case an event was lost. Without, they are polled every
+    |_rate| seconds. While a device is missing, they are checked every
+    |REINIT_POLL_RATE| seconds either way, as each of those checks counts as a
+    reinit attempt.
+    """
     # Devices that need to be reinitialized
     missing_devices = {}
     # Keep track of device numbers to catch issues where a device reenumerates
     # without the watchdog catching it.
     devnums = {dev.get_id(): dev.usb_devnum() for dev in self._devices}
-    while not self.done.is_set():
-      self.done.wait(self._rate)
-      for device in self._devices:
-        dev_id = device.get_id()
-        if device.is_connected():
-          # Device was found. If it is in the disconnected devices, then it
-          # needs to be reinitialized.
-          # If the device's devnum has changed, then a reenumeration happened
-          # that the watchdog missed. This is fine for reeinit capable devices,
-          # but not for the rest.
-          devnum = device.usb_devnum()
-          if devnum != devnums[dev_id]:
-            if not device.reinit_ok():
-              # Reenumeration here is bad and not recoverable.
-              self._logger.error('Device - %s - changed devnum from %d to %d.',
-                                 device, devnums[dev_id], devnum)
-              self.disconnect(device)
+    next_check = time.time() + self._rate
+    try:
+      while not self.done.is_set():
+        timeout = max(0, next_check - time.time())
+        if self._uevent_sock:
+          readable, _, _ = select.select([self._uevent_sock], [], [], timeout)
+          if readable:
+            missing = len(missing_devices)
+            if not self._handle_uevents(missing_devices, devnums):
               break
-            # Here, the device is reinit_ok()
-            # Refresh the device number.
-            devnums[device.get_id()] = devnum
-            # Need to remove it from the missing_devices if it was there
-            # so we know how many are still disconnected.
-            missing_devices.pop(dev_id, None)
-            if not missing_devices:
-              # Once the last missing device has been found again, reinitialize
-              # them all.
-              self._servod.reinitialize()
+            if len(missing_devices) > missing:
+              # A device just went missing. Count the next attempt from now.
+              next_check = time.time() + self.REINIT_POLL_RATE
         else:
-          # Device was not found.
-          self._logger.debug('Device - %s not found when polling.', device)
-          if not device.reinit_ok():
-            self.disconnect(device)
+          self.done.wait(timeout)
+        now = time.time()
+        if now >= next_check and not self.done.is_set():
+          if not self._check_devices(missing_devices, devnums):
             break
-          missing_devices[dev_id] = 1
-          device.disconnect()
+          rate = self.REINIT_POLL_RATE if missing_devices else self._rate
+          next_check = now + rate
+    finally:
+      if self._uevent_sock:
+        self._uevent_sock.close()
@@ -0,0 +1,183 @@
+# Copyright 2020 The Chromium OS Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Unit tests for watchdog."""
+
+import errno
+import socket
+import unittest
+
+import watchdog
+
+
+def _Uevent(action, devpath, devtype='usb_device'):
+  """Return a raw kernel uevent for |action| on |devpath|."""
+  return ('%s@%s\0ACTION=%s\0DEVPATH=%s\0SUBSYSTEM=usb\0DEVTYPE=%s\0' %
+          (action, devpath, action, devpath, devtype)).encode('utf-8')
+
+
+class FakeDevice(object):
+  """Servo device found at sysfs path /sys/bus/usb/devices/|name|."""
+
+  def __init__(self, name, reinit_ok=True):
+    self.name = name
+    self.reinit = reinit_ok
+    self.connected = True
+    self.devnum = 5
+    self.disconnects = 0
+
+  def get_id(self):
+    return self.name
+
+  def reinit_ok(self):
+    return self.reinit
+
+  def is_connected(self):
+    return self.connected
+
+  def usb_devnum(self):
+    return self.devnum
+
+  def get_sysfs_path(self):
+    return '/sys/bus/usb/devices/%s' % self.name
+
+  def disconnect(self):
+    self.disconnects += 1
+
+
+class FakeServod(object):
+  """servod whose devices are watched."""
+
+  def __init__(self, devices):
+    self.devices = devices
+    self.reinits = 0
+
+  def get_devices(self):
+    return self.devices
+
+  def reinitialize(self):
+    self.reinits += 1
+
+
+class FakeUeventSocket(object):
+  """Netlink socket with queued uevents, or an error, to receive."""
+
+  def __init__(self):
+    self.msgs = []
+    self.error = None
+
+  def recv(self, size):
+    if self.msgs:
+      return self.msgs.pop(0)
+    if self.error:
+      error, self.error = self.error, None
+      raise socket.error(error, 'recv failed')
+    raise socket.error(errno.EAGAIN, 'no uevent')
+
+  def close(self):
+    pass
+
+
+class TestParseUevent(unittest.TestCase):
+
+  def test_KernelUevent(self):
+    """Kernel uevents are parsed into their properties."""
+    props = watchdog.parse_uevent(_Uevent('remove', '/devices/usb1/1-2'))
+    self.assertEqual('remove', props['ACTION'])
+    self.assertEqual('/devices/usb1/1-2', props['DEVPATH'])
+    self.assertEqual('usb', props['SUBSYSTEM'])
+
+  def test_ValueWithEquals(self):
+    """Values are everything after the first '='."""
+    props = watchdog.parse_uevent(b'add@/d\0PRODUCT=18d1/501a=1\0')
+    self.assertEqual('18d1/501a=1', props['PRODUCT'])
+
+  def test_NotKernelUevent(self):
+    """Messages without an action@devpath header are not kernel uevents."""
+    self.assertIsNone(watchdog.parse_uevent(b'libudev\0ACTION=add\0'))
+
+
+class TestDeviceWatchdog(unittest.TestCase):
+
+  def setUp(self):
+    """Set up a watchdog over a reinit capable device, on a fake socket."""
+    unittest.TestCase.setUp(self)
+    self.device = FakeDevice('1-2')
+    self.servod = FakeServod([self.device])
+    self.wd = watchdog.DeviceWatchdog(self.servod, use_uevents=False)
+    # pylint: disable=protected-access
+    # Signal 0 only checks that the process exists.
+    self.wd._turndown_signal = 0
+    self.sock = FakeUeventSocket()
+    self.wd._uevent_sock = self.sock
+    self.missing = {}
+    self.devnums = {'1-2': 5}
+
+  def _Handle(self, *msgs):
+    """Receive uevents |msgs| and handle them."""
+    self.sock.msgs.extend(msgs)
+    # pylint: disable=protected-access
+    return self.wd._handle_uevents(self.missing, self.devnums)
+
+  def test_PollingFallback(self):
+    """Without a netlink socket, reinit capable devices are polled fast."""
+    real_socket = watchdog.socket.socket
+
+    def no_netlink(*args):
+      raise socket.error(errno.EPROTONOSUPPORT, 'no netlink')
+
+    watchdog.socket.socket = no_netlink
+    try:
+      wd = watchdog.DeviceWatchdog(self.servod)
+    finally:
+      watchdog.socket.socket = real_socket
+    # pylint: disable=protected-access
+    self.assertIsNone(wd._uevent_sock)
+    self.assertEqual(watchdog.DeviceWatchdog.REINIT_POLL_RATE, wd._rate)
+
+  def test_RemoveUevent(self):
+    """A removal uevent marks the device missing once."""
+    self.device.connected = False
+    self.assertTrue(self._Handle(_Uevent('remove', '/devices/usb1/1-2')))
+    self.assertEqual({'1-2': 1}, self.missing)
+    self.assertEqual(1, self.device.disconnects)
+    # More uevents while it is missing do not use up reinit attempts.
+    self.assertTrue(self._Handle(_Uevent('remove', '/devices/usb1/1-2/1-2:1.0',
+                                         devtype='usb_interface'),
+                                 _Uevent('add', '/devices/usb1/1-3')))
+    self.assertEqual(1, self.device.disconnects)
+
+  def test_ReaddUevent(self):
+    """A device coming back with a new devnum is reinitialized."""
+    self.device.connected = False
+    self._Handle(_Uevent('remove', '/devices/usb1/1-2'))
+    self.device.connected = True
+    self.device.devnum = 6
+    self.assertTrue(self._Handle(_Uevent('add', '/devices/usb1/1-2')))
+    self.assertEqual({}, self.missing)
+    self.assertEqual(1, self.servod.reinits)
+
+  def test_RemoveNotReinitCapable(self):
+    """Losing a device that cannot be reinitialized turns down servod."""
+    self.device.reinit = False
+    self.device.connected = False
+    self.assertFalse(self._Handle(_Uevent('remove', '/devices/usb1/1-2')))
+    self.assertTrue(self.wd.done.is_set())
+
+  def test_OtherDeviceIgnored(self):
+    """Uevents of other devices only lead to a check of the devices."""
+    self.assertTrue(self._Handle(_Uevent('remove', '/devices/usb1/1-3')))
+    self.assertEqual({}, self.missing)
+    self.assertEqual(0, self.device.disconnects)
+
+  def test_LostUevents(self):
+    """Lost uevents still catch a device that went missing."""
+    self.device.connected = False
+    self.sock.error = errno.ENOBUFS
+    self.assertTrue(self._Handle())
+    self.assertEqual({'1-2': 1}, self.missing)
+
+
+if __name__ == '__main__':
+  unittest.main()
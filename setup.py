@@ -66,6 +66,7 @@ setup(
   entry_points={
       'console_scripts': [
           'servod = servo.servod:main',
+          'servod_fleet = servo.servod_fleet:main',
           'dut-control = servo.dut_control:main',
           'dut-power = servo.dut_power:main',
           'servodutil = servo.servodtool:servodutil',